@@ -0,0 +1,91 @@
+"""
+Runs the benchmark suite at every size and prints one JSON document.
+
+Each size runs in its own process so its peak memory is measured on its own.
+With --baseline, median times are compared with an earlier result and the exit
+status is 1 when an operation got slower than the threshold allows.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SIZES = [1_000, 100_000, 1_000_000]
+
+def git_commit() -> str | None:
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+def run_size(contacts: int, args) -> dict:
+    """Runs the suite for one size in a child process; failures such as running out of memory are reported."""
+    command = [sys.executable, "-m", "benchmarks.suite", "--contacts", str(contacts),
+               "--repeat", str(args.repeat), "--seed", str(args.seed)]
+    if args.notes is not None:
+        command += ["--notes", str(args.notes)]
+    if args.only:
+        command += ["--only", *args.only]
+    print(f"benchmarking {contacts} contacts...", file=sys.stderr)
+    result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines()
+        return {"contacts": contacts, "error": lines[-1] if lines else f"exit status {result.returncode}"}
+    return json.loads(result.stdout)
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Returns the operations whose median time grew by more than `threshold` (0.2 is 20%)."""
+    regressions = []
+    old_sizes = {size["contacts"]: size for size in baseline["sizes"] if "operations" in size}
+    for size in results["sizes"]:
+        old = old_sizes.get(size["contacts"])
+        if old is None or "operations" not in size:
+            continue
+        for name, timing in size["operations"].items():
+            before = old["operations"].get(name, {}).get("median_ms")
+            now = timing["median_ms"]
+            if before and now and now > before * (1 + threshold):
+                regressions.append(f"{name} at {size['contacts']} contacts: {before} ms -> {now} ms")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="numbers of contacts")
+    parser.add_argument("--notes", type=int, default=None, help="number of notes, defaults to the number of contacts")
+    parser.add_argument("--repeat", type=int, default=3, help="warm runs per operation")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="+", help="names of the operations to run")
+    parser.add_argument("--output", help="also write the results to this file")
+    parser.add_argument("--baseline", help="earlier results to compare the median times with")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown against the baseline")
+    args = parser.parse_args()
+
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "sizes": [run_size(contacts, args) for contacts in args.sizes],
+    }
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"slower: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Deterministic synthetic contacts and notes; the same seed always gives the same books."""
+import random
+
+from src.address_book.classes import AddressBook, Record
+from src.notes.classes import Note, NoteBook
+
+FIRST_NAMES = ["Anna", "Bohdan", "Daria", "Ivan", "Kateryna", "Maksym", "Olena", "Petro", "Sofia", "Taras",
+               "Yulia", "Andrii", "Iryna", "Oleh", "Nadia", "Roman", "Vira", "Serhii", "Zoriana", "Mykola"]
+LAST_NAMES = ["Shevchenko", "Kovalenko", "Bondarenko", "Tkachenko", "Kravchenko", "Melnyk", "Boyko",
+              "Koval", "Oliinyk", "Lysenko", "Marchenko", "Moroz", "Savchenko", "Rudenko", "Pavlenko"]
+STREETS = ["Khreshchatyk", "Sumska", "Deribasivska", "Shevchenka", "Franka", "Lesi Ukrainky", "Hrushevskoho"]
+CITIES = ["Kyiv", "Lviv", "Odesa", "Kharkiv", "Dnipro", "Poltava", "Chernihiv"]
+DOMAINS = ["example.com", "corp.com", "mail.org", "post.net"]
+WORDS = ["meeting", "project", "budget", "review", "call", "report", "deadline", "draft", "client",
+         "quarterly", "plan", "release", "invoice", "travel", "design", "research", "summary", "team",
+         "follow", "ideas", "list", "groceries", "birthday", "gift", "contract", "update", "notes"]
+TAGS = ["work", "home", "urgent", "ideas", "family", "finance", "travel", "health", "later", "done"]
+
+def contact_name(i: int) -> str:
+    """Returns the unique name of the i-th generated contact."""
+    return f"{FIRST_NAMES[i % len(FIRST_NAMES)]} {LAST_NAMES[i // len(FIRST_NAMES) % len(LAST_NAMES)]} {i:07d}"
+
+def make_contacts(count: int, seed: int = 0) -> AddressBook:
+    """Builds an address book of `count` contacts; most have an email, address and birthday."""
+    rng = random.Random(seed)
+    book = AddressBook()
+    for i in range(count):
+        name = contact_name(i)
+        record = Record(name)
+        for _ in range(rng.randint(1, 3)):
+            record.add_phone(f"0{rng.randint(50, 99)}{rng.randint(0, 9_999_999):07d}")
+        if rng.random() < 0.8:
+            user = name.split()[0].lower()
+            record.add_email(f"{user}{i}@{rng.choice(DOMAINS)}")
+        if rng.random() < 0.6:
+            record.add_address(f"{rng.choice(STREETS)} {rng.randint(1, 200)}, {rng.choice(CITIES)}")
+        if rng.random() < 0.9:
+            record.add_birthday(f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.{rng.randint(1950, 2010)}")
+        book.add_record(record)
+    return book
+
+def make_notes(count: int, seed: int = 0) -> NoteBook:
+    """Builds a note book of `count` notes with 5 to 40 words and up to three tags each."""
+    rng = random.Random(seed)
+    notes = NoteBook()
+    for i in range(count):
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 40)))
+        note = Note(f"note{i:07d}", text)
+        for tag in rng.sample(TAGS, rng.randint(0, 3)):
+            note.add_tag(tag)
+        notes.add_note(note)
+    return notes
@@ -0,0 +1,150 @@
+"""Load test of the HTTP/JSON API: many concurrent keep-alive clients sending a mix of reads and writes."""
+import argparse
+import asyncio
+import json
+import os
+import pickle
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.data import TAGS, contact_name, make_contacts, make_notes
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, "main.py")
+
+def write_data(workdir: str, contacts: int, notes: int):
+    """Writes generated books where main.py looks for them when started in `workdir`."""
+    os.makedirs(os.path.join(workdir, "storage"))
+    with open(os.path.join(workdir, "storage", "addressbook.pkl"), "wb") as f:
+        pickle.dump(make_contacts(contacts), f)
+    os.makedirs(os.path.join(workdir, ".my_assistant_data"))
+    with open(os.path.join(workdir, ".my_assistant_data", "notes.pkl"), "wb") as f:
+        pickle.dump(make_notes(notes), f)
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(workdir: str, port: int, timeout: float = 60.0) -> subprocess.Popen:
+    env = dict(os.environ, HOME=workdir, PYTHONPATH=ROOT)
+    process = subprocess.Popen([sys.executable, MAIN, "--serve", "--port", str(port)], cwd=workdir, env=env,
+                               stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError("the server exited before it was ready")
+            time.sleep(0.05)
+    process.kill()
+    raise TimeoutError("the server did not start")
+
+def requests(rng: random.Random, contacts: int, write_ratio: float):
+    """Yields (kind, method, path, body) of a realistic mix: mostly lookups and searches, some changes."""
+    while True:
+        i = rng.randrange(contacts)
+        name = contact_name(i).replace(" ", "%20")
+        if rng.random() < write_ratio:
+            if rng.random() < 0.5:
+                yield "update_contact", "PATCH", f"/contacts/{name}", {"email": f"load{rng.randrange(10**6)}@example.com"}
+            else:
+                yield "add_note", "POST", "/notes", {"name": f"load-{rng.getrandbits(48):x}", "text": "load test note"}
+            continue
+        kind = rng.random()
+        if kind < 0.5:
+            yield "get_contact", "GET", f"/contacts/{name}", None
+        elif kind < 0.75:
+            yield "search_contacts", "GET", f"/contacts/search?q={contact_name(i).split()[1].lower()}&limit=10", None
+        elif kind < 0.9:
+            yield "notes_by_tag", "GET", f"/notes?tag={rng.choice(TAGS)}&limit=10", None
+        else:
+            yield "birthdays", "GET", "/birthdays?days=3", None
+
+async def client(host: str, port: int, requests, stop: float, latencies: dict, errors: list):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.perf_counter() < stop:
+            kind, method, path, body = next(requests)
+            data = json.dumps(body).encode() if body is not None else b""
+            start = time.perf_counter()
+            writer.write(f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data)
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while (line := await reader.readline()) not in (b"\r\n", b""):
+                key, _, value = line.decode().partition(":")
+                if key.lower() == "content-length":
+                    length = int(value)
+            await reader.readexactly(length)
+            latencies.setdefault(kind, []).append(time.perf_counter() - start)
+            if status >= 500 or (status >= 400 and kind != "get_contact"):
+                errors.append(f"{method} {path}: {status}")
+    finally:
+        writer.close()
+
+async def run(host: str, port: int, clients: int, duration: float, contacts: int, write_ratio: float, seed: int) -> dict:
+    # the first search and birthday queries build indexes; that is startup cost, not throughput
+    warm_up = requests(random.Random(seed), contacts, 0.0)
+    await client(host, port, warm_up, time.perf_counter() + 1.0, {}, [])
+    latencies, errors = {}, []
+    stop = time.perf_counter() + duration
+    start = time.perf_counter()
+    await asyncio.gather(*(client(host, port, requests(random.Random(seed + n), contacts, write_ratio),
+                                  stop, latencies, errors) for n in range(clients)))
+    elapsed = time.perf_counter() - start
+    samples = sorted(latency for values in latencies.values() for latency in values)
+    def percentile(p):
+        return round(samples[min(len(samples) - 1, int(len(samples) * p / 100))] * 1000, 2) if samples else None
+    return {
+        "clients": clients,
+        "duration_s": round(elapsed, 2),
+        "requests": len(samples),
+        "requests_per_s": round(len(samples) / elapsed, 1),
+        "errors": len(errors),
+        "first_errors": errors[:5],
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "by_kind": {kind: {"requests": len(values), "median_ms": round(statistics.median(values) * 1000, 2)}
+                    for kind, values in sorted(latencies.items())},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--contacts", type=int, default=10_000)
+    parser.add_argument("--notes", type=int, default=10_000)
+    parser.add_argument("--write-ratio", type=float, default=0.1, help="share of requests that change data")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, help="test a server already running on this port instead of starting one")
+    args = parser.parse_args()
+
+    if args.port:
+        result = asyncio.run(run("127.0.0.1", args.port, args.clients, args.duration, args.contacts,
+                                 args.write_ratio, args.seed))
+    else:
+        with tempfile.TemporaryDirectory() as workdir:
+            write_data(workdir, args.contacts, args.notes)
+            port = free_port()
+            server = start_server(workdir, port)
+            try:
+                result = asyncio.run(run("127.0.0.1", port, args.clients, args.duration, args.contacts,
+                                         args.write_ratio, args.seed))
+            finally:
+                server.terminate()
+                server.wait()
+    print(json.dumps(result, indent=2))
+    if result["errors"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
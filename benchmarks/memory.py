@@ -0,0 +1,89 @@
+"""
+Measures the memory used per contact by Record, its fields and the AddressBook.
+
+Every book is also built from copies of Record and the fields as they were before they
+declared __slots__, keeping their attributes in a per-instance __dict__, so both layouts
+are measured side by side.
+"""
+import argparse
+import gc
+import json
+import tracemalloc
+
+from src.address_book.classes import Address, AddressBook, Email, Record, parse_birthday
+
+class DictField:
+    """A field as it was before __slots__: the value lives in the instance __dict__."""
+    def __init__(self, value: str):
+        self.value = value
+
+class DictBirthday(DictField):
+    """A birthday as it was before __slots__, with its parsed date."""
+    def __init__(self, value: str):
+        self.date = parse_birthday(value)
+        super().__init__(value)
+
+class DictRecord:
+    """A record as it was before __slots__, including the type placeholders it held for a missing address or email."""
+    _book = None
+
+    def __init__(self, name: str):
+        self.name = DictField(name)
+        self.address = Address | None
+        self.birthday = None
+        self.phones = []
+        self.email = Email | None
+
+def build_book(count: int, full: bool, slotted: bool = True) -> AddressBook:
+    """
+    Builds a book of `count` contacts; `full` contacts also get an email, address and birthday.
+
+    With `slotted` False the contacts are DictRecord objects with DictField fields instead.
+    """
+    book = AddressBook()
+    for i in range(count):
+        name, phone = f"Contact{i:07d}", f"099{i:07d}"
+        email, address = f"contact{i}@example.com", f"Street {i % 500}, {i % 97}"
+        birthday = f"{i % 28 + 1:02d}.{i % 12 + 1:02d}.{1950 + i % 60}"
+        if slotted:
+            record = Record(name)
+            record.add_phone(phone)
+            if full:
+                record.add_email(email)
+                record.add_address(address)
+                record.add_birthday(birthday)
+        else:
+            record = DictRecord(name)
+            record.phones.append(DictField(phone))
+            if full:
+                record.email = DictField(email)
+                record.address = DictField(address)
+                record.birthday = DictBirthday(birthday)
+        book.add_record(record)
+    return book
+
+def measure(count: int, full: bool, slotted: bool = True) -> dict:
+    """Returns the traced bytes per contact for a book of `count` contacts."""
+    gc.collect()
+    tracemalloc.start()
+    book = build_book(count, full, slotted)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del book
+    return {
+        "contacts": count,
+        "full": full,
+        "layout": "slots" if slotted else "dict",
+        "bytes_per_contact": round(current / count, 1),
+        "peak_bytes_per_contact": round(peak / count, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=100_000)
+    args = parser.parse_args()
+    results = [measure(args.count, full, slotted) for full in (False, True) for slotted in (False, True)]
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Measures startup: import time of main.py and time to the first interactive prompt on a large book."""
+import argparse
+import json
+import os
+import pickle
+import pty
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.memory import build_book
+from src.mapped_storage import save_mapped
+from src.notes.classes import Note, NoteBook
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, "main.py")
+PROMPT = b"Enter a command"
+# what main.py cannot start without: the interpreter and the prompt and banner libraries
+BASELINE = ("from prompt_toolkit import PromptSession; from prompt_toolkit.auto_suggest import AutoSuggestFromHistory; "
+            "from prompt_toolkit.formatted_text import HTML; import cowsay")
+
+def import_times(top: int = 10) -> dict:
+    """Runs `python -X importtime` on main.py and returns the total and the slowest imports in ms."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        fields = line.removeprefix("import time:").split("|")
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        modules.append((int(fields[1]) / 1000, fields[2].strip()))
+    total = next(ms for ms, name in modules if name == "main")
+    slowest = sorted((m for m in modules if m[1] != "main"), reverse=True)[:top]
+    return {"import_main_ms": round(total, 1), "slowest_imports_ms": {name: round(ms, 1) for ms, name in slowest}}
+
+def baseline_time(runs: int) -> float:
+    """Returns the median ms Python takes to start and import the libraries the prompt needs."""
+    times = []
+    for _ in range(runs + 1):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", BASELINE], cwd=ROOT, check=True)
+        times.append((time.perf_counter() - start) * 1000)
+    # the first run only warms the caches
+    return statistics.median(times[1:])
+
+def write_data(workdir: str, contacts: int, notes: int, mapped: bool = False):
+    """Writes an address book and a note book of the given sizes where main.py looks for them."""
+    os.makedirs(os.path.join(workdir, "storage"))
+    book = build_book(contacts, full=True)
+    if mapped:
+        save_mapped(book, os.path.join(workdir, "storage", "addressbook.rec"))
+    else:
+        with open(os.path.join(workdir, "storage", "addressbook.pkl"), "wb") as f:
+            pickle.dump(book, f)
+    note_book = NoteBook()
+    for i in range(notes):
+        note = Note(f"note{i:06d}", f"text of note number {i} about project {i % 50}")
+        note.add_tag(f"tag{i % 20}")
+        note_book.add_note(note)
+    os.makedirs(os.path.join(workdir, ".my_assistant_data"))
+    with open(os.path.join(workdir, ".my_assistant_data", "notes.pkl"), "wb") as f:
+        pickle.dump(note_book, f)
+
+def time_to_prompt(workdir: str, timeout: float = 30.0) -> float:
+    """Starts main.py in a pseudo terminal and returns the ms until the prompt is drawn."""
+    env = dict(os.environ, HOME=workdir, PYTHONPATH=ROOT)
+    start = time.perf_counter()
+    pid, fd = pty.fork()
+    if pid == 0:
+        os.chdir(workdir)
+        os.execve(sys.executable, [sys.executable, MAIN], env)
+    output = b""
+    try:
+        while PROMPT not in output:
+            if time.perf_counter() - start > timeout:
+                raise TimeoutError("main.py did not show a prompt")
+            try:
+                output += os.read(fd, 65536)
+            except OSError:
+                raise RuntimeError("main.py exited before showing a prompt") from None
+        return (time.perf_counter() - start) * 1000
+    finally:
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+        os.close(fd)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--contacts", type=int, default=10_000)
+    parser.add_argument("--notes", type=int, default=10_000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--mapped", action="store_true", help="store the contacts in the memory-mapped format")
+    parser.add_argument("--budget-ms", type=float, default=100.0,
+                        help="fail when the median time to the first prompt exceeds the baseline "
+                             "(starting Python and importing prompt_toolkit and cowsay) by more than this")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as workdir:
+        write_data(workdir, args.contacts, args.notes, args.mapped)
+        # the first run also writes the bytecode caches
+        time_to_prompt(workdir)
+        runs = [time_to_prompt(workdir) for _ in range(args.runs)]
+    baseline = baseline_time(args.runs)
+    result = {
+        "contacts": args.contacts,
+        "notes": args.notes,
+        "storage": "mapped" if args.mapped else "pickle",
+        "time_to_prompt_ms": round(statistics.median(runs), 1),
+        "time_to_prompt_runs_ms": [round(ms, 1) for ms in runs],
+        "baseline_ms": round(baseline, 1),
+        "over_baseline_ms": round(statistics.median(runs) - baseline, 1),
+        "budget_ms": args.budget_ms,
+        **import_times(),
+    }
+    print(json.dumps(result, indent=2))
+    if result["over_baseline_ms"] > args.budget_ms:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Times the core address book and notes operations on generated books of one size."""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from benchmarks.data import make_contacts, make_notes
+
+# fixed so birthday results do not depend on the day the suite runs
+TODAY = datetime(2024, 3, 1)
+
+def _resident_peak_kb() -> int | None:
+    """Returns the peak resident memory of this process, where the platform reports it."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def measure(operation, repeat: int) -> dict:
+    """
+    Runs the operation once cold and `repeat` more times warm, then once more under tracemalloc.
+
+    The cold run includes building lazy indexes; the warm runs show the steady state.
+    Memory is traced in a separate run so tracing does not slow down the timed ones.
+    """
+    start = time.perf_counter()
+    result = operation()
+    cold = time.perf_counter() - start
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        operation()
+        runs.append(time.perf_counter() - start)
+    tracemalloc.start()
+    operation()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "cold_ms": round(cold * 1000, 3),
+        "median_ms": round(statistics.median(runs) * 1000, 3) if runs else None,
+        "min_ms": round(min(runs) * 1000, 3) if runs else None,
+        "peak_kb": round(peak / 1024, 1),
+        "results": len(result) if hasattr(result, "__len__") else None,
+    }
+
+def operations(book, notes, workdir: str) -> dict:
+    """Returns the benchmarked operations by name."""
+    from prompt_toolkit.document import Document
+    import src.notes.handlers as notes_handlers
+    from src.autocompleter import MultiStageCompleter
+    from src.query import find_contacts, find_notes
+    from src.storage import load_data, load_notes, save_data, save_notes
+
+    # the completer reads notes through get_note_book()
+    notes_handlers.note_book = notes
+    notes_handlers._loaded = True
+    completer = MultiStageCompleter(["search", "note-tag-search"], book)
+
+    def complete(text):
+        return lambda: list(completer.get_completions(Document(text), None))
+
+    def fetch(filename, save, get):
+        # without the save operation before it, the first (cold) run writes the file
+        def operation():
+            if not os.path.exists(filename):
+                save()
+            return get()
+        return operation
+
+    contacts_file = os.path.join(workdir, "addressbook.pkl")
+    mapped_file = os.path.join(workdir, "addressbook.rec")
+    blocks_file = os.path.join(workdir, "addressbook.blk")
+    notes_file = os.path.join(workdir, "notes.pkl")
+    contact = sorted(book.data)[len(book.data) // 2] if book.data else ""
+    return {
+        "search_name": lambda: book.search("kovalenko"),
+        "search_email": lambda: book.search("@corp.com"),
+        "search_phone": lambda: book.search("0771"),
+        "upcoming_birthdays": lambda: book.get_upcoming_birthdays(7, today=TODAY),
+        "query_contacts": lambda: find_contacts(book, "name:ann email:@corp.com birthday:03..05"),
+        "note_search": lambda: notes.search("quarterly"),
+        "note_find_by_text": lambda: notes.find_by_text("quarterly rev"),
+        "note_find_by_tag": lambda: notes.find_by_tag("urgent"),
+        "note_find_by_regex": lambda: notes.find_by_regex(r"quarter\w* rev"),
+        "query_notes": lambda: find_notes(notes, 'tag:work AND tag:urgent "quarterly"'),
+        "complete_contact": complete("search Sof"),
+        "complete_tag": complete("note-tag-search u"),
+        "save_data": lambda: save_data(book, contacts_file),
+        "load_data": lambda: load_data(contacts_file),
+        "save_data_mapped": lambda: save_data(book, mapped_file),
+        "load_data_mapped": lambda: load_data(mapped_file),
+        "save_data_blocks": lambda: save_data(book, blocks_file),
+        "load_data_blocks": lambda: load_data(blocks_file),
+        "fetch_contact_pickle": fetch(contacts_file, lambda: save_data(book, contacts_file),
+                                      lambda: [load_data(contacts_file).data[contact]]),
+        "fetch_contact_blocks": fetch(blocks_file, lambda: save_data(book, blocks_file),
+                                      lambda: [load_data(blocks_file).data[contact]]),
+        "save_notes": lambda: save_notes(notes, notes_file),
+        "load_notes": lambda: load_notes(notes_file),
+    }
+
+def run(contacts: int, notes: int, repeat: int = 3, seed: int = 0, only: list[str] | None = None) -> dict:
+    """Generates the books and measures every operation, or only the named ones."""
+    start = time.perf_counter()
+    book = make_contacts(contacts, seed)
+    note_book = make_notes(notes, seed)
+    generate = time.perf_counter() - start
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, operation in operations(book, note_book, workdir).items():
+            if only and name not in only:
+                continue
+            results[name] = measure(operation, repeat)
+        # sizes of the files the save operations wrote, to compare the formats
+        files = {name: round(os.path.getsize(os.path.join(workdir, name)) / 1024, 1)
+                 for name in sorted(os.listdir(workdir)) if not name.endswith((".lock", ".journal"))}
+    return {
+        "contacts": contacts,
+        "notes": notes,
+        "generate_ms": round(generate * 1000, 1),
+        "operations": results,
+        "file_kb": files,
+        "peak_rss_kb": _resident_peak_kb(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--contacts", type=int, default=1000)
+    parser.add_argument("--notes", type=int, default=None, help="defaults to the number of contacts")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="*", help="names of the operations to run")
+    args = parser.parse_args()
+    notes = args.contacts if args.notes is None else args.notes
+    print(json.dumps(run(args.contacts, notes, args.repeat, args.seed, args.only), indent=2))
+
+if __name__ == "__main__":
+    main()
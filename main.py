@@ -1,11 +1,11 @@
-from prompt_toolkit.auto_suggest import AutoSuggestFromHistory
+import sys
+from itertools import chain
 import src.address_book.validators as validators
 from src.address_book.classes import AddressBook
-from colorama import Fore, init
-from prompt_toolkit import PromptSession
-from prompt_toolkit.formatted_text import HTML
-import cowsay
-from src.autocompleter import MultiStageCompleter
+from colorama import Fore, init, deinit
+from src.batch import run_batch
+from src.metrics import PROFILE_TOP, entry_phase, metrics
+from src.tables import PagedTable, page_through
 
 # reset cmd colors
 init(autoreset=True)
@@ -13,13 +13,18 @@ init(autoreset=True)
 from src.address_book.handlers import (
     close,
     command_list,
+    stats,
+    compact,
     add_contact,
     add_address,
     add_birthday,
     add_email,
     birthdays,
     list_contacts,
+    import_file,
+    export_file,
     find_contact,
+    lookup_phone,
     delete_contact,
     edit_address,
     edit_phone,
@@ -36,14 +41,11 @@ from src.notes.handlers import (
     note_tag_search_command,
     note_tag_sort_command,
     note_delete_command,
-    note_all_command
+    note_all_command,
+    note_export_command
 )
 
-from src.storage import (load_data, save_data, load_notes)
-
-loaded_notes = load_notes(default=note_book)
-if loaded_notes:
-    note_book.data = loaded_notes.data
+from src.storage import (load_data, save_data, data_file, notes_file, journal, notes_saver, compactor, BackgroundLoad)
 
 @validators.parse_input_validator
 def parse_input(user_input):
@@ -57,13 +59,18 @@ commands = {
     "exit": close,
     "hello": lambda args, book: Fore.GREEN + "How can I help you?",
     "help": command_list,
+    "stats": stats,
+    "compact": compact,
     "add": add_contact,
     "add-address": add_address,
     "add-birthday": add_birthday,
     "add-email": add_email,
     "birthdays": birthdays,
+    "import": import_file,
+    "export": export_file,
     "all": list_contacts,
     "search": find_contact,
+    "lookup-phone": lookup_phone,
     "delete": delete_contact,
     "edit-address": edit_address,
     "edit-phone": edit_phone,
@@ -76,18 +83,31 @@ commands = {
     "note-tag-search": note_tag_search_command,
     "note-tag-sort": note_tag_sort_command,
     "note-all": note_all_command,
+    "note-export": note_export_command,
     "note-delete": note_delete_command
 }
 
 def main():
     """Main function."""
-    book = load_data(default=AddressBook())
+    # the prompt and the banner are the only users of these modules, so they are imported here
+    # instead of slowing down batch mode; notes are loaded by the first note command
+    from prompt_toolkit import PromptSession
+    from prompt_toolkit.auto_suggest import AutoSuggestFromHistory
+    from prompt_toolkit.formatted_text import HTML
+    import cowsay
+    from src.autocompleter import MultiStageCompleter
+
+    # the address book is read while the first command is typed
+    loader = BackgroundLoad(open_book)
+    notes_saver.open(note_book, notes_file())
+    compactor.start()
     cowsay.cow("  Welcome to the assistant bot!  ")
-    print(command_list())
+    print(Fore.GREEN + "Type 'help' to see the list of commands.")
 
-    command_completer = MultiStageCompleter(commands.keys(), book)
+    command_completer = MultiStageCompleter(commands.keys(), loader.result)
     session = PromptSession()
-    
+    book = None
+
     try:
         while True:
             user_input = session.prompt(HTML('<yellow>Enter a command: </yellow>'), completer=command_completer, auto_suggest=AutoSuggestFromHistory(), complete_while_typing=True)
@@ -96,22 +116,107 @@ def main():
                 continue
                 
             command, *args = parse_input(user_input)
+            book = loader.result()
+            # changes other sessions made since the last command
+            journal.refresh(book)
 
             if command in commands:
                 try:
-                    result = commands[command](args, book)
-                    if result is not None:
-                        print(result)
+                    with metrics.command(command, entry_phase(commands[command])):
+                        result = commands[command](args, book)
+                        with metrics.phase("render"):
+                            if isinstance(result, PagedTable):
+                                # time spent reading the pager's prompt is the user's, not the command's
+                                page_through(result, read=metrics.untimed(input))
+                            elif result is not None:
+                                print(result)
                 except Exception as e:
                     print(Fore.RED + f"Error: {e}")
             else:
                 print(Fore.RED + "Invalid command. Please try again.")
+            for name in notes_saver.take_conflicts():
+                print(Fore.RED + f"Note '{name}' was also changed in another session; that version was kept.")
+            for error in notes_saver.take_errors():
+                print(Fore.RED + f"Notes could not be saved, retrying: {error}")
     except KeyboardInterrupt:
         cowsay.cow('Bye (╥﹏╥)')
     except EOFError:
         cowsay.cow('Bye (╥﹏╥)')
     finally:
-        save_data(book)
+        compactor.stop()
+        if book is not None and journal.needs_checkpoint():
+            save_data(book)
+        journal.close()
+        notes_saver.close()
+        for error in notes_saver.take_errors():
+            print(Fore.RED + f"Notes could not be saved: {error}")
+
+def open_book():
+    """Loads the address book and starts journaling its changes."""
+    book = load_data(default=AddressBook())
+    journal.open(book, data_file())
+    return book
+
+def batch(lines, as_json=False):
+    """Runs commands without the interactive prompt and saves once at the end. Returns the exit status."""
+    # colorama would append color resets to machine readable output
+    deinit()
+    book = open_book()
+    notes_saver.open(note_book, notes_file(), background=False)
+    try:
+        failed = run_batch(lines, parse_input, commands, book, sys.stdout, as_json)
+    finally:
+        # the changes of the commands are folded into one snapshot
+        if journal.appended or journal.needs_checkpoint():
+            save_data(book)
+        journal.close()
+        notes_saver.close()
+    for name in notes_saver.take_conflicts():
+        print(f"Note '{name}' was also changed in another session; that version was kept.", file=sys.stderr)
+    errors = notes_saver.take_errors()
+    for error in errors:
+        print(f"Notes could not be saved: {error}", file=sys.stderr)
+    return 1 if failed or errors else 0
+
+def serve_api(host, port):
+    """Serves the address book and notes over HTTP until interrupted, then folds the journal into a snapshot."""
+    from src.server import serve
+    deinit()
+    book = open_book()
+    notes_saver.open(note_book, notes_file())
+    compactor.start()
+    try:
+        serve(book, host, port)
+    finally:
+        compactor.stop()
+        if journal.appended or journal.needs_checkpoint():
+            save_data(book)
+        journal.close()
+        notes_saver.close()
+
+def parse_args(argv=None):
+    """Parses the command line options."""
+    import argparse
+    parser = argparse.ArgumentParser(description="Address book with notes.")
+    parser.add_argument("--batch", action="store_true", help="read commands from stdin, one per line")
+    parser.add_argument("-c", dest="command_lines", action="append", default=[], metavar="COMMAND",
+                        help="run a command without the interactive prompt; can be repeated")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per command instead of plain text")
+    parser.add_argument("--serve", action="store_true", help="serve the address book and notes as a local HTTP/JSON API")
+    parser.add_argument("--host", default="127.0.0.1", help="address the API listens on")
+    parser.add_argument("--port", type=int, default=8080, help="port the API listens on")
+    parser.add_argument("--profile", type=int, nargs="?", const=PROFILE_TOP, default=0, metavar="N",
+                        help="run every command under cProfile and print its N slowest functions to stderr")
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
+    # argparse is only imported when there are options to parse
+    options = parse_args() if len(sys.argv) > 1 else None
+    if options:
+        metrics.profile = options.profile
+    if options and options.serve:
+        sys.exit(serve_api(options.host, options.port))
+    if options and (options.batch or options.command_lines):
+        lines = chain(options.command_lines, sys.stdin if options.batch else ())
+        sys.exit(batch(lines, options.json))
     main()
@@ -1,47 +1,114 @@
+import re
 from collections import UserDict
-from datetime import datetime, timedelta
+from datetime import date, datetime
+from itertools import islice
 from colorama import Fore, init
+from .indexes import BirthdayIndex, PhoneIndex, TrigramIndex, search_texts
+from src.fuzzy import FuzzyIndex
 init(autoreset=True)
 
+def _restore_slots(obj, state):
+    """Restores pickled state into a slotted object, including state pickled before __slots__ were used."""
+    if type(state) is tuple:
+        # (__dict__ state, slot state) as produced for slotted objects
+        dict_state, state = state
+        if dict_state:
+            state = {**dict_state, **state}
+    for key, value in state.items():
+        setattr(obj, key, value)
+
 class Field:
     """Base class for fields in the address book."""
+    __slots__ = ("value",)
+
     def __init__(self, value: str):
         self.value = value
 
+    def __getstate__(self):
+        # the value in a one-tuple pickles smaller and loads faster than the slot state;
+        # a bare value would not do, since pickle skips __setstate__ for a falsy state like ""
+        return (self.value,)
+
+    def __setstate__(self, state):
+        if type(state) is tuple and len(state) == 1:
+            self.value = state[0]
+        elif isinstance(state, (dict, tuple)):
+            _restore_slots(self, state)
+        else:
+            # the bare value stored by earlier versions
+            self.value = state
+
     def __str__(self):
         return str(self.value)
 
 class Name(Field):
     """Represents a person's name in the address book."""
+    __slots__ = ()
 
 class Address(Field):
     """Represents an address in the address book."""
+    __slots__ = ()
+
     def __init__(self, value: str):
         if not isinstance(value, str):
             raise ValueError(Fore.RED + "Address must be a string")
         super().__init__(value)
 
+NON_DIGITS = re.compile(r"\D")
+BIRTHDAY_FORMAT = re.compile(r"(\d{1,2})\.(\d{1,2})\.(\d{4})")
+
+def normalize_phone(phone: str) -> str:
+    """Returns the canonical key of a phone number: its digits without separators."""
+    return NON_DIGITS.sub("", phone)
+
+def parse_birthday(value: str) -> date:
+    """Parses a DD.MM.YYYY date, like strptime with "%d.%m.%Y" but much faster."""
+    match = BIRTHDAY_FORMAT.fullmatch(value)
+    if match is None:
+        raise ValueError(f"time data {value!r} does not match format '%d.%m.%Y'")
+    day, month, year = match.groups()
+    return date(int(year), int(month), int(day))
+
 class Phone(Field):
     """Represents a phone number in the address book."""
+    __slots__ = ()
+
+    @property
+    def key(self) -> str:
+        """The normalized phone number used for lookups."""
+        return normalize_phone(self.value)
 
 class Email(Field):
     """Represents an email address in the address book."""
+    __slots__ = ()
+
     def __init__(self, value):
         if "@" not in value:
             raise ValueError(Fore.RED + "Email must contain an '@' symbol. Got: " + value)
         super().__init__(value)
 
 class Birthday(Field):
-    """Represents a birthday in the address book."""
+    """Represents a birthday in the address book. The parsed date is kept in `date`."""
+    __slots__ = ("date",)
+
     def __init__(self, value: str):
         try:
             if not isinstance(value, str):
                 raise ValueError(Fore.RED + "Birthday must be a string in the format DD.MM.YYYY")
-            self.value = datetime.strptime(value, "%d.%m.%Y").date()
+            self.date = parse_birthday(value)
         except ValueError as e:
             raise ValueError(Fore.RED + "Invalid date format. Use DD.MM.YYYY") from e
         super().__init__(value)
 
+    def __getstate__(self):
+        return {"value": self.value, "date": self.date}
+
+    def __setstate__(self, state):
+        _restore_slots(self, state)
+        if not hasattr(self, "date"):
+            # pickled before the parsed date was stored
+            self.date = parse_birthday(self.value)
+
 class Record:
     """
     Represents a record in the address book.
@@ -53,16 +120,34 @@ class Record:
         phones (list[Phone]): A list of phone numbers associated with the record.
         email (Email): The email address of the record.
     """
+    __slots__ = ("name", "address", "birthday", "phones", "email", "_book")
+
     def __init__(self, name: str):
         self.name = Name(name)
-        self.address = Address | None
+        self.address: Address | None = None
         self.birthday: Birthday | None = None
-        self.phones = []
-        self.email = Email | None
+        self.phones: list[Phone] = []
+        self.email: Email | None = None
+        self._book = None
+
+    def __setstate__(self, state):
+        self._book = None
+        _restore_slots(self, state)
+        # old pickles kept the `Address | None` type itself as a placeholder
+        if not isinstance(self.address, Address):
+            self.address = None
+        if not isinstance(self.email, Email):
+            self.email = None
+
+    def _changed(self):
+        """Lets the owning address book refresh its indexes for this record."""
+        if self._book is not None:
+            self._book._reindex(self)
 
     def add_address(self, address: str):
         """Adds an address to the record."""
         self.address = Address(address)
+        self._changed()
 
     def show_address(self) -> str:
         """Returns the address of the record."""
@@ -71,6 +156,7 @@ class Record:
     def add_birthday(self, birthday: str):
         """Adds a birthday to the record."""
         self.birthday = Birthday(birthday)
+        self._changed()
 
     def show_birthday(self) -> str:
         """Returns the birthday of the record."""
@@ -81,6 +167,7 @@ class Record:
     def add_phone(self, phone: str):
         """Adds a phone number to the record."""
         self.phones.append(Phone(phone))
+        self._changed()
 
     def edit_address(self, new_address: str):
         """Edits the address of the record."""
@@ -88,28 +175,35 @@ class Record:
             self.address = Address(new_address)
         else:
             self.address.value = new_address
+        self._changed()
 
     def edit_phone(self, old_phone: str, new_phone: str):
         """Edits a phone number in the record."""
+        old_key = normalize_phone(old_phone)
         for i, p in enumerate(self.phones):
-            if p.value == old_phone:
+            if p.key == old_key:
                 self.phones[i] = Phone(new_phone)
                 break
+        self._changed()
 
     def find_phone(self, phone: str) -> Phone | None:
-        """Finds a phone number in the record."""
+        """Finds a phone number in the record, ignoring formatting."""
+        key = normalize_phone(phone)
         for p in self.phones:
-            if p.value == phone:
+            if p.key == key:
                 return p
         return None
 
     def remove_phone(self, phone: str):
         """Removes a phone number from the record."""
-        self.phones = [p for p in self.phones if p.value != phone]
+        key = normalize_phone(phone)
+        self.phones = [p for p in self.phones if p.key != key]
+        self._changed()
 
     def add_email(self, email: str):
         """Adds an email address to the record."""
         self.email = Email(email)
+        self._changed()
 
     def show_email(self) -> str:
         """Returns the email of the record."""
@@ -121,6 +215,7 @@ class Record:
             self.email = Email(new_email)
         else:
             self.email.value = new_email
+        self._changed()
 
     def __str__(self):
         return (
@@ -140,73 +235,178 @@ class AddressBook(UserDict):
 
     Attributes:
         data (dict[str, Record]): A dictionary that stores the records in the address book.
+        journal_seq (int): Sequence number of the last journaled mutation applied to the book.
+        generation (int): Incremented whenever a name is added or removed, used to invalidate caches.
     """
     data: dict[str, Record]
-    
+    journal_seq: int = 0
+    generation: int = 0
+    _search_index: TrigramIndex | None = None
+    _birthday_index: BirthdayIndex | None = None
+    _phone_index: PhoneIndex | None = None
+    _fuzzy_index: FuzzyIndex | None = None
+
+    def _indexes(self):
+        """Returns the indexes that have been built so far."""
+        indexes = (self._search_index, self._birthday_index, self._phone_index, self._fuzzy_index)
+        return [index for index in indexes if index is not None]
+
+    def __setitem__(self, name: str, record: Record):
+        if name not in self.data:
+            self.generation += 1
+        self.data[name] = record
+        record._book = self
+        for index in self._indexes():
+            index.update(record)
+
+    def __delitem__(self, name: str):
+        del self.data[name]
+        self.generation += 1
+        for index in self._indexes():
+            index.remove(name)
+
+    def __getstate__(self):
+        # indexes are rebuilt on demand instead of being pickled
+        state = self.__dict__.copy()
+        state.pop('_search_index', None)
+        state.pop('_birthday_index', None)
+        state.pop('_phone_index', None)
+        state.pop('_fuzzy_index', None)
+        return state
+
+    def _reindex(self, record: Record):
+        """Refreshes the indexes after a record in the book was changed."""
+        if self.data.get(record.name.value) is not record:
+            return
+        for index in self._indexes():
+            index.update(record)
+
+    def reset_indexes(self):
+        """Drops all indexes; they are rebuilt on next use. Cheaper than updating them during bulk changes."""
+        self._search_index = None
+        self._birthday_index = None
+        self._phone_index = None
+        self._fuzzy_index = None
+
+    def _records(self):
+        """Yields every record in the book, bound to the book so its changes reach the indexes."""
+        for record in self.data.values():
+            record._book = self
+            yield record
+
+    def _build(self, index):
+        """Fills a new index with every record in the book."""
+        for record in self._records():
+            index.update(record)
+        return index
+
+    @property
+    def search_index(self) -> TrigramIndex:
+        """Trigram index over the searchable fields, built on first use."""
+        if self._search_index is None:
+            self._search_index = self._build(TrigramIndex())
+        return self._search_index
+
+    @property
+    def birthday_index(self) -> BirthdayIndex:
+        """Index of birthdays by month and day, built on first use."""
+        if self._birthday_index is None:
+            birthdays = getattr(self.data, "birthdays", None)
+            if birthdays is not None:
+                # a SQLite book lists the birthdays without reading the records
+                self._birthday_index = BirthdayIndex().build_days(birthdays())
+            else:
+                self._birthday_index = BirthdayIndex().build(self._records())
+        return self._birthday_index
+
+    @property
+    def phone_index(self) -> PhoneIndex:
+        """Index of owners by normalized phone number, built on first use."""
+        if self._phone_index is None:
+            self._phone_index = self._build(PhoneIndex())
+        return self._phone_index
+
+    @property
+    def fuzzy_index(self) -> FuzzyIndex:
+        """Typo tolerant index of record names, built on first use."""
+        if self._fuzzy_index is None:
+            # built from the names alone, so records of a mapped book are not read
+            index = FuzzyIndex(key=lambda record: record.name.value)
+            for name in self.data:
+                index.add(name)
+            self._fuzzy_index = index
+        return self._fuzzy_index
+
     def names(self):
         """Returns names of all records in the address book."""
         return list(self.data.keys())
-        
+
+    def page(self, start: int, stop: int) -> list[Record]:
+        """Returns the records from position start to stop in book order; a mapped book decodes only those."""
+        names = getattr(self.data, "names", None)
+        if names is not None:
+            return [self.data[name] for name in names()[start:stop]]
+        return list(islice(self.data.values(), start, stop))
+
+    def sorted_names(self):
+        """Returns the names in sorted order; a mapped book answers from its on-disk index."""
+        sorted_names = getattr(self.data, "sorted_names", None)
+        return sorted_names() if sorted_names is not None else sorted(self.data)
 
     def add_record(self, record: Record):
         """Adds a record to the address book."""
-        self.data[record.name.value] = record
+        self[record.name.value] = record
 
     def find(self, name: str) -> Record | None:
         """Finds a record in the address book by name."""
         return self.data.get(name)
 
+    def find_by_phone(self, phone: str) -> list[Record]:
+        """Finds the records that own a phone number, whatever its formatting."""
+        key = normalize_phone(phone)
+        find_by_phone = getattr(self.data, "find_by_phone", None)
+        if self._phone_index is None and find_by_phone is not None:
+            # a SQLite book asks its phone index instead of reading every record
+            return [self.data[name] for name in find_by_phone(key)]
+        return [self.data[name] for name in self.phone_index.names(key)]
+
+    def suggest(self, name: str, limit: int = 5) -> list[Record]:
+        """Returns records whose names are a few typos away from the given name."""
+        return [self.data[n] for n in self.fuzzy_index.suggest(name, limit)]
+
     def delete(self, name: str) -> None:
         """Deletes a record from the address book."""
         if name in self.data:
-            del self.data[name]
+            del self[name]
 
     def get_upcoming_birthdays(
             self,
             upcoming_days: int = 7,
-            today: datetime = datetime.now()
+            today: datetime | None = None
         ) -> list[Record]:
-        """Returns a list of records with upcoming birthdays by the given number of days."""
+        """Returns records with birthdays within the given number of days, in calendar order."""
+        if today is None:
+            today = datetime.now()
         if not isinstance(today, datetime):
-            raise ValueError(Fore.RED + "Today must be a datetime object got: " + type(today))
+            raise ValueError(Fore.RED + "Today must be a datetime object got: " + str(type(today)))
         if not isinstance(upcoming_days, int) or upcoming_days < 0:
             raise ValueError(Fore.RED + "Upcoming days must be a non-negative integer. Got: " + str(upcoming_days))
         if len(self.data) == 0:
             return []
 
-        upcoming_date = today.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=upcoming_days)
-
-        upcoming_birthdays = []
-
-        for record in self.data.values():
-            if record.birthday is not None:
-                bday_date = datetime.strptime(record.birthday.value, "%d.%m.%Y").date()
-                bday_this_year = bday_date.replace(year=today.year)
-                birthday_diff = (upcoming_date.date() - bday_this_year).days
-                if 0 <= birthday_diff <= upcoming_days:
-                    upcoming_birthdays.append(record)
-        return upcoming_birthdays
+        names = self.birthday_index.upcoming(today.date(), upcoming_days)
+        return [self.data[name] for name in names]
 
     def search(self, keyword: str):
+        """Returns records whose name, phone, email, address or birthday contains the keyword."""
         keyword = keyword.lower()
-        results = []
-
-        for record in self.data.values():
-            name = getattr(record.name, 'value', '')
-            phones = [getattr(phone, 'value', '') for phone in record.phones]
-            email = getattr(record.email, 'value', '') if record.email else ''
-            address = getattr(record.address, 'value', '') if record.address else ''
-            birthday = getattr(record.birthday, 'value', '') if record.birthday else ''
-
-            if (
-                keyword in name.lower()
-                or any(keyword in p.lower() for p in phones)
-                or keyword in email.lower()
-                or keyword in address.lower()
-                or keyword in birthday.lower()
-            ):
-                results.append(record)
-
-        return results
-
-
+        search = getattr(self.data, "search", None)
+        if self._search_index is None and search is not None:
+            # a SQLite book scans its tables instead of reading every record into the trigram index
+            return [self.data[name] for name in search(keyword)]
+        names = self.search_index.candidates(keyword)
+        records = self.data.values() if names is None else (self.data[name] for name in names)
+        return [
+            record for record in records
+            if any(keyword in text for text in search_texts(record))
+        ]
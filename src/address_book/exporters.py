@@ -0,0 +1,59 @@
+import csv
+from typing import Iterable, Iterator, TextIO
+
+from .classes import AddressBook, Record, Address, Email
+from src.exporters import write_jsonl
+
+CSV_HEADER = ["name", "phones", "email", "address", "birthday"]
+
+def contact_rows(records: Iterable[Record]) -> Iterator[dict]:
+    """Yields one plain dict per contact, in the column layout read back by `import`."""
+    for record in records:
+        yield {
+            "name": record.name.value,
+            "phones": [phone.value for phone in record.phones],
+            "email": record.email.value if isinstance(record.email, Email) else "",
+            "address": record.address.value if isinstance(record.address, Address) else "",
+            "birthday": record.birthday.value if record.birthday else "",
+        }
+
+def write_csv(rows: Iterable[dict], out: TextIO) -> int:
+    """Writes contacts as CSV with phones separated by ';'. Returns the number of rows."""
+    writer = csv.writer(out)
+    writer.writerow(CSV_HEADER)
+    count = 0
+    for row in rows:
+        writer.writerow([row["name"], ";".join(row["phones"]), row["email"], row["address"], row["birthday"]])
+        count += 1
+    return count
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace(",", "\\,").replace(";", "\\;").replace("\n", "\\n")
+
+def write_vcard(rows: Iterable[dict], out: TextIO) -> int:
+    """Writes contacts as vCard 3.0. Returns the number of cards."""
+    count = 0
+    for row in rows:
+        lines = ["BEGIN:VCARD", "VERSION:3.0", f"FN:{_escape(row['name'])}", f"N:;{_escape(row['name'])};;;"]
+        lines.extend(f"TEL:{phone}" for phone in row["phones"])
+        if row["email"]:
+            lines.append(f"EMAIL:{row['email']}")
+        if row["address"]:
+            lines.append(f"ADR:;;{_escape(row['address'])};;;;")
+        if row["birthday"]:
+            day, month, year = row["birthday"].split(".")
+            lines.append(f"BDAY:{year}-{int(month):02d}-{int(day):02d}")
+        lines.append("END:VCARD")
+        out.write("\r\n".join(lines) + "\r\n")
+        count += 1
+    return count
+
+WRITERS = {
+    "csv": write_csv,
+    "jsonl": write_jsonl,
+    "vcf": write_vcard,
+}
+
+def export_contacts(book: AddressBook, fmt: str, out: TextIO) -> int:
+    """Streams every contact of the book to `out` in the given format. Returns the number written."""
+    return WRITERS[fmt](contact_rows(book.values()), out)
@@ -1,25 +1,51 @@
 import sys
 from . import validators
 from .classes import AddressBook, Record, Address, Email
-from prettytable.colortable import ColorTable, Themes
-import cowsay
+from .importers import import_contacts
+from .exporters import export_contacts
+from src.batch import result_stream
+from src.metrics import metrics
+from src.query import find_contacts
+from src.storage import compactor, journal, notes_saver
+from src.tables import PagedTable, color_table, parse_page_options, show_page
 from colorama import Fore, init
 init(autoreset=True)
 
 def close(args = None, book = None):
     """Exit the program"""
+    import cowsay
     cowsay.cow("Bye (╥﹏╥)")
     sys.exit(0)
 
+def stats(args = None, book = None):
+    """Returns the call counts, latency percentiles and time per phase of the commands run so far."""
+    if not any(command.calls for command in metrics.commands.values()):
+        return Fore.YELLOW + "No commands were run yet."
+    print("\n")
+    print(Fore.GREEN + "Command statistics:")
+    return metrics.table()
+
+def compact(args = None, book = None):
+    """Folds the contact journal into a fresh snapshot and writes pending note changes, then shows the statistics."""
+    written = compactor.compact()
+    notes_saver.flush()
+    if not written:
+        print(Fore.YELLOW + "Another session saved a newer snapshot meanwhile; it was kept.")
+    print("\n")
+    print(Fore.GREEN + "Compaction statistics:")
+    return compactor.table(notes_saver.filename)
+
 def command_list(args = None, book = None):
     """Prints a list of available commands."""
     print("\n")
     print(Fore.GREEN + "Available commands:")
-    table = ColorTable(theme=Themes.OCEAN_DEEP)
+    table = color_table()
     table.align = "l"
     table.field_names = [f"{Fore.YELLOW}Command", f"{Fore.YELLOW}Description"]
     table.add_rows(
         [[f"{Fore.GREEN}hello", f"{Fore.WHITE}Greet the user"],
+        [f"{Fore.GREEN}stats", f"{Fore.WHITE}Show call counts and latencies of the commands run so far"],
+        [f"{Fore.GREEN}compact", f"{Fore.WHITE}Fold the change journal into a fresh snapshot and show storage statistics"],
         [f"{Fore.GREEN}close {Fore.WHITE}or {Fore.GREEN}exit", f"{Fore.WHITE}Exit the program"]],
         divider=True
     )
@@ -33,25 +59,33 @@ def command_list(args = None, book = None):
         [f"{Fore.GREEN}edit-email {Fore.LIGHTGREEN_EX}<name> <new_email>", f"{Fore.WHITE}Edit a contact's email"],
         [f"{Fore.GREEN}edit-birthday {Fore.LIGHTGREEN_EX}<name> <new_birthday>", f"{Fore.WHITE}Edit a contact's birthday"],
         [f"{Fore.GREEN}birthdays {Fore.LIGHTGREEN_EX}<days>", f"{Fore.WHITE}List upcoming birthdays in the next <days> days"],
-        [f"{Fore.GREEN}all", f"{Fore.WHITE}List all contacts"],
-        [f"{Fore.GREEN}search {Fore.LIGHTGREEN_EX}<keyword>", f"{Fore.WHITE}Find a contact by name, phone, email, address, or birthday"],
+        [f"{Fore.GREEN}import {Fore.LIGHTGREEN_EX}<file>", f"{Fore.WHITE}Import contacts from a CSV or vCard file"],
+        [f"{Fore.GREEN}export {Fore.LIGHTGREEN_EX}<csv|jsonl|vcf> [file]", f"{Fore.WHITE}Export contacts to a file or stdout"],
+        [f"{Fore.GREEN}all {Fore.LIGHTGREEN_EX}[--page N] [--page-size M]", f"{Fore.WHITE}List all contacts, page by page"],
+        [f"{Fore.GREEN}search {Fore.LIGHTGREEN_EX}<keyword> [--page N]", f"{Fore.WHITE}Find a contact by name, phone, email, address, or birthday"],
+        [f"{Fore.GREEN}search {Fore.LIGHTGREEN_EX}name:ann email:@corp.com birthday:03..05", f"{Fore.WHITE}Find contacts matching every condition (name, name=, phone, email, address, birthday)"],
+        [f"{Fore.GREEN}lookup-phone {Fore.LIGHTGREEN_EX}<phone>", f"{Fore.WHITE}Find who owns a phone number in any format"],
         [f"{Fore.GREEN}delete {Fore.LIGHTGREEN_EX}<name>", f"{Fore.WHITE}Delete a contact"]],
         divider=True
     )
     table.add_rows(
         [[f"{Fore.GREEN}note {Fore.LIGHTGREEN_EX}<name> <text>", f"{Fore.WHITE}Add a new note"],
         [f"{Fore.GREEN}note-edit {Fore.LIGHTGREEN_EX}<name> <new_text>", f"{Fore.WHITE}Edit a note's text"],
-        [f"{Fore.GREEN}note-search {Fore.LIGHTGREEN_EX}<text>", f"{Fore.WHITE}Search notes by content"],
+        [f"{Fore.GREEN}note-search {Fore.LIGHTGREEN_EX}<text> [--page N]", f"{Fore.WHITE}Search notes by words, prefix* or \"phrase\", best matches first"],
+        [f"{Fore.GREEN}note-search {Fore.LIGHTGREEN_EX}tag:work AND tag:urgent \"quarterly\"", f"{Fore.WHITE}Find notes matching every condition (tag, name, name=, text, words)"],
+        [f"{Fore.GREEN}note-search --regex {Fore.LIGHTGREEN_EX}<pattern>", f"{Fore.WHITE}Search note texts with a regular expression, scanned in parallel on large books"],
         [f"{Fore.GREEN}note-tag {Fore.LIGHTGREEN_EX}<name> <tag>", f"{Fore.WHITE}Add a tag to a note"],
         [f"{Fore.GREEN}note-tag-search {Fore.LIGHTGREEN_EX}<tag>", f"{Fore.WHITE}Find notes with a specific tag"],
-        [f"{Fore.GREEN}note-tag-sort {Fore.LIGHTGREEN_EX}<tag>", f"{Fore.WHITE}Sort notes by a tag"],
+        [f"{Fore.GREEN}note-tag-sort {Fore.LIGHTGREEN_EX}<tag>", f"{Fore.WHITE}List notes with a tag, sorted by name"],
         [f"{Fore.GREEN}note-delete {Fore.LIGHTGREEN_EX}<name>", f"{Fore.WHITE}Delete a note"],
-        [f"{Fore.GREEN}note-all", f"{Fore.WHITE}List all notes"]],
+        [f"{Fore.GREEN}note-export {Fore.LIGHTGREEN_EX}<csv|jsonl> [file]", f"{Fore.WHITE}Export notes to a file or stdout"],
+        [f"{Fore.GREEN}note-all {Fore.LIGHTGREEN_EX}[--page N] [--page-size M]", f"{Fore.WHITE}List all notes, page by page"]],
         divider=True
     )
     return table
 
 @validators.add_contact_validator
+@metrics.timed("handler")
 def add_contact(args, book: AddressBook):
     """Adds a new contact to the address book."""
     name, *phone = args
@@ -60,14 +94,18 @@ def add_contact(args, book: AddressBook):
     record = book.find(name)
     message = Fore.GREEN + "Contact updated."
     if record is None:
-        record = Record(name)
-        book.add_record(record)
+        book.add_record(Record(name))
+        journal.append(book, "add_record", name)
+        # the journal may have reloaded the book, so the record is looked up again
+        record = book.find(name)
         message = Fore.GREEN + "Contact added."
     if phone:
         record.add_phone(phone)
+        journal.append(book, "add_phone", name, phone)
     return message
 
 @validators.add_address_validator
+@metrics.timed("handler")
 def add_address(args, book: AddressBook):
     """Adds an address to a contact in the address book."""
     name = args[0]
@@ -76,53 +114,113 @@ def add_address(args, book: AddressBook):
     if record is None:
         return Fore.RED + "Contact not found."
     record.add_address(address)
+    journal.append(book, "add_address", name, address)
     return Fore.GREEN + "Address added."
 
+@validators.import_contacts_validator
+@metrics.timed("handler")
+def import_file(args, book: AddressBook):
+    """Imports contacts from a CSV or vCard file and saves the book once."""
+    try:
+        # too many changes to journal one by one: saved as a snapshot that other sessions reload
+        with journal.bulk(book):
+            report = import_contacts(args[0], book)
+    except ValueError as e:
+        return Fore.RED + str(e)
+    lines = [Fore.GREEN + f"Imported {report.added} new and {report.updated} updated contacts."]
+    if report.error:
+        # red first, so batch runs count a partial import as failed
+        lines.insert(0, Fore.RED + f"Import stopped after line {report.line}, the rest of the file was not read: {report.error}")
+    if report.rejected:
+        lines.append(Fore.RED + f"Rejected {report.rejected} rows:")
+        lines.extend(Fore.RED + f"  line {line}: {reason}" for line, reason in report.rejections)
+        if report.rejected > len(report.rejections):
+            lines.append(Fore.RED + f"  ... and {report.rejected - len(report.rejections)} more")
+    return "\n".join(lines)
+
+@validators.export_contacts_validator
+@metrics.timed("handler")
+def export_file(args, book: AddressBook):
+    """Streams all contacts to a file, or to stdout when the file is '-' or omitted."""
+    fmt = args[0].lower()
+    filename = args[1] if len(args) > 1 else "-"
+    if filename == "-":
+        export_contacts(book, fmt, result_stream())
+        return None
+    with open(filename, "w", encoding="utf-8", newline="") as f:
+        count = export_contacts(book, fmt, f)
+    return Fore.GREEN + f"Exported {count} contacts to '{filename}'."
+
+CONTACT_FIELDS = [f"{Fore.YELLOW}Name", f"{Fore.YELLOW}Birthday", f"{Fore.YELLOW}Phones", f"{Fore.YELLOW}Address", f"{Fore.YELLOW}Email"]
+
+def contact_row(rec: Record) -> list:
+    """Returns the table cells of a contact."""
+    rec_phones = ', '.join(str(phone) for phone in rec.phones)
+    rec_address = rec.address.value if isinstance(rec.address, Address) else 'None'
+    rec_email = rec.email.value if isinstance(rec.email, Email) else 'None'
+    return [rec.name, rec.birthday, rec_phones, rec_address, rec_email]
+
 @validators.list_contacts_validator
-def list_contacts(_, book: AddressBook):
-    """Returns a string containing all contacts in the address book."""
+@metrics.timed("handler")
+def list_contacts(args, book: AddressBook):
+    """Returns all contacts in the address book, one page at a time."""
+    try:
+        _, page, page_size = parse_page_options(args)
+    except ValueError as e:
+        return Fore.RED + str(e)
     print('\n')
     print(Fore.GREEN + "All contacts:")
-    table = ColorTable(theme=Themes.OCEAN_DEEP)
-    table.align = "r"
-    table.field_names = [f"{Fore.YELLOW}Name", f"{Fore.YELLOW}Birthday", f"{Fore.YELLOW}Phones", f"{Fore.YELLOW}Address", f"{Fore.YELLOW}Email"]
-
-    for rec in book.values():
-        rec_name = rec.name
-        rec_birthday = rec.birthday
-        rec_phones = ', '.join(str(phone) for phone in rec.phones)
-        rec_address = rec.address.value if isinstance(rec.address, Address) else 'None'
-        rec_email = rec.email.value if isinstance(rec.email, Email) else 'None'
-
-        table.add_row([rec_name, rec_birthday, rec_phones, rec_address, rec_email])
-    return table
+    # only the records of the shown page are read and rendered
+    fetch = lambda start, stop: [contact_row(rec) for rec in book.page(start, stop)]
+    table = PagedTable(CONTACT_FIELDS, len(book), fetch, page_size, align="r")
+    return show_page(table, page)
 
 @validators.find_contact_validator
+@metrics.timed("handler")
 def find_contact(args, book: AddressBook):
-    """Search for contacts by name, phone, email, address, or birthday."""
+    """Search for contacts by a keyword in any field, or by a query like `name:ann birthday:03..05`."""
     if not args:
         return Fore.RED + "Please provide a search keyword."
-    keyword = args[0]
-    results = book.search(keyword)
+    args, page, page_size = parse_page_options(args)
+    keyword = " ".join(args)
+    try:
+        results = find_contacts(book, keyword)
+    except ValueError as e:
+        return Fore.RED + str(e)
     if not results:
+        suggestions = book.suggest(keyword) if len(args) == 1 else []
+        if suggestions:
+            names = ", ".join(rec.name.value for rec in suggestions)
+            return Fore.RED + f"No contacts found for '{keyword}'. Did you mean: {names}?"
         return Fore.RED + f"No contacts found for '{keyword}'."
     print('\n')
     print(Fore.GREEN + "Search results:")
-    table = ColorTable(theme=Themes.OCEAN_DEEP)
+    fetch = lambda start, stop: [contact_row(rec) for rec in results[start:stop]]
+    table = PagedTable(CONTACT_FIELDS, len(results), fetch, page_size, align="r")
+    return show_page(table, page)
+
+
+@validators.lookup_phone_validator
+@metrics.timed("handler")
+def lookup_phone(args, book: AddressBook):
+    """Finds the contacts that own a phone number."""
+    phone = " ".join(args)
+    results = book.find_by_phone(phone)
+    if not results:
+        return Fore.RED + f"No contacts found with phone '{phone}'."
+    print('\n')
+    print(Fore.GREEN + "Phone owners:")
+    table = color_table()
     table.align = "r"
-    table.field_names = [f"{Fore.YELLOW}Name", f"{Fore.YELLOW}Birthday", f"{Fore.YELLOW}Phones", f"{Fore.YELLOW}Address", f"{Fore.YELLOW}Email"]
-    for rec in results:
-        rec_name = rec.name
-        rec_birthday = rec.birthday
-        rec_phones = ', '.join(str(phone) for phone in rec.phones)
-        rec_address = rec.address.value if isinstance(rec.address, Address) else 'None'
-        rec_email = rec.email.value if isinstance(rec.email, Email) else 'None'
-
-        table.add_row([rec_name, rec_birthday, rec_phones, rec_address, rec_email])
+    table.field_names = [f"{Fore.YELLOW}Name", f"{Fore.YELLOW}Phones"]
+    table.add_rows(
+        [[rec.name, ', '.join(str(p) for p in rec.phones)] for rec in results],
+        divider=True
+    )
     return table
 
-
 @validators.delete_contact_validator
+@metrics.timed("handler")
 def delete_contact(args, book: AddressBook):
     """Deletes a contact from the address book."""
     name = args[0]
@@ -130,9 +228,11 @@ def delete_contact(args, book: AddressBook):
     if rec is None:
         return Fore.RED + "Contact not found."
     book.delete(rec.name.value)
+    journal.append(book, "delete", rec.name.value)
     return Fore.GREEN + "Contact deleted."
 
 @validators.edit_address_validator
+@metrics.timed("handler")
 def edit_address(args, book: AddressBook):
     """Edits a contact's address in the address book."""
     name = args[0]
@@ -142,9 +242,11 @@ def edit_address(args, book: AddressBook):
         return Fore.RED + "Contact not found."
 
     rec.edit_address(new_address)
+    journal.append(book, "edit_address", name, new_address)
     return Fore.GREEN + "Address updated."
 
 @validators.edit_phone_validator
+@metrics.timed("handler")
 def edit_phone(args, book: AddressBook):
     """Edits a contact's phone number in the address book."""
     name, old_phone, *new_phone = args
@@ -154,9 +256,11 @@ def edit_phone(args, book: AddressBook):
         return Fore.RED + "Contact not found."
 
     rec.edit_phone(old_phone, new_phone)
+    journal.append(book, "edit_phone", name, old_phone, new_phone)
     return Fore.GREEN + "Phone updated."
 
 @validators.add_birthday_validator
+@metrics.timed("handler")
 def add_birthday(args, book: AddressBook):
     """Adds a birthday to a contact in the address book."""
     name, birthday = args
@@ -165,9 +269,11 @@ def add_birthday(args, book: AddressBook):
         return Fore.RED + "Contact not found."
 
     record.add_birthday(birthday)
+    journal.append(book, "add_birthday", name, birthday)
     return Fore.GREEN + "Birthday added."
 
 @validators.add_birthday_validator
+@metrics.timed("handler")
 def edit_birthday(args, book: AddressBook):
     """Edits a contact's birthday in the address book."""
     name, new_birthday = args
@@ -176,9 +282,11 @@ def edit_birthday(args, book: AddressBook):
         return Fore.RED + "Contact not found."
 
     rec.add_birthday(new_birthday)
+    journal.append(book, "add_birthday", name, new_birthday)
     return Fore.GREEN + "Birthday updated."
 
 @validators.birthdays_validator
+@metrics.timed("handler")
 def birthdays(args, book: AddressBook):
     """Returns a list of users who need to be greeted on the next week"""
     upcoming_days = int(args[0]) if len(args) else 7
@@ -187,7 +295,7 @@ def birthdays(args, book: AddressBook):
         return Fore.RED + "No upcoming birthdays."
     print('\n')
     print(Fore.GREEN + "Upcoming birthdays:")
-    table = ColorTable(theme=Themes.OCEAN_DEEP)
+    table = color_table()
     table.align = "r"
     table.field_names = [f"{Fore.YELLOW}Name", f"{Fore.YELLOW}Birthday"]
     table.add_rows(
@@ -197,6 +305,7 @@ def birthdays(args, book: AddressBook):
     return table
 
 @validators.add_email_validator
+@metrics.timed("handler")
 def add_email(args, book: AddressBook):
     """Adds an email address to a contact in the address book."""
     name, email = args
@@ -204,9 +313,11 @@ def add_email(args, book: AddressBook):
     if record is None:
         return Fore.RED + "Contact not found."
     record.add_email(email)
+    journal.append(book, "add_email", name, email)
     return Fore.GREEN + "Email added."
 
 @validators.edit_email_validator
+@metrics.timed("handler")
 def edit_email(args, book: AddressBook):
     """Edits a contact's email address in the address book."""
     name, new_email = args
@@ -215,4 +326,5 @@ def edit_email(args, book: AddressBook):
         return Fore.RED + "Contact not found."
 
     rec.add_email(new_email)
+    journal.append(book, "add_email", name, new_email)
     return Fore.GREEN + "Email updated."
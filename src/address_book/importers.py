@@ -0,0 +1,192 @@
+import csv
+import os
+import re
+from typing import Iterable, Iterator
+
+from .classes import AddressBook, Record, Birthday
+from .validators import _is_email, _is_phone
+
+ISO_DATE = re.compile(r"(\d{4})-?(\d{2})-?(\d{2})")
+# vCard components are separated by semicolons that are not escaped
+COMPONENT_SEPARATOR = re.compile(r"(?<!\\);")
+
+# How many rejected rows are kept for the report; the rest are only counted
+MAX_REPORTED_REJECTIONS = 20
+
+CSV_COLUMNS = {
+    "name": "name",
+    "phone": "phones",
+    "phones": "phones",
+    "email": "email",
+    "address": "address",
+    "birthday": "birthday",
+}
+
+class ImportReport:
+    """
+    Outcome of a bulk import.
+
+    Attributes:
+        added (int): Number of new contacts.
+        updated (int): Number of existing contacts that were updated.
+        rejected (int): Number of rows that failed validation.
+        rejections (list[tuple[int, str]]): Line number and reason of the first rejected rows.
+        line (int): Line number of the last row read.
+        error (str | None): Why reading stopped before the end of the file, if it did.
+    """
+    def __init__(self):
+        self.added = 0
+        self.updated = 0
+        self.rejected = 0
+        self.rejections = []
+        self.line = 0
+        self.error = None
+
+    def reject(self, line: int, reason: str):
+        self.rejected += 1
+        if len(self.rejections) < MAX_REPORTED_REJECTIONS:
+            self.rejections.append((line, reason))
+
+def _birthday(value: str) -> str:
+    """Accepts DD.MM.YYYY as well as the ISO dates used by vCard and spreadsheets."""
+    match = ISO_DATE.fullmatch(value)
+    if match is None:
+        return value
+    year, month, day = match.groups()
+    return f"{day}.{month}.{year}"
+
+def read_csv(lines: Iterable[str]) -> Iterator[tuple[int, dict]]:
+    """Yields (line number, contact) pairs from CSV with a name, phones, email, address, birthday header."""
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = [CSV_COLUMNS.get(column.strip().lower()) for column in header]
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        contact = {"phones": []}
+        for column, cell in zip(columns, row):
+            cell = cell.strip()
+            if column == "phones":
+                contact["phones"].extend(p.strip() for p in cell.split(";") if p.strip())
+            elif column and cell:
+                contact[column] = cell
+        yield reader.line_num, contact
+
+def _unfold(lines: Iterable[str]) -> Iterator[tuple[int, str]]:
+    """Joins folded vCard lines (continuations start with a space or tab)."""
+    current, start = None, 0
+    for number, line in enumerate(lines, 1):
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield start, current
+        current, start = line, number
+    if current is not None:
+        yield start, current
+
+def _unescape(value: str) -> str:
+    return value.replace("\\n", " ").replace("\\N", " ").replace("\\,", ",").replace("\\;", ";").replace("\\\\", "\\")
+
+def read_vcard(lines: Iterable[str]) -> Iterator[tuple[int, dict]]:
+    """Yields (line number, contact) pairs from vCard 2.1/3.0/4.0 data."""
+    contact, start = None, 0
+    for number, line in _unfold(lines):
+        if ":" not in line:
+            continue
+        key, value = line.split(":", 1)
+        prop = key.split(";", 1)[0].split(".")[-1].upper()
+        if prop == "BEGIN" and value.strip().upper() == "VCARD":
+            contact, start = {"phones": []}, number
+        elif contact is None:
+            continue
+        elif prop == "END":
+            yield start, contact
+            contact = None
+        elif prop == "FN":
+            contact["name"] = _unescape(value).strip()
+        elif prop == "N" and "name" not in contact:
+            family, given, *_ = COMPONENT_SEPARATOR.split(value) + [""]
+            contact["name"] = " ".join(p for p in (_unescape(given), _unescape(family)) if p).strip()
+        elif prop == "TEL":
+            contact["phones"].append(value.strip().removeprefix("tel:"))
+        elif prop == "EMAIL" and "email" not in contact:
+            contact["email"] = value.strip()
+        elif prop == "ADR" and "address" not in contact:
+            parts = [_unescape(p).strip() for p in COMPONENT_SEPARATOR.split(value)]
+            contact["address"] = ", ".join(p for p in parts if p)
+        elif prop == "BDAY":
+            contact["birthday"] = value.strip()
+
+def validate(contacts: Iterable[tuple[int, dict]], report: ImportReport) -> Iterator[dict]:
+    """Applies the phone, email and birthday rules of the REPL commands, reporting rejected rows."""
+    for line, contact in contacts:
+        report.line = line
+        name = contact.get("name", "")
+        if not name:
+            report.reject(line, "Name cannot be empty.")
+            continue
+        invalid_phone = next((p for p in contact["phones"] if not _is_phone(p)), None)
+        if invalid_phone is not None:
+            report.reject(line, f"Invalid phone number '{invalid_phone}'.")
+            continue
+        if "email" in contact and not _is_email(contact["email"]):
+            report.reject(line, f"Invalid email '{contact['email']}'.")
+            continue
+        if "birthday" in contact:
+            try:
+                contact["birthday"] = Birthday(_birthday(contact["birthday"]))
+            except ValueError:
+                report.reject(line, f"Invalid birthday '{contact['birthday']}'. Use DD.MM.YYYY")
+                continue
+        yield contact
+
+def apply(contacts: Iterable[dict], book: AddressBook, report: ImportReport):
+    """Adds or updates contacts in the address book."""
+    for contact in contacts:
+        record = book.find(contact["name"])
+        if record is None:
+            record = Record(contact["name"])
+            book.add_record(record)
+            report.added += 1
+            for phone in contact["phones"]:
+                record.add_phone(phone)
+        else:
+            report.updated += 1
+            for phone in contact["phones"]:
+                if record.find_phone(phone) is None:
+                    record.add_phone(phone)
+        if "email" in contact:
+            record.add_email(contact["email"])
+        if "address" in contact:
+            record.add_address(contact["address"])
+        if "birthday" in contact:
+            # already parsed and validated
+            record.birthday = contact["birthday"]
+
+def import_contacts(filename: str, book: AddressBook) -> ImportReport:
+    """
+    Streams contacts from a .csv or .vcf/.vcard file into the address book.
+
+    A file that cannot be read to the end (bad encoding, malformed CSV) stops
+    the import; the contacts read before stay imported and the report says why.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == ".csv":
+        reader = read_csv
+    elif extension in (".vcf", ".vcard"):
+        reader = read_vcard
+    else:
+        raise ValueError(f"Unsupported file type '{extension}'. Use .csv, .vcf or .vcard")
+    report = ImportReport()
+    # indexes are cheaper to rebuild once than to update per row
+    book.reset_indexes()
+    with open(filename, "r", encoding="utf-8-sig", newline="") as f:
+        try:
+            apply(validate(reader(f), report), book, report)
+        except (UnicodeDecodeError, ValueError, csv.Error) as e:
+            report.error = str(e)
+    return report
@@ -0,0 +1,231 @@
+import calendar
+import sys
+from array import array
+from bisect import bisect_left, insort
+from datetime import date, timedelta
+
+def search_texts(record) -> list[str]:
+    """Returns the lowercased field values that AddressBook.search matches against."""
+    name = getattr(record.name, 'value', '')
+    phones = [getattr(phone, 'value', '') for phone in record.phones]
+    email = getattr(record.email, 'value', '') if record.email else ''
+    address = getattr(record.address, 'value', '') if record.address else ''
+    birthday = getattr(record.birthday, 'value', '') if record.birthday else ''
+    return [name.lower(), *(p.lower() for p in phones), email.lower(), address.lower(), birthday.lower()]
+
+def trigrams(text: str) -> set[str]:
+    """Returns every three character substring of the text."""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def _text_grams(text: str) -> set[str]:
+    """Returns the trigrams of every field in text joined by TrigramIndex."""
+    grams = set()
+    for field in text.split('\0'):
+        grams |= trigrams(field)
+    return grams
+
+class TrigramIndex:
+    """
+    Inverted index from trigrams of the searchable fields to record names.
+
+    A keyword can only occur in a field that contains all of its trigrams, so
+    intersecting their postings gives a small candidate set to verify.
+
+    Records are numbered in insertion order and postings are sorted arrays of
+    those numbers. Only the indexed text is kept per record; the trigrams it was
+    indexed under are recomputed from it when the record changes or is removed.
+
+    Attributes:
+        postings (dict[str, array]): Sorted ids of the records containing each (interned) trigram.
+        texts (dict[str, str]): Searchable fields indexed for each record name, joined by NUL.
+        ids (dict[str, int]): Id of each record name, increasing in insertion order.
+        names (list[str | None]): Record name of each id, None once removed.
+    """
+    def __init__(self):
+        self.postings = {}
+        self.texts = {}
+        self.ids = {}
+        self.names = []
+
+    def update(self, record):
+        """Indexes the record, replacing whatever was indexed for its name before."""
+        name = record.name.value
+        text = '\0'.join(search_texts(record))
+        old_text = self.texts.get(name)
+        if old_text == text:
+            return
+        id = self.ids.get(name)
+        if id is None:
+            id = self.ids[name] = len(self.names)
+            self.names.append(name)
+        new_grams = _text_grams(text)
+        old_grams = _text_grams(old_text) if old_text is not None else set()
+        for gram in old_grams - new_grams:
+            self._discard(gram, id)
+        for gram in new_grams - old_grams:
+            ids = self.postings.get(gram)
+            if ids is None:
+                ids = self.postings[sys.intern(gram)] = array('i')
+            if not ids or ids[-1] < id:
+                ids.append(id)
+            else:
+                ids.insert(bisect_left(ids, id), id)
+        self.texts[name] = text
+
+    def remove(self, name: str):
+        """Removes the record name from the index."""
+        text = self.texts.pop(name, None)
+        if text is None:
+            return
+        id = self.ids.pop(name)
+        self.names[id] = None
+        for gram in _text_grams(text):
+            self._discard(gram, id)
+
+    def _discard(self, gram: str, id: int):
+        ids = self.postings[gram]
+        del ids[bisect_left(ids, id)]
+        if not ids:
+            del self.postings[gram]
+
+    def candidates(self, keyword: str) -> list[str] | None:
+        """
+        Returns names of records that may contain the lowercased keyword, in insertion order.
+
+        Returns None for keywords shorter than a trigram, which have to be matched by a scan.
+        """
+        grams = trigrams(keyword)
+        if not grams:
+            return None
+        postings = sorted((self.postings.get(gram, ()) for gram in grams), key=len)
+        ids = postings[0]
+        for other in postings[1:]:
+            if not ids:
+                break
+            ids = [id for id in ids if _contains(other, id)]
+        return [self.names[id] for id in ids]
+
+def _contains(ids, id: int) -> bool:
+    """Tells whether the sorted array holds the id."""
+    i = bisect_left(ids, id)
+    return i < len(ids) and ids[i] == id
+
+class BirthdayIndex:
+    """
+    Records with a birthday, sorted by (month, day).
+
+    Upcoming birthdays are a range query over this list. People born on
+    29 February are congratulated on 28 February in non-leap years.
+
+    Attributes:
+        entries (list[tuple[int, int, str]]): Sorted (month, day, name) entries.
+        days (dict[str, tuple[int, int]]): (month, day) indexed for each record name.
+    """
+    def __init__(self):
+        self.entries = []
+        self.days = {}
+
+    def update(self, record):
+        """Indexes the record's birthday, replacing whatever was indexed for its name before."""
+        name = record.name.value
+        day = (record.birthday.date.month, record.birthday.date.day) if record.birthday else None
+        if self.days.get(name) == day:
+            return
+        self.remove(name)
+        if day is not None:
+            insort(self.entries, (*day, name))
+            self.days[name] = day
+
+    def build(self, records) -> "BirthdayIndex":
+        """Indexes the records of a new index, sorting the entries once instead of inserting them one by one."""
+        return self.build_days((record.name.value, (record.birthday.date.month, record.birthday.date.day))
+                               for record in records if record.birthday)
+
+    def build_days(self, days) -> "BirthdayIndex":
+        """Indexes (name, (month, day)) pairs of a new index, for books that list birthdays without reading records."""
+        self.days = dict(days)
+        self.entries = sorted((*day, name) for name, day in self.days.items())
+        return self
+
+    def remove(self, name: str):
+        """Removes the record name from the index."""
+        day = self.days.pop(name, None)
+        if day is not None:
+            del self.entries[bisect_left(self.entries, (*day, name))]
+
+    def _between(self, year: int, start: tuple[int, int], end: tuple[int, int]) -> list[str]:
+        """Returns names with birthdays from start to end (inclusive) within one year."""
+        if not calendar.isleap(year) and start <= (2, 28) <= end:
+            end = max(end, (2, 29))
+        lo = bisect_left(self.entries, start)
+        hi = bisect_left(self.entries, (end[0], end[1] + 1))
+        return [name for _, _, name in self.entries[lo:hi]]
+
+    def _spans(self, start: tuple[int, int], end: tuple[int, int]) -> list[tuple[int, int]]:
+        """Returns the slices of entries from start to end (inclusive), wrapping past 31 December."""
+        if start > end:
+            return self._spans(start, (12, 31)) + self._spans((1, 1), end)
+        return [(bisect_left(self.entries, start), bisect_left(self.entries, (end[0], end[1] + 1)))]
+
+    def count_between(self, start: tuple[int, int], end: tuple[int, int]) -> int:
+        """Returns the number of birthdays from start to end (inclusive) without listing them."""
+        return sum(hi - lo for lo, hi in self._spans(start, end))
+
+    def between(self, start: tuple[int, int], end: tuple[int, int]) -> list[str]:
+        """Returns names with birthdays from start to end (inclusive) in calendar order, whatever the year."""
+        return [name for lo, hi in self._spans(start, end) for _, _, name in self.entries[lo:hi]]
+
+    def upcoming(self, today: date, days: int) -> list[str]:
+        """Returns names with birthdays from today to today + days, in calendar order."""
+        end = today + timedelta(days=min(days, 366))
+        names = []
+        seen = set()
+        start = today
+        while start <= end:
+            year_end = min(end, date(start.year, 12, 31))
+            for name in self._between(start.year, (start.month, start.day), (year_end.month, year_end.day)):
+                if name not in seen:
+                    seen.add(name)
+                    names.append(name)
+            start = year_end + timedelta(days=1)
+        return names
+
+class PhoneIndex:
+    """
+    Index from normalized phone numbers to the names of their owners.
+
+    Attributes:
+        owners (dict[str, dict[str, None]]): Owner names for every phone key, in insertion order.
+        keys (dict[str, set[str]]): Phone keys indexed for each record name.
+    """
+    def __init__(self):
+        self.owners = {}
+        self.keys = {}
+
+    def update(self, record):
+        """Indexes the record's phones, replacing whatever was indexed for its name before."""
+        name = record.name.value
+        old_keys = self.keys.get(name, set())
+        new_keys = {phone.key for phone in record.phones}
+        if old_keys == new_keys:
+            return
+        for key in old_keys - new_keys:
+            self._discard(key, name)
+        for key in new_keys - old_keys:
+            self.owners.setdefault(key, {})[name] = None
+        self.keys[name] = new_keys
+
+    def remove(self, name: str):
+        """Removes the record name from the index."""
+        for key in self.keys.pop(name, ()):
+            self._discard(key, name)
+
+    def _discard(self, key: str, name: str):
+        names = self.owners[key]
+        del names[name]
+        if not names:
+            del self.owners[key]
+
+    def names(self, key: str) -> list[str]:
+        """Returns names of the records owning the normalized phone."""
+        return list(self.owners.get(key, ()))
@@ -1,6 +1,8 @@
+import os
 import re
 from functools import wraps
 from src.address_book.classes import AddressBook, Record
+from src.tables import parse_page_options
 from colorama import Fore, init
 init(autoreset=True)
 
@@ -43,6 +45,28 @@ def add_address_validator(func):
         return func(args, book)
     return wrapper
 
+def import_contacts_validator(func):
+    """Validator for importing contacts from a file."""
+    @wraps(func)
+    def wrapper(args, book: AddressBook):
+        if len(args) != 1:
+            return Fore.RED + "Invalid number of arguments. Usage: import <file.csv|file.vcf>"
+        if not os.path.isfile(args[0]):
+            return Fore.RED + f"File '{args[0]}' not found."
+        return func(args, book)
+    return wrapper
+
+def export_contacts_validator(func):
+    """Validator for exporting contacts to a file."""
+    @wraps(func)
+    def wrapper(args, book: AddressBook):
+        if len(args) not in (1, 2):
+            return Fore.RED + "Invalid number of arguments. Usage: export <csv|jsonl|vcf> [file|-]"
+        if args[0].lower() not in ("csv", "jsonl", "vcf"):
+            return Fore.RED + f"Unsupported format '{args[0]}'. Use csv, jsonl or vcf"
+        return func(args, book)
+    return wrapper
+
 def list_contacts_validator(func):
     """Validator for listing contacts."""
     @wraps(func)
@@ -56,11 +80,26 @@ def find_contact_validator(func):
     """Validator for finding a contact."""
     @wraps(func)
     def wrapper(args, contacts):
-        if len(args) != 1:
-            return Fore.RED + "Invalid number of arguments. Usage: find <name>"
+        try:
+            keywords, _, _ = parse_page_options(args)
+        except ValueError as e:
+            return Fore.RED + str(e)
+        if not keywords:
+            return Fore.RED + "Invalid number of arguments. Usage: search <keyword or query> [--page N] [--page-size M]"
         return func(args, contacts)
     return wrapper
 
+def lookup_phone_validator(func):
+    """Validator for looking up the owners of a phone number."""
+    @wraps(func)
+    def wrapper(args, book: AddressBook):
+        if not args:
+            return Fore.RED + "Invalid number of arguments. Usage: lookup-phone <phone>"
+        if not _is_phone(" ".join(args)):
+            return Fore.RED + "Invalid phone number."
+        return func(args, book)
+    return wrapper
+
 def delete_contact_validator(func):
     """Validator for deleting a contact."""
     @wraps(func)
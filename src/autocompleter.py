@@ -1,7 +1,12 @@
+from bisect import bisect_left
 from prompt_toolkit.completion import Completer, Completion
 from src.address_book.classes import AddressBook
-from src.notes.handlers import note_book
-import itertools
+from src.notes.handlers import get_note_book
+
+# Upper bound of completions offered for a single keystroke
+MAX_COMPLETIONS = 50
+# Shortest input for which misspelled names are suggested
+FUZZY_MIN_LENGTH = 3
 
 USER_SEARCHABLE_COMMANDS = [
     'add-address',
@@ -26,18 +31,51 @@ NOTES_TAG_SEARCHABLE_COMMANDS = [
     'note-tag-sort',
 ]
 
+def prefix_matches(sorted_values: list[str], prefix: str, limit: int = MAX_COMPLETIONS):
+    """Yields up to `limit` values of a sorted list that start with the prefix."""
+    start = bisect_left(sorted_values, prefix)
+    for value in sorted_values[start:start + limit]:
+        if not value.startswith(prefix):
+            break
+        yield value
+
 def variants(variants: list, user_input: str):
-    variants = [str(v) for v in variants]
-    variants.sort()
-    for v in variants:
-        if str(v).startswith(user_input):
-            yield Completion(v, start_position=-len(user_input))
+    variants = sorted(str(v) for v in variants)
+    for v in prefix_matches(variants, user_input):
+        yield Completion(v, start_position=-len(user_input))
+
+
+class SortedCache:
+    """Sorted copy of a book's names or tags, rebuilt only when the book's generation changes."""
+    def __init__(self, load, presorted=False):
+        self.load = load
+        # values that are already sorted are used as they are, e.g. the index of a mapped book
+        self.presorted = presorted
+        self.generation = None
+        self.values = []
+
+    def get(self, generation: int) -> list[str]:
+        if generation != self.generation:
+            values = self.load()
+            self.values = values if self.presorted else sorted(str(v) for v in values)
+            self.generation = generation
+        return self.values
 
 
 class MultiStageCompleter(Completer):
-    def __init__(self, commands, book: AddressBook):
-        self.book = book
-        self.commands = list(commands)
+    def __init__(self, commands, book):
+        # either the address book or a function returning it once it is loaded
+        self._book = book
+        self.commands = sorted(commands)
+        self.contact_names = SortedCache(lambda: self.book.sorted_names(), presorted=True)
+        self.note_names = SortedCache(lambda: get_note_book().data.keys())
+        self.note_tags = SortedCache(lambda: get_note_book().tags())
+
+    @property
+    def book(self) -> AddressBook:
+        if callable(self._book):
+            self._book = self._book()
+        return self._book
 
     def get_completions(self, document, complete_event):
         text_before_cursor = document.text_before_cursor.strip()
@@ -56,20 +94,33 @@ class MultiStageCompleter(Completer):
             case _: yield from []
 
     def base_commands(self, base_command):
-        yield from variants(self.commands, base_command)
+        yield from self.completions(self.commands, base_command)
+
+    def completions(self, sorted_values, user_input):
+        for v in prefix_matches(sorted_values, user_input):
+            yield Completion(v, start_position=-len(user_input))
 
     def first_level_arg(self, base_command, first_arg):
+        suggest = None
         if base_command in USER_SEARCHABLE_COMMANDS:
-            names = self.book.names()
+            names = self.contact_names.get(self.book.generation)
+            suggest = lambda: [rec.name.value for rec in self.book.suggest(first_arg)]
         elif base_command in NOTES_SEARCHABLE_COMMANDS:
-            names = note_book.data.keys()
+            names = self.note_names.get(get_note_book().generation)
+            suggest = lambda: [note.name for note in get_note_book().suggest(first_arg)]
         elif base_command in NOTES_TAG_SEARCHABLE_COMMANDS:
-            names = [note.tags for note in note_book.data.values()]
-            names = list(itertools.chain.from_iterable(names))
+            names = self.note_tags.get(get_note_book().generation)
         else:
             names = []
 
-        yield from variants(names, first_arg)
+        found = False
+        for completion in self.completions(names, first_arg):
+            found = True
+            yield completion
+        # fall back to typo tolerant suggestions once a few characters were typed
+        if not found and suggest and len(first_arg) >= FUZZY_MIN_LENGTH:
+            for name in suggest():
+                yield Completion(name, start_position=-len(first_arg))
 
     def second_level_arg(self, base_command, first_arg, second_arg):
         if base_command == 'edit-phone':
@@ -0,0 +1,140 @@
+import io
+import json
+import sys
+from contextlib import redirect_stdout
+from typing import Iterable, TextIO
+
+from colorama import Fore
+
+from src.metrics import entry_phase, metrics
+from src.tables import strip_ansi
+
+STOP_COMMANDS = ("close", "exit")
+
+def is_table(result) -> bool:
+    """Tables are recognized by their interface, so prettytable is not imported just for the check."""
+    return hasattr(result, "field_names") and hasattr(result, "rows")
+
+def table_rows(table) -> tuple[list[str], list[list[str]]]:
+    """Returns the column names and the rows of a table as plain strings."""
+    columns = [strip_ansi(str(name)) for name in table.field_names]
+    rows = [[strip_ansi(str(cell)) for cell in row] for row in table.rows]
+    return columns, rows
+
+def is_error(result) -> bool:
+    """Handlers report errors as red strings."""
+    return isinstance(result, str) and result.startswith(Fore.RED)
+
+def format_plain(result) -> str:
+    """Renders a handler result as plain text; tables become tab separated lines with a header."""
+    if is_table(result):
+        columns, rows = table_rows(result)
+        lines = [columns] + [[cell.replace("\n", ", ") for cell in row] for row in rows]
+        return "\n".join("\t".join(line) for line in lines)
+    return strip_ansi(str(result)).strip("\n")
+
+def format_json(line: str, ok: bool, result) -> str:
+    """Renders a handler result as one JSON object."""
+    entry = {"command": line, "ok": ok}
+    if is_table(result):
+        columns, rows = table_rows(result)
+        entry["columns"] = columns
+        entry["rows"] = rows
+    else:
+        entry["output"] = strip_ansi(str(result)).strip("\n") if result is not None else ""
+    return json.dumps(entry, ensure_ascii=False)
+
+def result_stream() -> TextIO:
+    """Where a handler streams a result too large to return: straight to the batch output in a batch run, else stdout."""
+    return getattr(sys.stdout, "result_stream", sys.stdout)
+
+class StreamedResult(io.TextIOBase):
+    """
+    Writes a streamed result to the batch output as it arrives, framed like a returned one.
+
+    Newlines at its start and end are dropped, as for returned results. In JSON mode the
+    text is escaped into the "output" field, and "ok" follows once the command finished.
+    """
+    def __init__(self, out: TextIO, line: str, as_json: bool):
+        self.out = out
+        self.line = line
+        self.as_json = as_json
+        self.started = False
+        self._newlines = ""
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        body = text.rstrip("\n")
+        if body:
+            if self.started:
+                body = self._newlines + body
+            else:
+                body = body.lstrip("\n")
+                self.started = True
+                if self.as_json:
+                    self.out.write('{"command": %s, "output": "' % json.dumps(self.line, ensure_ascii=False))
+            self.out.write(json.dumps(body, ensure_ascii=False)[1:-1] if self.as_json else body)
+            self._newlines = ""
+        self._newlines += text[len(text.rstrip("\n")):]
+        return len(text)
+
+    def finish(self, result) -> bool:
+        """Ends the entry, with the text of a result returned after streaming; returns whether the command succeeded."""
+        ok = not is_error(result)
+        if result is not None:
+            # on its own line, after the streamed text
+            self._newlines = "\n"
+            self.write(format_plain(result))
+        self.out.write(f'", "ok": {json.dumps(ok)}}}\n' if self.as_json else "\n")
+        return ok
+
+class Captured(io.StringIO):
+    """Stdout of a handler in a batch run: printed text is kept, streamed results go to the output."""
+    def __init__(self, result_stream: StreamedResult):
+        super().__init__()
+        self.result_stream = result_stream
+
+def run_batch(lines: Iterable[str], parse, commands: dict, book, out: TextIO, as_json: bool = False) -> int:
+    """
+    Runs commands line by line through the same parser and dispatch table as the REPL.
+
+    Blank lines and lines starting with '#' are skipped, 'close' or 'exit' stops the run.
+    Returns the number of commands that failed.
+    """
+    failed = 0
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        command, *args = parse(line)
+        if command in STOP_COMMANDS:
+            break
+        if command not in commands:
+            result = Fore.RED + f"Invalid command '{command}'."
+            failed += 1
+            out.write((format_json(line, False, result) if as_json else format_plain(result)) + "\n")
+            continue
+        with metrics.command(command, entry_phase(commands[command])):
+            # handlers print headers for the REPL; only what a command returns is output here,
+            # or what it streams to result_stream() (like 'export csv -'), written as it comes
+            streamed = StreamedResult(out, line, as_json)
+            captured = Captured(streamed)
+            try:
+                with redirect_stdout(captured):
+                    result = commands[command](args, book)
+            except Exception as e:
+                result = Fore.RED + f"Error: {e}"
+            if streamed.started:
+                failed += not streamed.finish(result)
+                continue
+            if result is None:
+                result = captured.getvalue()
+            ok = not is_error(result)
+            failed += not ok
+            with metrics.phase("render"):
+                text = format_json(line, ok, result) if as_json else format_plain(result)
+                if text:
+                    out.write(text + "\n")
+    return failed
@@ -0,0 +1,291 @@
+import json
+import struct
+import zlib
+from bisect import bisect_right
+from collections import OrderedDict
+from collections.abc import MutableMapping, Sequence
+from heapq import merge
+
+from src.address_book.classes import AddressBook, Record
+from src.mapped_storage import decode_record, encode_record
+
+MAGIC = b"ABBLK001"
+# the only kind of records kept in block files
+KIND_CONTACTS = 1
+# magic, kind, number of records, journal sequence number, offset and length of the block index
+HEADER = struct.Struct("<8sBQQQQ")
+# Records are packed into blocks of about this many bytes before compression
+BLOCK_SIZE = 64 * 1024
+# Level 1 compresses records about 4.5 times in a quarter of the time of the default level 6,
+# which is only 25% smaller; snapshots are rewritten at every compaction
+COMPRESSION_LEVEL = 1
+# Decompressed blocks a BlockFile keeps for repeated fetches
+CACHED_BLOCKS = 8
+
+BLOCK_SUFFIXES = (".blk",)
+
+# json.dumps() with options builds a new encoder on every call
+_encode = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+def is_block_file(filename: str) -> bool:
+    """Returns True if the file name selects the compressed block storage engine."""
+    return filename.endswith(BLOCK_SUFFIXES)
+
+def _split(line: str) -> tuple[str, str]:
+    # a JSON encoded name has its tabs escaped, so the first tab ends it
+    name, _, body = line.partition("\t")
+    return json.loads(name), body
+
+def _pack(version: int, bodies) -> bytes:
+    """
+    Lays out (name, body) pairs in name order as compressed blocks followed by the block index.
+
+    A block is one line per record, the JSON encoded name and body separated by a
+    tab, compressed on its own. The index holds the offset, compressed length and
+    first name of every block.
+    """
+    out = bytearray(HEADER.size)
+    blocks = []
+    lines = []
+    size = 0
+    count = 0
+
+    def flush():
+        data = zlib.compress("".join(lines).encode("utf-8"), COMPRESSION_LEVEL)
+        blocks.append((len(out), len(data), first))
+        out.extend(data)
+
+    for name, body in bodies:
+        if not lines:
+            first = name
+        line = _encode(name) + "\t" + body.decode("utf-8") + "\n"
+        lines.append(line)
+        size += len(line)
+        count += 1
+        if size >= BLOCK_SIZE:
+            flush()
+            lines, size = [], 0
+    if lines:
+        flush()
+    index = zlib.compress(_encode(blocks).encode("utf-8"), COMPRESSION_LEVEL)
+    index_offset = len(out)
+    out.extend(index)
+    HEADER.pack_into(out, 0, MAGIC, KIND_CONTACTS, count, version, index_offset, len(index))
+    return bytes(out)
+
+def dump_book(book: AddressBook) -> bytes:
+    """Serializes the address book in the block format."""
+    data = book.data
+    if isinstance(data, BlockRecords):
+        bodies = data.bodies()
+    else:
+        bodies = ((name, encode_record(data[name])) for name in sorted(data))
+    return _pack(getattr(book, "journal_seq", 0), bodies)
+
+class BlockFile:
+    """
+    Reader of a block file. Opening it reads the header and the block index only.
+
+    Raises ValueError if the file is not a block file of contacts.
+
+    Attributes:
+        filename (str): The block file.
+        count (int): Number of records.
+        version (int): Journal sequence number the file was saved at.
+        blocks (list[tuple[int, int, str]]): Offset, compressed length and first name of every block.
+    """
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._file = open(filename, "rb")
+        magic, kind, self.count, self.version, index_offset, index_length = HEADER.unpack(self._file.read(HEADER.size))
+        if magic != MAGIC or kind != KIND_CONTACTS:
+            self._file.close()
+            raise ValueError(f"'{filename}' is not a block file of contacts")
+        self._file.seek(index_offset)
+        self.blocks = [tuple(block) for block in json.loads(zlib.decompress(self._file.read(index_length)))]
+        self._first_names = [block[2] for block in self.blocks]
+        self._cache = OrderedDict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+    def _lines(self, i: int) -> list[str]:
+        offset, length, _ = self.blocks[i]
+        self._file.seek(offset)
+        # not splitlines(): names and texts may hold other line separators
+        return zlib.decompress(self._file.read(length)).decode("utf-8").split("\n")[:-1]
+
+    def _block(self, i: int) -> dict[str, str]:
+        """Returns the bodies of the records in block i by name, decompressing it unless it is cached."""
+        block = self._cache.get(i)
+        if block is not None:
+            self._cache.move_to_end(i)
+            return block
+        block = self._cache[i] = dict(map(_split, self._lines(i)))
+        if len(self._cache) > CACHED_BLOCKS:
+            self._cache.popitem(last=False)
+        return block
+
+    def body(self, name: str) -> str | None:
+        """Returns the serialized fields of a record by decompressing the one block that can hold it, or None."""
+        i = bisect_right(self._first_names, name) - 1
+        if i < 0:
+            return None
+        return self._block(i).get(name)
+
+    def get(self, name: str) -> Record | None:
+        """Returns the contact with the given name, or None."""
+        body = self.body(name)
+        return None if body is None else decode_record(name, body)
+
+    def bodies(self):
+        """Yields (name, serialized fields) pairs in name order."""
+        for i in range(len(self.blocks)):
+            for line in self._lines(i):
+                yield _split(line)
+
+    def items(self):
+        """Yields (name, record) pairs in name order."""
+        for name, body in self.bodies():
+            yield name, decode_record(name, body)
+
+class BlockRecords(MutableMapping):
+    """
+    Name to record mapping backed by a block file, like MappedRecords for the mapped file.
+
+    Opening it reads the header and the block index. A record is decoded from the one
+    block that holds it when first accessed and then kept in `loaded`, so changes to it
+    stick. Names that were added or deleted since the file was written are tracked
+    separately until the next save.
+
+    Attributes:
+        blocks (BlockFile): The block file.
+        journal_seq (int): Journal sequence number the file was written at.
+        loaded (dict[str, Record]): Records read from the file or added since.
+        added (dict[str, None]): Names that are not in the file, in insertion order.
+        deleted (set[str]): Names of the file that were deleted.
+        book (AddressBook | None): Book the decoded records belong to, so their changes reach its indexes.
+    """
+    def __init__(self, filename: str, book: AddressBook | None = None):
+        self.blocks = BlockFile(filename)
+        self.journal_seq = self.blocks.version
+        self.book = book
+        self.loaded = {}
+        self.added = {}
+        self.deleted = set()
+        # names in the file, read once something needs all of them
+        self._stored = None
+
+    def _stored_names(self) -> list[str]:
+        if self._stored is None:
+            self._stored = [name for name, _ in self.blocks.bodies()]
+        return self._stored
+
+    def _on_disk(self, name: str) -> bool:
+        return name not in self.deleted and self.blocks.body(name) is not None
+
+    def __getitem__(self, name: str) -> Record:
+        record = self.loaded.get(name)
+        if record is not None:
+            return record
+        body = self.blocks.body(name) if name not in self.deleted else None
+        if body is None:
+            raise KeyError(name)
+        record = self.loaded[name] = decode_record(name, body)
+        record._book = self.book
+        return record
+
+    def __setitem__(self, name: str, record: Record):
+        if name in self.deleted:
+            self.deleted.discard(name)
+        elif name not in self.loaded and self.blocks.body(name) is None:
+            self.added[name] = None
+        self.loaded[name] = record
+
+    def __delitem__(self, name: str):
+        if name in self.added:
+            del self.added[name]
+        elif self._on_disk(name):
+            self.deleted.add(name)
+        else:
+            raise KeyError(name)
+        self.loaded.pop(name, None)
+
+    def __contains__(self, name) -> bool:
+        return name in self.loaded or self._on_disk(name)
+
+    def __len__(self):
+        return self.blocks.count - len(self.deleted) + len(self.added)
+
+    def __iter__(self):
+        for name in self._stored_names():
+            if name not in self.deleted:
+                yield name
+        yield from list(self.added)
+
+    def __reduce__(self):
+        # pickled as a plain dict, e.g. when the book is saved with another engine
+        return dict, (dict(self.items()),)
+
+    def names(self) -> Sequence[str]:
+        """Returns all names in iteration order, without decoding any record."""
+        if not self.added and not self.deleted:
+            return self._stored_names()
+        return list(self)
+
+    def sorted_names(self) -> Sequence[str]:
+        """Returns all names in sorted order, without decoding any record."""
+        names = (name for name in self._stored_names() if name not in self.deleted)
+        return list(merge(names, sorted(self.added)))
+
+    def bodies(self):
+        """Yields (name, serialized record) pairs in name order; records that were never loaded are copied as they are."""
+        def stored():
+            for name, body in self.blocks.bodies():
+                if name in self.deleted:
+                    continue
+                record = self.loaded.get(name)
+                yield name, body.encode("utf-8") if record is None else encode_record(record)
+        added = ((name, encode_record(self.loaded[name])) for name in sorted(self.added))
+        return merge(stored(), added)
+
+    def close(self):
+        self.blocks.close()
+
+def block_version(filename: str) -> int:
+    """Returns the version a block file was saved at, reading only its header."""
+    with open(filename, "rb") as f:
+        magic, _, _, version, _, _ = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(f"'{filename}' is not a block file")
+    return version
+
+def load_block_book(filename: str) -> AddressBook:
+    """Opens a block file as an address book; records are read when they are first used."""
+    book = AddressBook()
+    book.data = BlockRecords(filename, book)
+    book.journal_seq = book.data.journal_seq
+    return book
+
+def main():
+    """Converts the pickled address book into the compressed block format."""
+    import argparse
+    from src.storage import BLOCK_FILE, DATA_FILE, _write_atomically, load_data
+
+    parser = argparse.ArgumentParser(description="Convert the pickled contacts to the compressed block format.")
+    parser.add_argument("--contacts", default=DATA_FILE, help="pickled address book")
+    parser.add_argument("--to", default=BLOCK_FILE, help="block file to create for contacts")
+    args = parser.parse_args()
+
+    book = load_data(args.contacts, default=AddressBook())
+    _write_atomically(args.to, dump_book(book))
+    print(f"Converted {len(book)} contacts to {args.to}")
+
+if __name__ == "__main__":
+    main()
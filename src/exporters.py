@@ -0,0 +1,10 @@
+import json
+from typing import Iterable, TextIO
+
+def write_jsonl(rows: Iterable[dict], out: TextIO) -> int:
+    """Writes one JSON object per line. Returns the number of rows."""
+    count = 0
+    for row in rows:
+        out.write(json.dumps(row, ensure_ascii=False) + "\n")
+        count += 1
+    return count
@@ -0,0 +1,96 @@
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """
+    Returns the optimal string alignment distance between two strings.
+
+    Adjacent transpositions count as one edit, so "Jonh" is one edit away from "John".
+    Any distance above `max_distance` is reported as `max_distance + 1`.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return min(previous[-1], max_distance + 1)
+
+def deletes(word: str, max_distance: int) -> set[str]:
+    """Returns the word and every string obtained by deleting up to max_distance characters."""
+    result = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))} - result
+        result |= frontier
+    return result
+
+class FuzzyIndex:
+    """
+    Symmetric-delete (SymSpell style) index for typo tolerant name lookup.
+
+    Every indexed name is stored under all strings obtained by deleting up to
+    `max_distance` characters from its lowercased prefix. A query generates the
+    same deletes, so candidates are found with dictionary lookups and only those
+    are verified with an edit distance.
+
+    Attributes:
+        key (callable): Returns the name of an indexed item.
+        max_distance (int): Largest edit distance offered as a suggestion.
+        prefix_length (int): Number of leading characters used for the deletes.
+        deletes (dict[str, set[str]]): Names stored under every delete.
+    """
+    def __init__(self, key, max_distance: int = 2, prefix_length: int = 5):
+        self.key = key
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.deletes = {}
+        self.names = set()
+
+    def _deletes(self, name: str, max_distance: int | None = None) -> set[str]:
+        return deletes(name.lower()[:self.prefix_length], self.max_distance if max_distance is None else max_distance)
+
+    def update(self, item):
+        """Indexes the item's name."""
+        self.add(self.key(item))
+
+    def add(self, name: str):
+        """Indexes a name."""
+        if name in self.names:
+            return
+        self.names.add(name)
+        for delete in self._deletes(name):
+            self.deletes.setdefault(delete, set()).add(name)
+
+    def remove(self, name: str):
+        """Removes the name from the index."""
+        if name not in self.names:
+            return
+        self.names.discard(name)
+        for delete in self._deletes(name):
+            names = self.deletes[delete]
+            names.discard(name)
+            if not names:
+                del self.deletes[delete]
+
+    def suggest(self, term: str, limit: int = 5) -> list[str]:
+        """Returns up to `limit` names within the edit distance of the term, closest first."""
+        term = term.lower()
+        # one typo in a very short word already changes most of it
+        max_distance = min(self.max_distance, max(len(term) // 3, 1))
+        candidates = set()
+        for delete in self._deletes(term, max_distance):
+            candidates.update(self.deletes.get(delete, ()))
+        scored = []
+        for name in candidates:
+            distance = edit_distance(term, name.lower(), max_distance)
+            if distance <= max_distance:
+                # among equally close names prefer the ones starting like the term
+                scored.append((distance, name[:1].lower() != term[:1], name))
+        scored.sort()
+        return [name for *_, name in scored[:limit]]
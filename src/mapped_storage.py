@@ -0,0 +1,277 @@
+import json
+import mmap
+import os
+import struct
+from bisect import bisect_left
+from collections.abc import MutableMapping, Sequence
+from heapq import merge
+
+from src.address_book.classes import AddressBook, Record, Address, Email
+
+MAGIC = b"ABMAP001"
+# magic, number of records, journal sequence number, offset of the entry table
+HEADER = struct.Struct("<8sQQQ")
+# name offset, name length, body offset, body length
+ENTRY = struct.Struct("<QIQI")
+
+MAPPED_SUFFIXES = (".rec",)
+
+def is_mapped_file(filename: str) -> bool:
+    """Returns True if the file name selects the memory-mapped storage engine."""
+    return filename.endswith(MAPPED_SUFFIXES)
+
+def encode_record(record: Record) -> bytes:
+    """Serializes the fields of a record, except its name which is kept in the index."""
+    fields = {"phones": [phone.value for phone in record.phones]}
+    if isinstance(record.address, Address):
+        fields["address"] = record.address.value
+    if isinstance(record.email, Email):
+        fields["email"] = record.email.value
+    if record.birthday:
+        fields["birthday"] = record.birthday.value
+    return json.dumps(fields, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def decode_record(name: str, body: bytes) -> Record:
+    """Rebuilds a record from its name and serialized fields."""
+    fields = json.loads(body)
+    record = Record(name)
+    for phone in fields["phones"]:
+        record.add_phone(phone)
+    if "address" in fields:
+        record.add_address(fields["address"])
+    if "email" in fields:
+        record.add_email(fields["email"])
+    if "birthday" in fields:
+        record.add_birthday(fields["birthday"])
+    return record
+
+class NameIndex(Sequence):
+    """
+    Sorted record names of a mapped file, read from the mapping on access.
+
+    Being a sorted sequence, it can be searched with `bisect` without
+    reading the names into memory.
+    """
+    def __init__(self, buffer, count: int, table_offset: int):
+        self.buffer = buffer
+        self.count = count
+        self.table_offset = table_offset
+
+    def _entry(self, i: int) -> tuple[int, int, int, int]:
+        return ENTRY.unpack_from(self.buffer, self.table_offset + i * ENTRY.size)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self.count))]
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        name_offset, name_length, _, _ = self._entry(i)
+        return str(self.buffer[name_offset:name_offset + name_length], "utf-8")
+
+    def find(self, name: str) -> int | None:
+        """Returns the position of the name, or None if it is not in the file."""
+        i = bisect_left(self, name)
+        if i < self.count and self[i] == name:
+            return i
+        return None
+
+    def body(self, i: int) -> bytes:
+        """Returns the serialized fields of the record at position i."""
+        _, _, body_offset, body_length = self._entry(i)
+        return self.buffer[body_offset:body_offset + body_length]
+
+    def _entries(self):
+        # one pass over the entry table is much cheaper than an unpack per position
+        return ENTRY.iter_unpack(self.buffer[self.table_offset:self.table_offset + self.count * ENTRY.size])
+
+    def names(self):
+        """Yields the names in order."""
+        buffer = self.buffer
+        for name_offset, name_length, _, _ in self._entries():
+            yield str(buffer[name_offset:name_offset + name_length], "utf-8")
+
+    def items(self):
+        """Yields (name, serialized fields) pairs in order."""
+        buffer = self.buffer
+        for name_offset, name_length, body_offset, body_length in self._entries():
+            yield str(buffer[name_offset:name_offset + name_length], "utf-8"), buffer[body_offset:body_offset + body_length]
+
+class MappedRecords(MutableMapping):
+    """
+    Name to record mapping backed by a memory-mapped file.
+
+    Opening the file only reads its header. Records are decoded from the
+    mapping when first accessed and then kept in `loaded`, so changes to them
+    stick. Names that were added or deleted since the file was written are
+    tracked separately until the next save.
+
+    Attributes:
+        filename (str): The mapped file.
+        journal_seq (int): Journal sequence number the file was written at.
+        index (NameIndex): Sorted names and record offsets of the file.
+        loaded (dict[str, Record]): Records read from the file or added since.
+        added (dict[str, None]): Names that are not in the file, in insertion order.
+        deleted (set[str]): Names of the file that were deleted.
+        book (AddressBook | None): Book the decoded records belong to, so their changes reach its indexes.
+    """
+    def __init__(self, filename: str, book: AddressBook | None = None):
+        self.filename = filename
+        self.book = book
+        with open(filename, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, self.journal_seq, table_offset = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"'{filename}' is not a mapped address book")
+        self.index = NameIndex(self._mmap, count, table_offset)
+        self.loaded = {}
+        self.added = {}
+        self.deleted = set()
+
+    def _on_disk(self, name: str) -> bool:
+        return name not in self.deleted and self.index.find(name) is not None
+
+    def __getitem__(self, name: str) -> Record:
+        record = self.loaded.get(name)
+        if record is not None:
+            return record
+        i = self.index.find(name) if name not in self.deleted else None
+        if i is None:
+            raise KeyError(name)
+        record = self.loaded[name] = decode_record(name, self.index.body(i))
+        record._book = self.book
+        return record
+
+    def __setitem__(self, name: str, record: Record):
+        if name in self.deleted:
+            self.deleted.discard(name)
+        elif name not in self.loaded and self.index.find(name) is None:
+            self.added[name] = None
+        self.loaded[name] = record
+
+    def __delitem__(self, name: str):
+        if name in self.added:
+            del self.added[name]
+        elif self._on_disk(name):
+            self.deleted.add(name)
+        else:
+            raise KeyError(name)
+        self.loaded.pop(name, None)
+
+    def __contains__(self, name) -> bool:
+        return name in self.loaded or self._on_disk(name)
+
+    def __len__(self):
+        return self.index.count - len(self.deleted) + len(self.added)
+
+    def __iter__(self):
+        for name in self.index.names():
+            if name not in self.deleted:
+                yield name
+        yield from list(self.added)
+
+    def __reduce__(self):
+        # pickled as a plain dict, e.g. when the book is saved with another engine
+        return dict, (dict(self.items()),)
+
+    def names(self) -> Sequence[str]:
+        """Returns all names in iteration order; the index itself while no names were added or deleted."""
+        if not self.added and not self.deleted:
+            return self.index
+        return list(self)
+
+    def sorted_names(self) -> Sequence[str]:
+        """Returns all names in sorted order; the index itself while no names were added or deleted."""
+        if not self.added and not self.deleted:
+            return self.index
+        names = (name for name in self.index.names() if name not in self.deleted)
+        return list(merge(names, sorted(self.added)))
+
+    def bodies(self):
+        """Yields (name, serialized record) pairs in name order; records that were never loaded are copied as they are."""
+        def stored():
+            for name, body in self.index.items():
+                if name in self.deleted:
+                    continue
+                record = self.loaded.get(name)
+                yield name, body if record is None else encode_record(record)
+        added = ((name, encode_record(self.loaded[name])) for name in sorted(self.added))
+        return merge(stored(), added)
+
+    def close(self):
+        self._mmap.close()
+
+def _bodies(book: AddressBook):
+    """Yields (name, serialized record) pairs of the book in name order."""
+    data = book.data
+    if isinstance(data, MappedRecords):
+        yield from data.bodies()
+    else:
+        for name in sorted(data):
+            yield name, encode_record(data[name])
+
+def save_mapped(book: AddressBook, filename: str):
+    """
+    Writes the address book as record bodies followed by a sorted name table.
+
+    The file is written next to the target and renamed over it, so readers
+    never see a partial file. The temporary name is unique, so sessions saving at
+    the same time do not write into each other's file.
+    """
+    from src.storage import temporary_name
+
+    tmp_filename = temporary_name(filename)
+    table = bytearray()
+    count = 0
+    with open(tmp_filename, "wb") as f:
+        f.write(bytes(HEADER.size))
+        offset = HEADER.size
+        for name, body in _bodies(book):
+            name_bytes = name.encode("utf-8")
+            f.write(name_bytes)
+            f.write(body)
+            table += ENTRY.pack(offset, len(name_bytes), offset + len(name_bytes), len(body))
+            offset += len(name_bytes) + len(body)
+            count += 1
+        f.write(table)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, count, getattr(book, "journal_seq", 0), offset))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_filename, filename)
+
+def mapped_journal_seq(filename: str) -> int:
+    """Returns the journal sequence number a mapped file was written at, reading only its header."""
+    with open(filename, "rb") as f:
+        magic, _, journal_seq, _ = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(f"'{filename}' is not a mapped address book")
+    return journal_seq
+
+def load_mapped(filename: str) -> AddressBook:
+    """Opens a mapped address book; records are read when they are first used."""
+    book = AddressBook()
+    book.data = MappedRecords(filename, book)
+    book.journal_seq = book.data.journal_seq
+    return book
+
+def main():
+    """Converts the pickled address book into the mapped format."""
+    import argparse
+    from src.storage import DATA_FILE, MAPPED_FILE, load_data
+
+    parser = argparse.ArgumentParser(description="Convert the pickled address book to the memory-mapped format.")
+    parser.add_argument("--contacts", default=DATA_FILE, help="pickled address book")
+    parser.add_argument("--to", default=MAPPED_FILE, help="mapped file to create")
+    args = parser.parse_args()
+
+    book = load_data(args.contacts, default=AddressBook())
+    save_mapped(book, args.to)
+    print(f"Converted {len(book)} contacts to {args.to}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import math
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from colorama import Fore
+
+PHASES = ("validation", "handler", "render", "save")
+# Latency buckets grow by 10%, so a reported percentile is within 10% of the real one
+BUCKET_GROWTH = 1.1
+MIN_LATENCY = 1e-6
+# Functions listed by --profile
+PROFILE_TOP = 20
+
+class LatencyHistogram:
+    """
+    Counts latencies in logarithmic buckets; memory stays constant however many calls are recorded.
+
+    Attributes:
+        buckets (dict[int, int]): Number of latencies in each bucket.
+        count (int): Number of recorded latencies.
+    """
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+
+    def add(self, seconds: float):
+        bucket = int(math.log(max(seconds, MIN_LATENCY) / MIN_LATENCY, BUCKET_GROWTH))
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+
+    def percentile(self, p: float) -> float:
+        """Returns the upper bound of the bucket holding the p-th percentile, in seconds."""
+        if not self.count:
+            return 0.0
+        rank = math.ceil(self.count * p / 100)
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                break
+        return MIN_LATENCY * BUCKET_GROWTH ** (bucket + 1)
+
+class CommandStats:
+    """
+    Calls, latencies and time per phase of one command.
+
+    Attributes:
+        calls (int): Number of calls.
+        latency (LatencyHistogram): Total time of each call.
+        phases (dict[str, float]): Seconds spent in each phase over all calls.
+    """
+    def __init__(self):
+        self.calls = 0
+        self.latency = LatencyHistogram()
+        self.phases = dict.fromkeys(PHASES, 0.0)
+
+class Metrics:
+    """
+    Instrumentation of the command dispatch.
+
+    A command is timed as a whole and split into phases. Phases nest: time spent
+    in an inner phase, such as saving inside a handler, is only counted for the
+    inner one. Phases entered outside of a command, or from another thread, are
+    not recorded, so storage code can mark its phase unconditionally.
+
+    Attributes:
+        commands (dict[str, CommandStats]): Statistics by command name.
+        profile (int): When set, every command runs under cProfile and this many hotspots are printed.
+    """
+    def __init__(self):
+        self.commands = {}
+        self.profile = 0
+        self._current = None
+        self._thread = None
+        self._start = 0.0
+        # [phase, start, time spent in nested phases]
+        self._stack = []
+
+    @contextmanager
+    def command(self, name: str, phase: str = "handler"):
+        """Times a command; time not claimed by a nested phase counts for `phase`."""
+        stats = self.commands.get(name)
+        if stats is None:
+            stats = self.commands[name] = CommandStats()
+        self._current, self._thread = stats, threading.get_ident()
+        self._start = time.perf_counter()
+        profiler = self._start_profile() if self.profile else None
+        try:
+            with self.phase(phase):
+                yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            stats.calls += 1
+            stats.latency.add(time.perf_counter() - self._start)
+            self._current = None
+            if profiler is not None:
+                self._print_profile(profiler, name)
+
+    @contextmanager
+    def phase(self, name: str):
+        """Counts the time of the block for the phase of the running command."""
+        if self._current is None or threading.get_ident() != self._thread:
+            yield
+            return
+        frame = [name, time.perf_counter(), 0.0]
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            elapsed = time.perf_counter() - frame[1]
+            self._current.phases[name] += elapsed - frame[2]
+            if self._stack:
+                self._stack[-1][2] += elapsed
+
+    def timed(self, name: str):
+        """Decorator counting the calls of the function for the given phase."""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.phase(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def untimed(self, func):
+        """Wraps a function, such as reading input, whose time must not count for the command."""
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                # moving the starts forward drops the pause from the command and its phases
+                paused = time.perf_counter() - start
+                self._start += paused
+                for frame in self._stack:
+                    frame[1] += paused
+        return wrapper
+
+    def _start_profile(self):
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def _print_profile(self, profiler, name: str):
+        import pstats
+        print(f"--- profile of '{name}' ---", file=sys.stderr)
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(self.profile)
+
+    def table(self):
+        """Returns a table with the calls, latency percentiles and mean phase times of every command."""
+        from src.tables import color_table
+        table = color_table()
+        table.align = "r"
+        table.field_names = [f"{Fore.YELLOW}Command", f"{Fore.YELLOW}Calls", f"{Fore.YELLOW}p50 ms",
+                             f"{Fore.YELLOW}p95 ms", f"{Fore.YELLOW}p99 ms",
+                             *(f"{Fore.YELLOW}{phase.capitalize()} ms" for phase in PHASES)]
+        table.align[f"{Fore.YELLOW}Command"] = "l"
+        for name, stats in sorted(self.commands.items()):
+            if not stats.calls:
+                # the running 'stats' command itself
+                continue
+            percentiles = [f"{stats.latency.percentile(p) * 1000:.2f}" for p in (50, 95, 99)]
+            phases = [f"{stats.phases[phase] / stats.calls * 1000:.2f}" for phase in PHASES]
+            table.add_row([name, stats.calls, *percentiles, *phases])
+        return table
+
+def entry_phase(handler) -> str:
+    """Handlers wrapped by a validator spend their time in validation until the handler itself starts."""
+    return "validation" if hasattr(handler, "__wrapped__") else "handler"
+
+metrics = Metrics()
@@ -1,34 +1,151 @@
 from collections import UserDict
+from .indexes import Ranking, TagIndex, TextIndex
+from .scan import scanner
+from src.fuzzy import FuzzyIndex
 
 class Note:
+    _book = None
+    # version of the notes file the note was last changed in
+    version: int = 0
+
     def __init__(self, name: str, text: str):
         self.name = name
         self.text = text
         self.tags = []
 
+    def _changed(self):
+        if self._book is not None:
+            self._book._reindex(self)
+
     def add_tag(self, tag: str):
         if tag not in self.tags:
             self.tags.append(tag)
+            self._changed()
 
     def edit_text(self, new_text: str):
         self.text = new_text
+        self._changed()
 
     def __str__(self):
         return f"Name: {self.name}\nText: {self.text}\nTags: {', '.join(self.tags)}"
 
 class NoteBook(UserDict):
+    # incremented whenever names or tags change, used to invalidate caches
+    generation: int = 0
+    # version of the notes file the book was loaded from or last saved as
+    version: int = 0
+    _changed_names: set[str] | None = None
+    _text_index: TextIndex | None = None
+    _tag_index: TagIndex | None = None
+    _fuzzy_index: FuzzyIndex | None = None
+
+    def _indexes(self):
+        indexes = (self._text_index, self._tag_index, self._fuzzy_index)
+        return [index for index in indexes if index is not None]
+
+    @property
+    def changed(self) -> set[str]:
+        """Names of the notes added, changed or deleted since the book was last saved."""
+        if self._changed_names is None:
+            self._changed_names = set()
+        return self._changed_names
+
+    def __setitem__(self, name: str, note: Note):
+        self.generation += 1
+        self.changed.add(name)
+        self.data[name] = note
+        note._book = self
+        for index in self._indexes():
+            index.update(note)
+
+    def __delitem__(self, name: str):
+        del self.data[name]
+        self.generation += 1
+        self.changed.add(name)
+        for index in self._indexes():
+            index.remove(name)
+
+    def __getstate__(self):
+        # indexes are rebuilt on demand instead of being pickled
+        state = self.__dict__.copy()
+        state.pop('_text_index', None)
+        state.pop('_tag_index', None)
+        state.pop('_fuzzy_index', None)
+        state.pop('_changed_names', None)
+        return state
+
+    def _reindex(self, note: Note):
+        if self.data.get(note.name) is not note:
+            return
+        self.generation += 1
+        self.changed.add(note.name)
+        for index in self._indexes():
+            index.update(note)
+
+    def reset_indexes(self):
+        """Drops all indexes; they are rebuilt on next use."""
+        self._text_index = None
+        self._tag_index = None
+        self._fuzzy_index = None
+
+    def _build(self, index):
+        for note in self.data.values():
+            note._book = self
+            index.update(note)
+        return index
+
+    @property
+    def text_index(self) -> TextIndex:
+        if self._text_index is None:
+            self._text_index = self._build(TextIndex())
+        return self._text_index
+
+    @property
+    def tag_index(self) -> TagIndex:
+        if self._tag_index is None:
+            self._tag_index = self._build(TagIndex())
+        return self._tag_index
+
+    @property
+    def fuzzy_index(self) -> FuzzyIndex:
+        if self._fuzzy_index is None:
+            self._fuzzy_index = self._build(FuzzyIndex(key=lambda note: note.name))
+        return self._fuzzy_index
+
+    def suggest(self, name: str, limit: int = 5):
+        """Returns notes whose names are a few typos away from the given name."""
+        return [self.data[n] for n in self.fuzzy_index.suggest(name, limit)]
+
+    def tags(self):
+        """Returns every tag used in the note book."""
+        return list(self.tag_index.notes)
+
     def add_note(self, note: Note):
-        self.data[note.name] = note
+        self[note.name] = note
 
     def delete_note(self, name: str):
         if name in self.data:
-            del self.data[name]
+            del self[name]
+
+    def search(self, query: str):
+        """Full-text search: words, `prefix*` and "quoted phrases", best matches first."""
+        return Ranking(self.text_index.scores(query), self.data)
 
     def find_by_text(self, text: str):
-        return [note for note in self.data.values() if text.lower() in note.text.lower()]
+        return scanner.find(self, text)
+
+    def find_by_regex(self, pattern: str):
+        """Returns notes whose text matches the regular expression, ignoring case. Raises re.error if it is invalid."""
+        return scanner.find(self, pattern, regex=True)
 
     def find_by_tag(self, tag: str):
-        return [note for note in self.data.values() if tag in note.tags]
+        """Returns the notes with the tag, in note book order."""
+        find_by_tag = getattr(self.data, "find_by_tag", None)
+        if self._tag_index is None and find_by_tag is not None:
+            # a SQLite note book asks its tag index instead of reading every note
+            return [self.data[name] for name in find_by_tag(tag)]
+        return [self.data[name] for name in self.tag_index.names(tag)]
 
     def sort_by_tag(self, tag: str):
-        return sorted(self.find_by_tag(tag), key=lambda n: n.name.lower())
\ No newline at end of file
+        """Returns the notes with the tag, sorted by name ignoring case."""
+        return [self.data[name] for name in self.tag_index.sorted_names(tag)]
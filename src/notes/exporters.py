@@ -0,0 +1,29 @@
+import csv
+from typing import Iterable, Iterator, TextIO
+
+from .classes import Note, NoteBook
+from src.exporters import write_jsonl
+
+def note_rows(notes: Iterable[Note]) -> Iterator[dict]:
+    """Yields one plain dict per note."""
+    for note in notes:
+        yield {"name": note.name, "text": note.text, "tags": list(note.tags)}
+
+def write_csv(rows: Iterable[dict], out: TextIO) -> int:
+    """Writes notes as CSV with tags separated by ';'. Returns the number of rows."""
+    writer = csv.writer(out)
+    writer.writerow(["name", "text", "tags"])
+    count = 0
+    for row in rows:
+        writer.writerow([row["name"], row["text"], ";".join(row["tags"])])
+        count += 1
+    return count
+
+WRITERS = {
+    "csv": write_csv,
+    "jsonl": write_jsonl,
+}
+
+def export_notes(notes: NoteBook, fmt: str, out: TextIO) -> int:
+    """Streams every note to `out` in the given format. Returns the number written."""
+    return WRITERS[fmt](note_rows(notes.values()), out)
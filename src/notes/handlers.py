@@ -1,127 +1,138 @@
+import re
 from .classes import Note, NoteBook
-from src.storage import save_notes
-from prettytable.colortable import ColorTable, Themes
+from .exporters import WRITERS, export_notes
+from src.batch import result_stream
+from src.query import find_notes
+from src.storage import load_notes, notes_saver
+from src.tables import PAGE_SIZE, PagedTable, parse_page_options, show_page
 from colorama import Fore, init
 init(autoreset=True)
 
+# filled from disk by get_note_book() on the first note command
 note_book = NoteBook()
+_loaded = False
+
+def get_note_book() -> NoteBook:
+    """Returns the note book, loading it from disk on first use."""
+    global _loaded
+    if not _loaded:
+        loaded = load_notes()
+        if loaded:
+            note_book.data = loaded.data
+            note_book.version = loaded.version
+            for note in note_book.data.values():
+                note._book = note_book
+            note_book.generation += 1
+        _loaded = True
+    return note_book
+
+NOTE_FIELDS = [f"{Fore.YELLOW}Name", f"{Fore.YELLOW}Text", f"{Fore.YELLOW}Tags"]
+NOTE_ALIGN = {f"{Fore.YELLOW}Name": "l", f"{Fore.YELLOW}Text": "l", f"{Fore.YELLOW}Tags": "r"}
+
+def notes_table(notes: list[Note], page: int | None, page_size: int = PAGE_SIZE):
+    """Returns the notes as a paged table, or only the requested page."""
+    fetch = lambda start, stop: [[note.name, Fore.WHITE + note.text, ', '.join(note.tags)] for note in notes[start:stop]]
+    table = PagedTable(NOTE_FIELDS, len(notes), fetch, page_size, align=NOTE_ALIGN, dividers=True)
+    return show_page(table, page)
+
+def _not_found(name: str) -> str:
+    """Returns the note not found message, with similar note names if there are any."""
+    suggestions = get_note_book().suggest(name)
+    if suggestions:
+        names = ", ".join(note.name for note in suggestions)
+        return Fore.RED + f"Note with name '{name}' not found. Did you mean: {names}?"
+    return Fore.RED + f"Note with name '{name}' not found."
 
 def note_add(name: str, text: str) -> str:
     """Adds a new note to the note book."""
-    if name in note_book.data:
+    if name in get_note_book().data:
         return Fore.RED + f"Note with name '{name}' already exists."
 
     note = Note(name, text)
-    note_book.add_note(note)
-    save_notes(note_book)  # SAVE
+    with notes_saver.mutating(get_note_book()):
+        get_note_book().add_note(note)
     return Fore.GREEN + f"Note '{name}' added successfully."
 
 def note_edit(name: str, new_text: str) -> str:
     """Edits a note in the note book."""
-    note = note_book.data.get(name)
+    note = get_note_book().data.get(name)
     if not note:
-        return Fore.RED + f"Note with name '{name}' not found."
+        return _not_found(name)
 
-    note.edit_text(new_text)
-    save_notes(note_book)  # SAVE
+    with notes_saver.mutating(get_note_book()):
+        note.edit_text(new_text)
     return Fore.GREEN + f"Text of note '{name}' successfully changed."
 
-def note_search(text: str) -> str:
-    """Returns a list of notes containing the given text."""
-    results = note_book.find_by_text(text)
+def note_search(text: str, page: int | None = None, page_size: int = PAGE_SIZE, regex: bool = False):
+    """
+    Returns a list of notes matching the given text, best matches first, or matching a regex in note order.
+
+    A text with fields (`tag:work "quarterly"`) is a query: notes must match every condition.
+    """
+    book = get_note_book()
+    if regex:
+        try:
+            results = book.find_by_regex(text)
+        except re.error as e:
+            return Fore.RED + f"Invalid regular expression: {e}"
+    else:
+        try:
+            results = find_notes(book, text)
+        except ValueError as e:
+            return Fore.RED + str(e)
     if not results:
         return Fore.RED + f"Notes with text '{text}' not found."
 
     print('\n')
     print(Fore.GREEN + "Search results:")
-    table = ColorTable(theme=Themes.OCEAN_DEEP)
-    table.field_names = [f"{Fore.YELLOW}Name", f"{Fore.YELLOW}Text", f"{Fore.YELLOW}Tags"]
-    table.align[f"{Fore.YELLOW}Name"] = "l"
-    table.align[f"{Fore.YELLOW}Text"] = "l"
-    table.align[f"{Fore.YELLOW}Tags"] = "r"
-    
-    for note in results:
-        table.add_row([note.name, Fore.WHITE + note.text, ', '.join(note.tags)])
-        table.add_divider()
-    
-    return table
+    return notes_table(results, page, page_size)
 
 def note_tag(name: str, tag: str) -> str:
     """Adds a tag to a note."""
-    note = note_book.data.get(name)
+    note = get_note_book().data.get(name)
     if not note:
-        return Fore.RED + f"Note with name '{name}' not found."
+        return _not_found(name)
 
-    note.add_tag(tag)
-    save_notes(note_book)  # SAVE
+    with notes_saver.mutating(get_note_book()):
+        note.add_tag(tag)
     return Fore.GREEN + f"Tag '{tag}' added to note '{name}'."
 
-def note_tag_search(tag: str) -> str:
+def note_tag_search(tag: str, page: int | None = None, page_size: int = PAGE_SIZE):
     """Returns a list of notes containing the given tag."""
-    results = note_book.find_by_tag(tag)
+    results = get_note_book().find_by_tag(tag)
     if not results:
         return Fore.RED + f"No notes found with tag '{tag}'."
 
     print('\n')
     print(Fore.GREEN + "Search by tag results:")
-    table = ColorTable(theme=Themes.OCEAN_DEEP)
-    table.field_names = [f"{Fore.YELLOW}Name", f"{Fore.YELLOW}Text", f"{Fore.YELLOW}Tags"]
-    table.align[f"{Fore.YELLOW}Name"] = "l"
-    table.align[f"{Fore.YELLOW}Text"] = "l"
-    table.align[f"{Fore.YELLOW}Tags"] = "r"
-    
-    for note in results:
-        table.add_row([note.name, Fore.WHITE + note.text, ', '.join(note.tags)])
-        table.add_divider()
-    
-    return table
-
-def note_tag_sort(tag: str) -> str:
+    return notes_table(results, page, page_size)
+
+def note_tag_sort(tag: str, page: int | None = None, page_size: int = PAGE_SIZE):
     """Returns a list of notes sorted by the given tag."""
-    sorted_notes = note_book.sort_by_tag(tag)
+    sorted_notes = get_note_book().sort_by_tag(tag)
     if not sorted_notes:
         return Fore.RED + f"No notes found with tag '{tag}'."
 
     print('\n')
     print(Fore.GREEN + "Sorted notes by tag results:")
-    table = ColorTable(theme=Themes.OCEAN_DEEP)
-    table.field_names = [f"{Fore.YELLOW}Name", f"{Fore.YELLOW}Text", f"{Fore.YELLOW}Tags"]
-    table.align[f"{Fore.YELLOW}Name"] = "l"
-    table.align[f"{Fore.YELLOW}Text"] = "l"
-    table.align[f"{Fore.YELLOW}Tags"] = "r"
-    
-    for note in sorted_notes:
-        table.add_row([note.name, Fore.WHITE + note.text, ', '.join(note.tags)])
-        table.add_divider()
-    
-    return table
-
-def note_all() -> str:
+    return notes_table(sorted_notes, page, page_size)
+
+def note_all(page: int | None = None, page_size: int = PAGE_SIZE):
     """Returns a table of all notes."""
-    if not note_book.data:
+    if not get_note_book().data:
         return Fore.RED + "No notes found."
 
     print('\n')
     print(Fore.GREEN + "All notes:")
-    table = ColorTable(theme=Themes.OCEAN_DEEP)
-    table.field_names = [f"{Fore.YELLOW}Name", f"{Fore.YELLOW}Text", f"{Fore.YELLOW}Tags"]
-    table.align[f"{Fore.YELLOW}Name"] = "l"
-    table.align[f"{Fore.YELLOW}Text"] = "l"
-    table.align[f"{Fore.YELLOW}Tags"] = "r"
-    
-    for note in note_book.data.values():
-        table.add_row([note.name, Fore.WHITE + note.text, ', '.join(note.tags)])
-        table.add_divider()
-    
-    return table
+    return notes_table(list(get_note_book().data.values()), page, page_size)
 
 def note_delete(name: str) -> str:
     """Deletes a note from the note book."""
-    if name not in note_book.data:
+    if name not in get_note_book().data:
         return Fore.RED + f"No note found with name '{name}'."
 
-    note_book.delete_note(name)
-    save_notes(note_book)  # SAVE
+    with notes_saver.mutating(get_note_book()):
+        get_note_book().delete_note(name)
     return Fore.GREEN + f"Note '{name}' deleted successfully."
 
 def note_add_command(args: list[str], book=None) -> str:
@@ -141,10 +152,20 @@ def note_edit_command(args: list[str], book=None) -> str:
     return note_edit(name, new_text)
 
 def note_search_command(args: list[str], book=None) -> str:
-    """Returns a list of notes containing the given text."""
+    """
+    Returns a list of notes containing the given text.
+
+    The words are joined by single spaces, so with --regex whitespace in the pattern has to be written as \\s.
+    """
+    try:
+        args, page, page_size = parse_page_options(args)
+    except ValueError as e:
+        return Fore.RED + str(e)
+    regex = "--regex" in args
+    args = [arg for arg in args if arg != "--regex"]
     if not args:
         return Fore.RED + "Enter text to search for."
-    return note_search(" ".join(args))
+    return note_search(" ".join(args), page, page_size, regex)
 
 def note_tag_command(args: list[str], book=None) -> str:
     """Adds a tag to a note."""
@@ -154,22 +175,49 @@ def note_tag_command(args: list[str], book=None) -> str:
 
 def note_tag_search_command(args: list[str], book=None) -> str:
     """Returns a list of notes containing the given tag."""
+    try:
+        args, page, page_size = parse_page_options(args)
+    except ValueError as e:
+        return Fore.RED + str(e)
     if not args:
         return Fore.RED + "Enter tag to search for."
-    return note_tag_search(args[0])
+    return note_tag_search(args[0], page, page_size)
 
 def note_tag_sort_command(args: list[str], book=None) -> str:
     """Returns a list of notes sorted by the given tag."""
+    try:
+        args, page, page_size = parse_page_options(args)
+    except ValueError as e:
+        return Fore.RED + str(e)
     if not args:
         return Fore.RED + "Enter tag to sort by."
-    return note_tag_sort(args[0])
+    return note_tag_sort(args[0], page, page_size)
 
 def note_all_command(args: list[str], book=None) -> str:
     """Returns a table of all notes."""
-    return note_all()
+    try:
+        _, page, page_size = parse_page_options(args)
+    except ValueError as e:
+        return Fore.RED + str(e)
+    return note_all(page, page_size)
 
 def note_delete_command(args: list[str], book=None) -> str:
     """Deletes a note from the note book."""
     if not args:
         return Fore.RED + "Enter note name to delete."
     return note_delete(args[0])
+
+def note_export_command(args: list[str], book=None) -> str:
+    """Streams all notes to a file, or to stdout when the file is '-' or omitted."""
+    if not args or len(args) > 2:
+        return Fore.RED + "Usage: note-export <csv|jsonl> [file|-]"
+    fmt = args[0].lower()
+    if fmt not in WRITERS:
+        return Fore.RED + f"Unsupported format '{args[0]}'. Use csv or jsonl"
+    filename = args[1] if len(args) > 1 else "-"
+    if filename == "-":
+        export_notes(get_note_book(), fmt, result_stream())
+        return None
+    with open(filename, "w", encoding="utf-8", newline="") as f:
+        count = export_notes(get_note_book(), fmt, f)
+    return Fore.GREEN + f"Exported {count} notes to '{filename}'."
@@ -0,0 +1,282 @@
+import heapq
+import math
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from collections.abc import Sequence
+from itertools import count
+
+TOKEN_RE = re.compile(r"\w+")
+QUERY_RE = re.compile(r'"([^"]*)"?|(\S+)')
+
+def tokenize(text: str) -> list[str]:
+    """Splits text into lowercased word tokens."""
+    return TOKEN_RE.findall(text.lower())
+
+def parse_query(query: str) -> list[tuple[str, list[str]]]:
+    """
+    Parses a search query into (kind, tokens) terms.
+
+    Quoted text becomes a "phrase", a word ending with `*` a "prefix" and
+    every other word a plain "term".
+    """
+    terms = []
+    for phrase, word in QUERY_RE.findall(query):
+        if phrase:
+            tokens = tokenize(phrase)
+            if len(tokens) == 1:
+                terms.append(("term", tokens))
+            elif tokens:
+                terms.append(("phrase", tokens))
+        elif word.endswith("*") and tokenize(word):
+            terms.append(("prefix", tokenize(word)[:1]))
+        else:
+            terms.extend(("term", [token]) for token in tokenize(word))
+    return terms
+
+class TextIndex:
+    """
+    Positional inverted index over note texts with BM25 ranking.
+
+    The sorted vocabulary needed for prefix terms is built on first use and
+    dropped whenever a token appears or disappears, so indexing never pays for it.
+
+    Attributes:
+        postings (dict[str, dict[str, list[int]]]): Token positions for every note name.
+        lengths (dict[str, int]): Number of tokens in every note.
+        tokens (dict[str, set[str]]): Distinct tokens of every note.
+        texts (dict[str, str]): The text each note was indexed with.
+    """
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.lengths = {}
+        self.tokens = {}
+        self.texts = {}
+        self.total_length = 0
+        self._vocabulary = None
+
+    def update(self, note):
+        """Indexes the note, replacing whatever was indexed for its name before."""
+        if self.texts.get(note.name) is note.text:
+            return
+        self.remove(note.name)
+        tokens = tokenize(note.text)
+        positions = defaultdict(list)
+        for i, token in enumerate(tokens):
+            positions[token].append(i)
+        for token, token_positions in positions.items():
+            if token not in self.postings:
+                self._vocabulary = None
+            self.postings[token][note.name] = token_positions
+        self.lengths[note.name] = len(tokens)
+        self.tokens[note.name] = set(positions)
+        self.texts[note.name] = note.text
+        self.total_length += len(tokens)
+
+    def remove(self, name: str):
+        """Removes the note name from the index."""
+        if name not in self.lengths:
+            return
+        self.total_length -= self.lengths.pop(name)
+        del self.texts[name]
+        for token in self.tokens.pop(name):
+            notes = self.postings[token]
+            del notes[name]
+            if not notes:
+                del self.postings[token]
+                self._vocabulary = None
+
+    @property
+    def vocabulary(self) -> list[str]:
+        """Sorted list of indexed tokens, used for prefix terms."""
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        return self._vocabulary
+
+    def _expand(self, prefix: str) -> list[str]:
+        vocabulary = self.vocabulary
+        start = bisect_left(vocabulary, prefix)
+        end = start
+        while end < len(vocabulary) and vocabulary[end].startswith(prefix):
+            end += 1
+        return vocabulary[start:end]
+
+    def _matches(self, kind: str, tokens: list[str]) -> tuple[set[str], list[str]]:
+        """Returns the names of notes matching one query term and the tokens they are scored by."""
+        if kind == "prefix":
+            expanded = self._expand(tokens[0])
+            names = set()
+            for token in expanded:
+                names.update(self.postings[token])
+            return names, expanded
+        if any(token not in self.postings for token in tokens):
+            return set(), tokens
+        names = set(self.postings[tokens[0]])
+        for token in tokens[1:]:
+            names.intersection_update(self.postings[token])
+        if kind == "phrase":
+            names = {name for name in names if self._has_phrase(name, tokens)}
+        return names, tokens
+
+    def _has_phrase(self, name: str, tokens: list[str]) -> bool:
+        starts = set(self.postings[tokens[0]][name])
+        for offset, token in enumerate(tokens[1:], 1):
+            starts &= {position - offset for position in self.postings[token][name]}
+            if not starts:
+                return False
+        return True
+
+    def matches(self, name: str, terms: list[tuple[str, list[str]]]) -> bool:
+        """Returns True if the note matches every parsed query term, without looking at other notes."""
+        tokens = self.tokens.get(name, set())
+        for kind, term_tokens in terms:
+            if kind == "prefix":
+                if not any(token.startswith(term_tokens[0]) for token in tokens):
+                    return False
+            elif not tokens.issuperset(term_tokens):
+                return False
+            elif kind == "phrase" and not self._has_phrase(name, term_tokens):
+                return False
+        return True
+
+    def search(self, query: str) -> "Ranking":
+        """Returns names of notes matching every term of the query, best BM25 score first."""
+        return Ranking(self.scores(query))
+
+    def scores(self, query: str) -> dict[str, float]:
+        """Returns the BM25 score of every note matching every term of the query."""
+        terms = parse_query(query)
+        if not terms:
+            return {}
+        names = None
+        scored_tokens = []
+        for kind, tokens in sorted(terms, key=lambda term: term[0] == "prefix"):
+            matched, term_tokens = self._matches(kind, tokens)
+            names = matched if names is None else names & matched
+            if not names:
+                return {}
+            scored_tokens.extend(term_tokens)
+        count = len(self.lengths)
+        average_length = self.total_length / count if count else 0
+        scores = dict.fromkeys(names, 0.0)
+        for token in scored_tokens:
+            notes = self.postings[token]
+            idf = math.log(1 + (count - len(notes) + 0.5) / (len(notes) + 0.5))
+            for name in names:
+                positions = notes.get(name)
+                if positions:
+                    frequency = len(positions)
+                    norm = 1 - self.b + self.b * self.lengths[name] / (average_length or 1)
+                    scores[name] += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * norm)
+        return scores
+
+class Ranking(Sequence):
+    """
+    Matches ordered by score, best first, then by name.
+
+    Only as many matches as are read get ranked, with a heap, so showing the
+    first page of a broad search does not sort all of them.
+
+    Attributes:
+        scores (dict[str, float]): Score of every matching note name.
+        items (dict | None): Returned for each name instead of the name, if given.
+    """
+    def __init__(self, scores: dict[str, float], items: dict | None = None):
+        self.scores = scores
+        self.items = items
+        self._ranked = []
+
+    def __len__(self):
+        return len(self.scores)
+
+    def _key(self, name: str) -> tuple[float, str]:
+        return -self.scores[name], name
+
+    def _rank(self, stop: int) -> list:
+        if len(self._ranked) < stop:
+            # at least doubled, so reading one by one does not re-rank every time
+            stop = max(stop, 2 * len(self._ranked))
+            names = heapq.nsmallest(stop, self.scores, key=self._key)
+            self._ranked = names if self.items is None else [self.items[name] for name in names]
+        return self._ranked
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, _ = index.indices(len(self))
+            return self._rank(max(start, stop))[index]
+        if index < 0:
+            index += len(self)
+        return self._rank(index + 1)[index]
+
+    def __iter__(self):
+        return iter(self._rank(len(self)))
+
+def _sort_key(name: str) -> tuple[str, str]:
+    return name.lower(), name
+
+class TagIndex:
+    """
+    Index from tags to the names of notes carrying them.
+
+    Names are kept in note book order: notes are numbered as they are first
+    indexed, and a tag given to an older note re-sorts only that tag's names.
+    The case-insensitive name order is sorted once per tag when it is first
+    asked for, and kept until the tag is added to or removed from a note.
+
+    Attributes:
+        notes (dict[str, dict[str, None]]): Names of the notes with every tag, in note book order.
+        tags (dict[str, set[str]]): Tags indexed for every note name.
+        positions (dict[str, int]): Order in which the note names were first indexed.
+    """
+    def __init__(self):
+        self.notes = {}
+        self.tags = {}
+        self.positions = {}
+        self._counter = count()
+        self._sorted = {}
+
+    def update(self, note):
+        """Indexes the tags of the note, replacing whatever was indexed for its name before."""
+        if note.name not in self.positions:
+            self.positions[note.name] = next(self._counter)
+        old_tags = self.tags.get(note.name, set())
+        new_tags = set(note.tags)
+        if old_tags == new_tags:
+            return
+        position = self.positions[note.name]
+        for tag in old_tags - new_tags:
+            self._discard(tag, note.name)
+        for tag in new_tags - old_tags:
+            names = self.notes.setdefault(tag, {})
+            older = names and self.positions[next(reversed(names))] > position
+            names[note.name] = None
+            if older:
+                self.notes[tag] = dict.fromkeys(sorted(names, key=self.positions.__getitem__))
+            self._sorted.pop(tag, None)
+        self.tags[note.name] = new_tags
+
+    def remove(self, name: str):
+        """Removes the note name from the index."""
+        for tag in self.tags.pop(name, ()):
+            self._discard(tag, name)
+        self.positions.pop(name, None)
+
+    def _discard(self, tag: str, name: str):
+        names = self.notes[tag]
+        del names[name]
+        if not names:
+            del self.notes[tag]
+        self._sorted.pop(tag, None)
+
+    def names(self, tag: str) -> list[str]:
+        """Returns names of the notes with the tag, in note book order."""
+        return list(self.notes.get(tag, ()))
+
+    def sorted_names(self, tag: str) -> list[str]:
+        """Returns names of the notes with the tag, sorted case-insensitively."""
+        if tag not in self._sorted:
+            self._sorted[tag] = sorted(self.notes.get(tag, ()), key=_sort_key)
+        return self._sorted[tag]
@@ -0,0 +1,173 @@
+"""
+Parallel full scan of note texts, for regex and substring queries no index can answer.
+
+The note book is split into shards, one per CPU. Every shard gets its own single-process
+pool: its names and texts are sent once, when the pool starts, and stay in that worker, so
+a query only ships the pattern and gets back the matching names. When the note book changes,
+the next query also ships the notes added, edited or deleted since, to the shard holding
+them. Small books, and machines with a single CPU, are scanned in-process, where starting
+workers would cost more than it saves.
+"""
+import os
+import re
+
+# Below this much text an in-process scan is faster than asking the workers
+PARALLEL_MIN_CHARS = 8 * 1024 * 1024
+
+class Shard:
+    """
+    Note texts scanned together, each kept with its lowercased form for substring checks.
+
+    Attributes:
+        texts (dict[str, tuple[str, str]]): Text and lowercased text of each note name.
+    """
+    def __init__(self, entries=()):
+        self.texts = {}
+        self.update(entries)
+
+    def update(self, changes):
+        """Applies (name, text) changes, where a text of None deletes the note."""
+        for name, text in changes:
+            if text is None:
+                self.texts.pop(name, None)
+            else:
+                self.texts[name] = (text, text.lower())
+
+    def scan(self, pattern: str, regex: bool = False) -> list[str]:
+        """Returns names of the notes matching a regex or containing a substring, ignoring case. Raises re.error for a bad regex."""
+        if regex:
+            search = re.compile(pattern, re.IGNORECASE).search
+            return [name for name, (text, _) in self.texts.items() if search(text)]
+        needle = pattern.lower()
+        return [name for name, (_, lowered) in self.texts.items() if needle in lowered]
+
+# notes held by a worker process
+_shard = Shard()
+
+def _load_shard(entries: list[tuple[str, str]]):
+    global _shard
+    _shard = Shard(entries)
+
+def _scan_shard(changes: list[tuple[str, str | None]], pattern: str, regex: bool) -> list[str]:
+    _shard.update(changes)
+    return _shard.scan(pattern, regex)
+
+class ParallelScanner:
+    """
+    Scans note texts across a pool of worker processes.
+
+    Attributes:
+        workers (int): Number of shards scanned in parallel.
+        min_chars (int): Total text length below which a book is scanned in-process.
+    """
+    def __init__(self, workers: int | None = None, min_chars: int = PARALLEL_MIN_CHARS):
+        self.workers = workers or os.cpu_count() or 1
+        self.min_chars = min_chars
+        self._pools = []
+        # in-process shard, used instead of the pools for small books
+        self._local = None
+        # note book and generation the shards and the size were taken from
+        self._book = None
+        self._generation = -1
+        self._size = 0
+        # text of each note at the last query, and the pool holding the note
+        self._texts = {}
+        self._owners = {}
+        # text length held by each pool, and the changes not yet sent to it
+        self._sizes = []
+        self._pending = []
+
+    def find(self, book, pattern: str, regex: bool = False) -> list:
+        """Returns the notes whose text matches, in note book order."""
+        # compiled here, so an invalid regex fails before any worker is asked
+        if regex:
+            re.compile(pattern)
+        changes = self._changes(book)
+        if self.workers < 2 or self._size < self.min_chars:
+            if self._pools:
+                self.close()
+            if self._local is None:
+                self._local = Shard((name, note.text) for name, note in book.data.items())
+            else:
+                self._local.update((name, text) for name, _, text in changes)
+            matched = set(self._local.scan(pattern, regex))
+        else:
+            self._local = None
+            if self._pools:
+                for name, old_text, text in changes:
+                    self._send(name, old_text, text)
+            else:
+                self._partition(book)
+            matched = self._scan_pools(pattern, regex)
+        # shards keep their own order once changes arrive
+        return [note for name, note in book.data.items() if name in matched]
+
+    def _changes(self, book) -> list[tuple[str, str | None, str | None]]:
+        """Returns (name, old text, new text) of the notes changed since the last query, with None for a missing text."""
+        if book is not self._book:
+            self.close()
+            self._local = None
+            self._texts = {}
+            self._book, self._generation = book, -1
+        if book.generation == self._generation:
+            return []
+        self._generation = book.generation
+        self._size = sum(len(note.text) for note in book.data.values())
+        texts = self._texts
+        changes = [(name, texts.get(name), note.text) for name, note in book.data.items()
+                   if texts.get(name) is not note.text]
+        changes += [(name, texts[name], None) for name in texts.keys() - book.data.keys()]
+        for name, _, text in changes:
+            if text is None:
+                del texts[name]
+            else:
+                texts[name] = text
+        return changes
+
+    def _send(self, name: str, old_text: str | None, text: str | None):
+        """Queues a change for the pool holding the note, or for the smallest pool if it is new."""
+        pool = self._owners.get(name)
+        if pool is None:
+            pool = self._owners[name] = min(range(len(self._sizes)), key=self._sizes.__getitem__)
+        if text is None:
+            del self._owners[name]
+        self._sizes[pool] += len(text or "") - len(old_text or "")
+        self._pending[pool][name] = text
+
+    def _scan_pools(self, pattern: str, regex: bool) -> set[str]:
+        changes = [list(pending.items()) for pending in self._pending]
+        self._pending = [{} for _ in self._pools]
+        try:
+            futures = [pool.submit(_scan_shard, sent, pattern, regex) for pool, sent in zip(self._pools, changes)]
+            return {name for future in futures for name in future.result()}
+        except BaseException:
+            # the workers may have missed changes; start over on the next query
+            self.close()
+            raise
+
+    def _partition(self, book):
+        """Starts one single-process pool per shard of contiguous notes."""
+        # imported here, not at startup: most books are scanned in-process
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        entries = [(name, note.text) for name, note in book.data.items()]
+        chunk = -(-len(entries) // self.workers)
+        shards = [entries[start:start + chunk] for start in range(0, len(entries), chunk)]
+        # spawned, not forked: the process runs background threads
+        context = multiprocessing.get_context("spawn")
+        self._pools = [ProcessPoolExecutor(1, mp_context=context, initializer=_load_shard, initargs=(shard,))
+                       for shard in shards]
+        self._owners = {name: pool for pool, shard in enumerate(shards) for name, _ in shard}
+        self._sizes = [sum(len(text) for _, text in shard) for shard in shards]
+        self._pending = [{} for _ in shards]
+
+    def close(self):
+        """Stops the worker processes."""
+        for pool in self._pools:
+            pool.shutdown(wait=False, cancel_futures=True)
+        self._pools = []
+        self._owners = {}
+        self._sizes = []
+        self._pending = []
+
+scanner = ParallelScanner()
@@ -0,0 +1,429 @@
+"""
+Structured queries over contacts and notes, answered from the indexes.
+
+A query is a list of conditions that must all hold: `field:value` terms, bare
+words and "quoted text", optionally joined with AND:
+
+    search name:ann email:@corp.com birthday:03..05
+    note-search tag:work AND tag:urgent "quarterly"
+
+Every condition can list the names it matches from one lookup and can filter
+a list of names. The planner asks each condition how many names it can match
+(the size of the index entry it reads, or the whole book when no index helps)
+and starts from the most selective lookup. The next conditions are intersected
+with their own lookups while those cost little next to the candidates left,
+and filter the candidates otherwise, most selective first. A condition whose
+lookup lists a superset of its matches, like the trigram index's, always
+filters. When the most selective lookup would read a large share of the book,
+the names are filtered in book order instead, which reads the records
+one after another (from disk, for a mapped book) rather than in index order.
+"""
+import calendar
+import re
+from abc import ABC, abstractmethod
+from operator import attrgetter
+
+from src.address_book.classes import normalize_phone
+from src.address_book.indexes import search_texts, trigrams
+from src.notes.indexes import parse_query
+from src.sqlite_storage import birthday_where, name_where, phone_where, text_where
+
+TERM_RE = re.compile(r'(?:(\w+)([:=]))?(?:"([^"]*)"?|(\S+))')
+BIRTHDAY_BOUND = re.compile(r"(?:(\d{1,2})\.)?(\d{1,2})")
+
+CONTACT_FIELDS = ("name", "phone", "email", "address", "birthday")
+NOTE_FIELDS = ("name", "tag", "text")
+
+# Running another lookup pays off while it costs at most this much per candidate left;
+# past that the candidates are filtered instead
+INTERSECT_RATIO = 4
+# A lookup reading more than this share of the book is slower than a scan
+SCAN_SHARE = 0.2
+# A substring scan of note texts costs about this many key comparisons per note
+TEXT_SCAN_COST = 4
+# Ranking a note found by the full-text index costs about this many set operations
+RANK_COST = 3
+# Birthdays are not indexed by year; like a planner without statistics on a column,
+# assume a year holds this share of them
+YEAR_SELECTIVITY = 0.02
+
+def parse_terms(text: str, fields: tuple[str, ...]) -> list[tuple[str | None, str, str]]:
+    """
+    Splits a query into (field, operator, value) terms.
+
+    The field is None for a bare word or "quoted text", which keeps its quotes.
+    A `word:` prefix that is not one of the fields is part of a bare word.
+    """
+    terms = []
+    for match in TERM_RE.finditer(text):
+        field, operator, quoted, word = match.groups()
+        if field is not None and field.lower() in fields:
+            value = quoted if quoted is not None else word
+            if not value:
+                raise ValueError(f"Missing value after '{field}{operator}'.")
+            terms.append((field.lower(), operator, value))
+        elif word == "AND":
+            continue
+        elif word in ("OR", "NOT"):
+            raise ValueError(f"Queries only support AND, not {word}: every condition must hold.")
+        else:
+            terms.append((None, ":", match.group(0)))
+    if not terms:
+        raise ValueError("The query is empty.")
+    return terms
+
+def _unquote(value: str) -> str:
+    return value[1:-1] if len(value) > 1 and value[0] == value[-1] == '"' else value.strip('"')
+
+class Condition(ABC):
+    """
+    One condition of a query.
+
+    Attributes:
+        exact (bool): True if the lookup lists only names that match.
+    """
+    exact = True
+
+    def estimate(self, book) -> int:
+        """Returns about how many names match, from the index alone."""
+        return len(book)
+
+    def cost(self, book) -> int:
+        """Returns about how many names the lookup reads."""
+        return self.estimate(book)
+
+    def lookup(self, book) -> list[str]:
+        """Returns the matching names in the order of the index that holds them."""
+        return self.filter(book, list(book.data))
+
+    @abstractmethod
+    def filter(self, book, names: list[str]) -> list[str]:
+        """Returns the names that match, in their order."""
+
+    def where(self) -> tuple[str, tuple]:
+        """Returns the SQL clause and parameters that match the same names in a SQLite book."""
+        raise NotImplementedError(f"{type(self).__name__} has no SQL clause")
+
+class Query:
+    """
+    Conditions that must all hold.
+
+    Attributes:
+        conditions (list[Condition]): The conditions of the query.
+        plain (bool): True if the query has bare words only, no fields.
+    """
+    def __init__(self, conditions: list[Condition], plain: bool):
+        self.conditions = conditions
+        self.plain = plain
+
+    def names(self, book) -> list[str]:
+        """Returns the names matching every condition, in the order of the most selective lookup."""
+        planned = [condition for _, condition in sorted(
+            ((condition.estimate(book), condition) for condition in self.conditions), key=lambda step: step[0])]
+        first = planned[0]
+        if first.cost(book) > len(book) * SCAN_SHARE:
+            # no index narrows it much; read the records in book order rather than index order
+            names = list(book.data)
+            filters = [first]
+        else:
+            names = first.lookup(book)
+            filters = [] if first.exact else [first]
+        for condition in planned[1:]:
+            if condition.exact and condition.cost(book) <= len(names) * INTERSECT_RATIO:
+                found = set(condition.lookup(book))
+                names = [name for name in names if name in found]
+            else:
+                filters.append(condition)
+        # after the set intersections, most selective first
+        for condition in filters:
+            if not names:
+                break
+            names = condition.filter(book, names)
+        return names
+
+    def select(self, book) -> list[str]:
+        """Returns the names matching every condition in book order, planned by the SQLite book's own database."""
+        clauses = [condition.where() for condition in self.conditions]
+        where = " AND ".join(f"({sql})" for sql, _ in clauses)
+        params = tuple(param for _, params in clauses for param in params)
+
+        def matches(names):
+            # records changed in memory since they were read
+            for condition in self.conditions:
+                names = condition.filter(book, names)
+            return names
+        return book.data.select(where, params, matches)
+
+# contacts
+
+class ContactText(Condition):
+    """The value occurs in one field, or in any field for a bare word. Looked up in the trigram index."""
+    exact = False
+
+    def __init__(self, field: str | None, value: str):
+        self.field = field
+        self.value = value.lower()
+
+    def estimate(self, book) -> int:
+        grams = trigrams(self.value)
+        if not grams:
+            return len(book)
+        postings = book.search_index.postings
+        return min(len(postings.get(gram, ())) for gram in grams)
+
+    def lookup(self, book) -> list[str]:
+        names = book.search_index.candidates(self.value)
+        return list(book.data) if names is None else names
+
+    def where(self) -> tuple[str, tuple]:
+        return text_where(self.field, self.value)
+
+    def filter(self, book, names: list[str]) -> list[str]:
+        value, field, data = self.value, self.field, book.data
+        if field == "name":
+            # the key is the name, so the record is not read
+            return [name for name in names if value in name.lower()]
+        if field is None:
+            return [name for name in names if any(value in text for text in search_texts(data[name]))]
+        get = attrgetter(field)
+        return [name for name in names if (found := get(data[name])) is not None and value in found.value.lower()]
+
+class ContactName(Condition):
+    """The name is exactly the value. Looked up in the book itself."""
+    def __init__(self, name: str):
+        self.name = name
+
+    def estimate(self, book) -> int:
+        return 1
+
+    def lookup(self, book) -> list[str]:
+        return [self.name] if self.name in book.data else []
+
+    def filter(self, book, names: list[str]) -> list[str]:
+        return [name for name in names if name == self.name]
+
+    def where(self) -> tuple[str, tuple]:
+        return name_where(self.name)
+
+class ContactPhone(Condition):
+    """One of the phones is the number, whatever its formatting. Looked up in the phone index."""
+    def __init__(self, phone: str):
+        self.key = normalize_phone(phone)
+        if not self.key:
+            raise ValueError(f"'{phone}' is not a phone number.")
+
+    def estimate(self, book) -> int:
+        return len(book.phone_index.owners.get(self.key, ()))
+
+    def lookup(self, book) -> list[str]:
+        return book.phone_index.names(self.key)
+
+    def filter(self, book, names: list[str]) -> list[str]:
+        # the candidates' own phones, so a SQLite book does not build the phone index
+        key, data = self.key, book.data
+        return [name for name in names if any(phone.key == key for phone in data[name].phones)]
+
+    def where(self) -> tuple[str, tuple]:
+        return phone_where(self.key)
+
+def _birthday_bound(text: str, last: bool) -> tuple[int, int]:
+    """Parses MM or DD.MM into (month, day); a month alone stands for its first or last day."""
+    match = BIRTHDAY_BOUND.fullmatch(text)
+    if match is None:
+        raise ValueError(f"Invalid birthday '{text}'. Use MM, DD.MM, DD.MM.YYYY, YYYY or a range like 03..05.")
+    day, month = match.groups()
+    month = int(month)
+    if not 1 <= month <= 12:
+        raise ValueError(f"Invalid month in birthday '{text}'.")
+    # a leap year, so 29 February can be asked for
+    days = calendar.monthrange(2000, month)[1]
+    if day is None:
+        return month, days if last else 1
+    if not 1 <= int(day) <= days:
+        raise ValueError(f"Invalid day in birthday '{text}'.")
+    return month, int(day)
+
+class ContactBirthday(Condition):
+    """
+    The birthday falls on a day, in a month or in a range of them (`03..05`, `25.12..06.01`),
+    or in a year (`1990`). Looked up in the birthday index.
+    """
+    def __init__(self, value: str):
+        self.year = None
+        if re.fullmatch(r"\d{4}", value):
+            self.year = int(value)
+            self.start, self.end = (1, 1), (12, 31)
+        elif re.fullmatch(r"\d{1,2}\.\d{1,2}\.\d{4}", value):
+            day, _, year = value.rpartition(".")
+            self.year = int(year)
+            self.start = self.end = _birthday_bound(day, False)
+        else:
+            start, dots, end = value.partition("..")
+            self.start = _birthday_bound(start, False)
+            self.end = _birthday_bound(end if dots else start, True)
+        self.exact = self.year is None
+
+    def estimate(self, book) -> int:
+        count = self.cost(book)
+        return count if self.year is None else int(count * YEAR_SELECTIVITY)
+
+    def cost(self, book) -> int:
+        return book.birthday_index.count_between(self.start, self.end)
+
+    def lookup(self, book) -> list[str]:
+        return book.birthday_index.between(self.start, self.end)
+
+    def filter(self, book, names: list[str]) -> list[str]:
+        start, end, year, data = self.start, self.end, self.year, book.data
+        wraps = start > end
+        matched = []
+        for name in names:
+            birthday = data[name].birthday
+            if birthday is None:
+                continue
+            born = birthday.date
+            if year is not None and born.year != year:
+                continue
+            day = (born.month, born.day)
+            if (not end < day < start) if wraps else start <= day <= end:
+                matched.append(name)
+        return matched
+
+    def where(self) -> tuple[str, tuple]:
+        return birthday_where(self.start, self.end, self.year)
+
+def contact_query(text: str) -> Query:
+    """Parses a contact query. Raises ValueError if it is invalid."""
+    conditions = []
+    terms = parse_terms(text, CONTACT_FIELDS)
+    for field, operator, value in terms:
+        value = _unquote(value)
+        if field == "name" and operator == "=":
+            conditions.append(ContactName(value))
+        elif field == "phone":
+            conditions.append(ContactPhone(value))
+        elif field == "birthday":
+            conditions.append(ContactBirthday(value))
+        else:
+            conditions.append(ContactText(field, value))
+    return Query(conditions, all(field is None for field, _, _ in terms))
+
+def find_contacts(book, text: str) -> list:
+    """
+    Returns the records matching a contact query. Raises ValueError if it is invalid.
+
+    A SQLite book is queried in the database, which reads only the matching records.
+    """
+    query = contact_query(text)
+    names = query.select(book) if hasattr(book.data, "select") else query.names(book)
+    return [book.data[name] for name in names]
+
+# notes
+
+class NoteWords(Condition):
+    """Words, `prefix*` and "phrases" of the text. Looked up in the full-text index, best match first."""
+    def __init__(self, words: list[str]):
+        self.query = " ".join(words)
+        self.terms = parse_query(self.query)
+        if not self.terms:
+            raise ValueError(f"No words to search for in '{self.query}'.")
+
+    def _counts(self, book) -> list[int]:
+        postings = book.text_index.postings
+        return [len(postings.get(token, ())) for kind, tokens in self.terms if kind != "prefix" for token in tokens]
+
+    def estimate(self, book) -> int:
+        return min(self._counts(book), default=len(book))
+
+    def cost(self, book) -> int:
+        # every matching note is scored for every token
+        return self.estimate(book) * (len(self._counts(book)) + 1) * RANK_COST
+
+    def lookup(self, book) -> list[str]:
+        return list(book.text_index.search(self.query))
+
+    def filter(self, book, names: list[str]) -> list[str]:
+        matches, terms = book.text_index.matches, self.terms
+        return [name for name in names if matches(name, terms)]
+
+class NoteTag(Condition):
+    """The note carries the tag. Looked up in the tag index."""
+    def __init__(self, tag: str):
+        self.tag = tag
+
+    def estimate(self, book) -> int:
+        return len(book.tag_index.notes.get(self.tag, ()))
+
+    def lookup(self, book) -> list[str]:
+        return book.tag_index.names(self.tag)
+
+    def filter(self, book, names: list[str]) -> list[str]:
+        tag, tags = self.tag, book.tag_index.tags
+        return [name for name in names if tag in tags.get(name, ())]
+
+class NoteName(Condition):
+    """The note name is the value (`name=`) or contains it (`name:`)."""
+    def __init__(self, name: str, exact_name: bool):
+        self.name = name if exact_name else name.lower()
+        self.exact_name = exact_name
+
+    def estimate(self, book) -> int:
+        return 1 if self.exact_name else len(book)
+
+    def lookup(self, book) -> list[str]:
+        if self.exact_name:
+            return [self.name] if self.name in book.data else []
+        return super().lookup(book)
+
+    def filter(self, book, names: list[str]) -> list[str]:
+        value = self.name
+        if self.exact_name:
+            return [name for name in names if name == value]
+        return [name for name in names if value in name.lower()]
+
+class NoteText(Condition):
+    """The text contains the value anywhere, even inside a word. No index can answer it, so it is scanned."""
+    def __init__(self, text: str):
+        self.text = text.lower()
+
+    def cost(self, book) -> int:
+        return len(book) * TEXT_SCAN_COST
+
+    def lookup(self, book) -> list[str]:
+        # the parallel scanner splits large books across worker processes
+        return [note.name for note in book.find_by_text(self.text)]
+
+    def filter(self, book, names: list[str]) -> list[str]:
+        value, data = self.text, book.data
+        return [name for name in names if value in data[name].text.lower()]
+
+def note_query(text: str) -> Query:
+    """Parses a note query. Raises ValueError if it is invalid."""
+    conditions = []
+    words = []
+    terms = parse_terms(text, NOTE_FIELDS)
+    for field, operator, value in terms:
+        if field is None:
+            # bare words and phrases are ranked together by the full-text index
+            words.append(value)
+        elif field == "tag":
+            conditions.append(NoteTag(_unquote(value)))
+        elif field == "name":
+            conditions.append(NoteName(_unquote(value), operator == "="))
+        else:
+            conditions.append(NoteText(_unquote(value)))
+    if words:
+        conditions.append(NoteWords(words))
+    return Query(conditions, all(field is None for field, _, _ in terms))
+
+def find_notes(book, text: str) -> list:
+    """
+    Returns the notes matching a note query. Raises ValueError if it is invalid.
+
+    Text without fields is ranked by the full-text index and, if no whole word
+    matches, found by a substring scan, which keeps partial words findable.
+    """
+    query = note_query(text)
+    if query.plain:
+        return book.search(text) or book.find_by_text(text)
+    return [book.data[name] for name in query.names(book)]
@@ -0,0 +1,407 @@
+"""
+Local HTTP/JSON API over the address book and the note book.
+
+Requests are served by an asyncio event loop. Reads run right away and
+interleave freely. Mutations are queued and applied by one writer task, in
+arrival order. After each batch of queued mutations the journal is synced
+once and the batch is answered. Snapshots are taken by the background
+compactor from the files on disk, so neither reads nor writes wait for them. Changes other sessions journal are applied by the
+writer too, before each batch and whenever it has been idle for a while.
+"""
+import asyncio
+import json
+import re
+import signal
+import traceback
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from src.address_book import handlers as contacts
+from src.address_book import validators
+from src.address_book.classes import Address, Email
+from src.batch import is_error
+from src.metrics import metrics
+from src.notes import handlers as notes
+from src.query import find_contacts, find_notes
+from src.storage import ConflictError, journal
+from src.tables import strip_ansi
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+# Mutations applied before the journal is synced and their requests are answered
+MAX_BATCH = 256
+# Seconds the writer waits for a mutation before it looks for other sessions' changes
+REFRESH_INTERVAL = 1.0
+MAX_BODY = 1 << 20
+DEFAULT_LIMIT = 100
+
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 409: "Conflict",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+def contact_json(record) -> dict:
+    return {
+        "name": record.name.value,
+        "phones": [phone.value for phone in record.phones],
+        "email": record.email.value if isinstance(record.email, Email) else None,
+        "address": record.address.value if isinstance(record.address, Address) else None,
+        "birthday": record.birthday.value if record.birthday else None,
+    }
+
+def note_json(note) -> dict:
+    return {"name": note.name, "text": note.text, "tags": list(note.tags)}
+
+def _int(query: dict, name: str, default: int) -> int:
+    value = query.get(name, [str(default)])[0]
+    if not value.isdigit():
+        raise HTTPError(400, f"'{name}' must be a non-negative number.")
+    return int(value)
+
+def _page(items: list, query: dict, to_json) -> dict:
+    """Slices a result by the offset and limit query parameters; only the slice is converted to JSON."""
+    offset, limit = _int(query, "offset", 0), _int(query, "limit", DEFAULT_LIMIT)
+    return {"total": len(items), "offset": offset, "items": [to_json(item) for item in items[offset:offset + limit]]}
+
+def _field(body: dict, name: str, required: bool = True) -> str | None:
+    value = body.get(name)
+    if value is None and not required:
+        return None
+    if not isinstance(value, str) or not value.strip():
+        raise HTTPError(400, f"'{name}' must be a non-empty string.")
+    return value.strip()
+
+def _outcome(message: str, status: int = 200) -> tuple[int, dict]:
+    """Turns the colored message of a REPL handler into a response; red messages are client errors."""
+    text = strip_ansi(message)
+    if is_error(message):
+        return (404 if "not found" in text.lower() else 400), {"error": text}
+    return status, {"message": text}
+
+def _checked(validator):
+    """Returns the checks of a REPL handler's validator without the handler: the error message or None."""
+    return validator(lambda args, book: None)
+
+# fields a contact can be created or updated with, the handler applying each and the check it is validated by first
+CONTACT_FIELDS = [("phone", contacts.add_contact, _checked(validators.add_contact_validator)),
+                  ("email", contacts.add_email, _checked(validators.add_email_validator)),
+                  ("address", contacts.edit_address, _checked(validators.edit_address_validator)),
+                  ("birthday", contacts.add_birthday, _checked(validators.add_birthday_validator))]
+
+class Routes:
+    """Handlers of the API; reads return a result, mutations are run by the writer."""
+    def __init__(self, book):
+        self.book = book
+
+    # reads
+
+    def list_contacts(self, query, body):
+        # only the records of the page are read, so paging through a large book stays cheap
+        offset, limit = _int(query, "offset", 0), _int(query, "limit", DEFAULT_LIMIT)
+        records = self.book.page(offset, offset + limit)
+        return 200, {"total": len(self.book), "offset": offset, "items": [contact_json(r) for r in records]}
+
+    def search_contacts(self, query, body):
+        keyword = query.get("q", [""])[0]
+        if not keyword:
+            raise HTTPError(400, "Missing query parameter 'q'.")
+        try:
+            found = find_contacts(self.book, keyword)
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+        return 200, _page(found, query, contact_json)
+
+    def get_contact(self, query, body, name):
+        record = self.book.find(name)
+        if record is None:
+            suggestions = [r.name.value for r in self.book.suggest(name)]
+            return 404, {"error": f"Contact '{name}' not found.", "suggestions": suggestions}
+        return 200, contact_json(record)
+
+    def lookup_phone(self, query, body, phone):
+        return 200, {"items": [contact_json(r) for r in self.book.find_by_phone(phone)]}
+
+    def birthdays(self, query, body):
+        days = _int(query, "days", 7)
+        return 200, {"items": [contact_json(r) for r in self.book.get_upcoming_birthdays(days)]}
+
+    def list_notes(self, query, body):
+        book = notes.get_note_book()
+        if "q" in query:
+            text = query["q"][0]
+            try:
+                found = find_notes(book, text)
+            except ValueError as e:
+                raise HTTPError(400, str(e))
+        elif "tag" in query:
+            found = book.find_by_tag(query["tag"][0])
+        else:
+            found = list(book.data.values())
+        return 200, _page(found, query, note_json)
+
+    def get_note(self, query, body, name):
+        note = notes.get_note_book().data.get(name)
+        if note is None:
+            return 404, {"error": f"Note '{name}' not found."}
+        return 200, note_json(note)
+
+    # mutations, applied one at a time by the writer
+
+    def add_contact(self, query, body):
+        name = _field(body, "name")
+        if self.book.find(name) is not None:
+            return 400, {"error": f"Contact '{name}' already exists."}
+        if _field(body, "phone", required=False) is None:
+            return 400, {"error": "'phone' must be a non-empty string."}
+        # the phone is applied first, through add_contact, which creates the contact
+        return self._update(name, body, 201)
+
+    def update_contact(self, query, body, name):
+        if self.book.find(name) is None:
+            return 404, {"error": f"Contact '{name}' not found."}
+        return self._update(name, body, 200)
+
+    def _update(self, name: str, body: dict, status: int):
+        """
+        Applies the fields present in the body through the REPL handlers, which journal them.
+
+        Every field is validated before the first one is applied, so an invalid
+        field leaves the contact unchanged.
+        """
+        changes = []
+        for field, handler, check in CONTACT_FIELDS:
+            value = _field(body, field, required=False)
+            if value is None:
+                continue
+            error = check([name, value], self.book)
+            if error is not None:
+                return 400, {"error": strip_ansi(error)}
+            changes.append((handler, value))
+        for handler, value in changes:
+            field_status, result = _outcome(handler([name, value], self.book))
+            if field_status != 200:
+                return field_status, result
+        return status, contact_json(self.book.find(name))
+
+    def delete_contact(self, query, body, name):
+        return _outcome(contacts.delete_contact([name], self.book))
+
+    def add_note(self, query, body):
+        name, text = _field(body, "name"), _field(body, "text")
+        tags = body.get("tags", [])
+        if not isinstance(tags, list) or not all(isinstance(tag, str) and tag.strip() for tag in tags):
+            raise HTTPError(400, "'tags' must be a list of non-empty strings.")
+        status, result = _outcome(notes.note_add(name, text), 201)
+        if status != 201:
+            return status, result
+        for tag in tags:
+            notes.note_tag(name, tag.strip())
+        return status, note_json(notes.get_note_book().data[name])
+
+    def update_note(self, query, body, name):
+        if name not in notes.get_note_book().data:
+            return 404, {"error": f"Note '{name}' not found."}
+        text = _field(body, "text", required=False)
+        tag = _field(body, "tag", required=False)
+        if text is not None:
+            notes.note_edit(name, text)
+        if tag is not None:
+            notes.note_tag(name, tag)
+        return 200, note_json(notes.get_note_book().data[name])
+
+    def delete_note(self, query, body, name):
+        return _outcome(notes.note_delete(name))
+
+    def stats(self, query, body):
+        return 200, {name: {"calls": s.calls,
+                            **{f"p{p}_ms": round(s.latency.percentile(p) * 1000, 3) for p in (50, 95, 99)}}
+                     for name, s in metrics.commands.items() if s.calls}
+
+# method, path pattern, Routes method name, whether it changes data
+ROUTES = [
+    ("GET", r"/contacts", "list_contacts", False),
+    ("POST", r"/contacts", "add_contact", True),
+    ("GET", r"/contacts/search", "search_contacts", False),
+    ("GET", r"/contacts/([^/]+)", "get_contact", False),
+    ("PATCH", r"/contacts/([^/]+)", "update_contact", True),
+    ("DELETE", r"/contacts/([^/]+)", "delete_contact", True),
+    ("GET", r"/phones/([^/]+)", "lookup_phone", False),
+    ("GET", r"/birthdays", "birthdays", False),
+    ("GET", r"/notes", "list_notes", False),
+    ("POST", r"/notes", "add_note", True),
+    ("GET", r"/notes/([^/]+)", "get_note", False),
+    ("PATCH", r"/notes/([^/]+)", "update_note", True),
+    ("DELETE", r"/notes/([^/]+)", "delete_note", True),
+    ("GET", r"/stats", "stats", False),
+]
+COMPILED_ROUTES = [(method, re.compile(pattern + "/?"), name, write) for method, pattern, name, write in ROUTES]
+
+def match(method: str, path: str):
+    """Returns the route name, its path arguments and whether it writes, or raises HTTPError."""
+    allowed = False
+    for route_method, pattern, name, write in COMPILED_ROUTES:
+        found = pattern.fullmatch(path)
+        if found is None:
+            continue
+        if route_method == method:
+            return name, [unquote(arg) for arg in found.groups()], write
+        allowed = True
+    raise HTTPError(405 if allowed else 404, f"No route for {method} {path}")
+
+class Server:
+    """
+    The API server.
+
+    Attributes:
+        routes (Routes): Handlers bound to the address book.
+        queue (asyncio.Queue): Mutations waiting for the writer.
+        batches (int): Number of mutation batches written, each with one journal sync.
+    """
+    def __init__(self, book):
+        self.book = book
+        self.routes = Routes(book)
+        self.queue = None
+        self.batches = 0
+
+    def _call(self, name: str, query: dict, body: dict, args: list) -> tuple[int, dict]:
+        with metrics.command(name):
+            try:
+                return getattr(self.routes, name)(query, body, *args)
+            except HTTPError as e:
+                return e.status, {"error": str(e)}
+            except ConflictError as e:
+                return 409, {"error": str(e)}
+            except ValueError as e:
+                return 400, {"error": strip_ansi(str(e))}
+
+    async def _writer(self):
+        """Applies queued mutations in order; each batch is synced to the journal once before it is answered."""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                first = await asyncio.wait_for(self.queue.get(), REFRESH_INTERVAL)
+            except asyncio.TimeoutError:
+                journal.refresh(self.book)
+                continue
+            journal.refresh(self.book)
+            batch = [first]
+            while len(batch) < MAX_BATCH and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            results = []
+            for name, query, body, args, future in batch:
+                try:
+                    results.append((future, self._call(name, query, body, args)))
+                except Exception as e:
+                    traceback.print_exc()
+                    results.append((future, (500, {"error": f"Internal error: {e}"})))
+            await loop.run_in_executor(None, journal.sync)
+            self.batches += 1
+            for future, result in results:
+                if not future.done():
+                    future.set_result(result)
+
+    async def dispatch(self, method: str, target: str, raw_body: bytes) -> tuple[int, dict]:
+        url = urlsplit(target)
+        name, args, write = match(method, url.path)
+        query = parse_qs(url.query)
+        try:
+            body = json.loads(raw_body) if raw_body else {}
+        except ValueError:
+            raise HTTPError(400, "The body is not valid JSON.") from None
+        if not isinstance(body, dict):
+            raise HTTPError(400, "The body must be a JSON object.")
+        if not write:
+            return self._call(name, query, body, args)
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((name, query, body, args, future))
+        return await future
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serves the requests of one connection; connections are kept alive unless the client closes them."""
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                try:
+                    status, payload = await self.dispatch(method, target, body)
+                except HTTPError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except Exception as e:
+                    # a bug in a handler fails the request, not the connection or the server
+                    traceback.print_exc()
+                    status, payload = 500, {"error": f"Internal error: {e}"}
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except HTTPError as e:
+            writer.write(response(e.status, {"error": str(e)}, keep_alive=False))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, ready=None):
+        self.queue = asyncio.Queue()
+        try:
+            # stopped like Ctrl+C, so the journal is still folded into a snapshot
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        except NotImplementedError:
+            pass
+        writer_task = asyncio.create_task(self._writer())
+        server = await asyncio.start_server(self.handle, host, port, backlog=1024)
+        if ready is not None:
+            ready(server)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            writer_task.cancel()
+
+async def read_request(reader: asyncio.StreamReader):
+    """Reads one HTTP/1.1 request; returns None when the client closed the connection."""
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    try:
+        method, target, _ = line.decode("latin-1").split()
+    except ValueError:
+        raise HTTPError(400, "Malformed request line.") from None
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        key, _, value = line.decode("latin-1").partition(":")
+        headers[key.strip().lower()] = value.strip()
+    length = headers.get("content-length", "") or "0"
+    if not (length.isascii() and length.isdigit()):
+        raise HTTPError(400, "Content-Length must be a non-negative number.")
+    length = int(length)
+    if length > MAX_BODY:
+        raise HTTPError(413, "The body is too large.")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, headers, body
+
+def response(status: int, payload, keep_alive: bool = True) -> bytes:
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode("latin-1") + body
+
+def serve(book, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+    """Runs the API server until it is interrupted."""
+    def ready(server):
+        address = server.sockets[0].getsockname()
+        print(f"Serving the address book on http://{address[0]}:{address[1]} (Ctrl+C to stop)", flush=True)
+    try:
+        asyncio.run(Server(book).serve(host, port, ready))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
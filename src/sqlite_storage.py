@@ -0,0 +1,637 @@
+import os
+import threading
+from collections.abc import MutableMapping
+from heapq import merge
+from itertools import groupby
+
+from src.address_book.classes import AddressBook, Record, Address, Email, normalize_phone, parse_birthday
+from src.address_book.indexes import search_texts
+from src.notes.classes import Note, NoteBook
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS contacts (
+    name TEXT PRIMARY KEY,
+    address TEXT,
+    email TEXT,
+    birthday TEXT,
+    bday_month INTEGER,
+    bday_day INTEGER
+);
+CREATE INDEX IF NOT EXISTS contacts_email ON contacts (email);
+CREATE INDEX IF NOT EXISTS contacts_birthday ON contacts (bday_month, bday_day);
+CREATE TABLE IF NOT EXISTS phones (
+    name TEXT NOT NULL REFERENCES contacts (name) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    phone TEXT NOT NULL,
+    phone_key TEXT NOT NULL,
+    PRIMARY KEY (name, position)
+);
+CREATE TABLE IF NOT EXISTS notes (
+    name TEXT PRIMARY KEY,
+    text TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS note_tags (
+    note TEXT NOT NULL REFERENCES notes (name) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (note, position)
+);
+CREATE INDEX IF NOT EXISTS note_tags_tag ON note_tags (tag);
+"""
+
+# Created once the phones table has its phone_key column
+INDEXES = """
+DROP INDEX IF EXISTS phones_phone;
+CREATE INDEX IF NOT EXISTS phones_key ON phones (phone_key);
+"""
+
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+# Rows read per query when a whole table is listed
+BATCH_SIZE = 500
+
+# Contact columns a bare word is searched in; phones are searched through their own table
+SEARCH_COLUMNS = ("name", "email", "address", "birthday")
+
+def is_sqlite_file(filename: str) -> bool:
+    """Returns True if the file name selects the SQLite storage engine."""
+    return filename.endswith(SQLITE_SUFFIXES)
+
+def _lower(text: str | None) -> str | None:
+    return None if text is None else text.lower()
+
+def _connect(filename: str, **options):
+    # imported here so the pickle engine does not pay for it at startup
+    import sqlite3
+    connection = sqlite3.connect(filename, **options)
+    # SQLite's lower() only folds ASCII; queries have to match like str.lower() does in memory
+    connection.create_function("py_lower", 1, _lower, deterministic=True)
+    connection.create_function("normalize_phone", 1, normalize_phone, deterministic=True)
+    return connection
+
+# WHERE clauses of contact queries, matching what the conditions of src.query check in memory
+
+def name_where(name: str) -> tuple[str, tuple]:
+    """Returns the clause and parameters matching the contact with exactly that name."""
+    return "contacts.name = ?", (name,)
+
+def text_where(field: str | None, value: str) -> tuple[str, tuple]:
+    """Returns the clause and parameters matching contacts with the lowercased value in a field, or in any field."""
+    if field is not None and field not in SEARCH_COLUMNS:
+        raise ValueError(f"Unknown contact field: {field}")
+    columns = SEARCH_COLUMNS if field is None else (field,)
+    clauses = [f"instr(py_lower(contacts.{column}), ?) > 0" for column in columns]
+    if field is None:
+        clauses.append("contacts.name IN (SELECT name FROM phones WHERE instr(py_lower(phone), ?) > 0)")
+    return " OR ".join(clauses), (value,) * len(clauses)
+
+def phone_where(key: str) -> tuple[str, tuple]:
+    """Returns the clause and parameters matching the owners of a normalized phone number."""
+    return "contacts.name IN (SELECT name FROM phones WHERE phone_key = ?)", (key,)
+
+def birthday_where(start: tuple[int, int], end: tuple[int, int], year: int | None = None) -> tuple[str, tuple]:
+    """Returns the clause and parameters matching birthdays from start to end (inclusive, wrapping past 31 December), in a year if given."""
+    day = "(contacts.bday_month, contacts.bday_day)"
+    if start <= end:
+        sql, params = f"{day} BETWEEN (?, ?) AND (?, ?)", (*start, *end)
+    else:
+        sql, params = f"contacts.bday_month IS NOT NULL AND NOT ({day} > (?, ?) AND {day} < (?, ?))", (*end, *start)
+    if year is not None:
+        sql += " AND substr(contacts.birthday, -4) = ?"
+        params += (f"{year:04d}",)
+    return sql, params
+
+# Rows
+
+def _contact_row(record: Record) -> tuple:
+    """Returns the stored columns of a record: address, email, birthday and phones."""
+    address = record.address.value if isinstance(record.address, Address) else None
+    email = record.email.value if isinstance(record.email, Email) else None
+    birthday = record.birthday.value if record.birthday else None
+    return address, email, birthday, tuple(phone.value for phone in record.phones)
+
+def _contact_rows(connection, where: str, params: tuple = ()):
+    """Yields (rowid, name, row) of the contacts matching the clause in rowid order, with their phones from one join."""
+    rows = connection.execute(
+        "SELECT contacts.rowid, contacts.name, address, email, birthday, phones.phone "
+        "FROM contacts LEFT JOIN phones ON phones.name = contacts.name "
+        f"WHERE {where} ORDER BY contacts.rowid, phones.position", params
+    ).fetchall()
+    for (rowid, name, address, email, birthday), group in groupby(rows, lambda row: row[:5]):
+        phones = tuple(row[5] for row in group if row[5] is not None)
+        yield rowid, name, (address, email, birthday, phones)
+
+def _record(name: str, row: tuple) -> Record:
+    address, email, birthday, phones = row
+    record = Record(name)
+    if address is not None:
+        record.add_address(address)
+    if email is not None:
+        record.add_email(email)
+    if birthday is not None:
+        record.add_birthday(birthday)
+    for phone in phones:
+        record.add_phone(phone)
+    return record
+
+def _note_rows(connection, where: str, params: tuple = ()):
+    """Yields (rowid, name, (text, tags)) of the notes matching the clause in rowid order, with their tags from one join."""
+    rows = connection.execute(
+        "SELECT notes.rowid, notes.name, notes.text, note_tags.tag "
+        "FROM notes LEFT JOIN note_tags ON note_tags.note = notes.name "
+        f"WHERE {where} ORDER BY notes.rowid, note_tags.position", params
+    ).fetchall()
+    for (rowid, name, text), group in groupby(rows, lambda row: row[:3]):
+        yield rowid, name, (text, tuple(row[3] for row in group if row[3] is not None))
+
+def _note(name: str, row: tuple) -> Note:
+    text, tags = row
+    note = Note(name, text)
+    note.tags = list(tags)
+    return note
+
+class SqliteStorage:
+    """
+    Keeps contacts and notes as rows of a local SQLite database.
+
+    Names, normalized phones, emails, birthday month/day and note tags are indexed
+    columns. The books are read through SqliteRecords and SqliteNotes, which look
+    records up in the database instead of loading the whole book.
+
+    Attributes:
+        filename (str): Path of the database file.
+    """
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.connection = _connect(filename)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.executescript(SCHEMA)
+        self._upgrade()
+        self.connection.executescript(INDEXES)
+
+    def _upgrade(self):
+        """Adds the normalized phone column to databases written before it existed."""
+        if "phone_key" in self._columns("phones"):
+            return
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            # another session may have upgraded it while the lock was awaited
+            if "phone_key" not in self._columns("phones"):
+                self.connection.execute("ALTER TABLE phones ADD COLUMN phone_key TEXT NOT NULL DEFAULT ''")
+                self.connection.execute("UPDATE phones SET phone_key = normalize_phone(phone)")
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+
+    def _columns(self, table: str) -> set[str]:
+        return {row[1] for row in self.connection.execute(f"PRAGMA table_info({table})")}
+
+    def close(self):
+        """Closes the database connection."""
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _get_meta(self, key: str, default=None):
+        row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key: str, value):
+        self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _is_read_by(self, rows) -> bool:
+        """Tells whether a lazy mapping was opened on this database file."""
+        return isinstance(rows, SqliteRows) and os.path.abspath(rows.filename) == os.path.abspath(self.filename)
+
+    def refresh(self, rows, written: dict | None = None):
+        """Lets a lazy mapping opened on this database read what was just saved from it; see SqliteRows.saved."""
+        if self._is_read_by(rows):
+            rows.saved(written)
+
+    # Contacts
+
+    def _insert_record(self, record: Record):
+        name = record.name.value
+        address, email, birthday, phones = _contact_row(record)
+        if birthday:
+            born = parse_birthday(birthday)
+            month, day = born.month, born.day
+        else:
+            month, day = None, None
+        # an upsert keeps the rowid, and with it the contact's place in the book
+        self.connection.execute(
+            "INSERT INTO contacts (name, address, email, birthday, bday_month, bday_day) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET address = excluded.address, email = excluded.email, "
+            "birthday = excluded.birthday, bday_month = excluded.bday_month, bday_day = excluded.bday_day",
+            (name, address, email, birthday, month, day)
+        )
+        self.connection.execute("DELETE FROM phones WHERE name = ?", (name,))
+        self.connection.executemany(
+            "INSERT INTO phones (name, position, phone, phone_key) VALUES (?, ?, ?, ?)",
+            [(name, i, phone, normalize_phone(phone)) for i, phone in enumerate(phones)]
+        )
+
+    def save_book(self, book: AddressBook):
+        """
+        Writes the contacts that differ from the stored ones and deletes those no longer in the book.
+
+        A book read from this database knows which records it read or changed, so the
+        others are not compared; any other book is compared row by row.
+        """
+        data = book.data
+        with self.connection:
+            if self._is_read_by(data):
+                deleted = data.deleted
+                changed = data.changed()
+            else:
+                stored = {name: row for _, name, row in _contact_rows(self.connection, "1")}
+                deleted = stored.keys() - data.keys()
+                changed = [record for name, record in data.items() if stored.get(name) != _contact_row(record)]
+            self.connection.executemany("DELETE FROM contacts WHERE name = ?", [(name,) for name in deleted])
+            for record in changed:
+                self._insert_record(record)
+            self._set_meta("journal_seq", getattr(book, "journal_seq", 0))
+        self.refresh(data)
+
+    def journal_seq(self) -> int:
+        """Returns the journal sequence number the contacts were last saved at."""
+        return int(self._get_meta("journal_seq", 0))
+
+    # Notes
+
+    def _insert_note(self, name: str, text: str, tags: list[str]):
+        self.connection.execute(
+            "INSERT INTO notes (name, text) VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET text = excluded.text",
+            (name, text)
+        )
+        self.connection.execute("DELETE FROM note_tags WHERE note = ?", (name,))
+        self.connection.executemany(
+            "INSERT INTO note_tags (note, position, tag) VALUES (?, ?, ?)",
+            [(name, i, tag) for i, tag in enumerate(tags)]
+        )
+
+    def save_notebook(self, notes: NoteBook):
+        """Replaces all stored notes with the contents of the note book."""
+        with self.connection:
+            self.connection.execute("DELETE FROM notes")
+            for note in notes.values():
+                self._insert_note(note.name, note.text, note.tags)
+
+    def write_notes(self, rows: dict[str, tuple[str, list[str]] | None]):
+        """Writes the text and tags of each named note in one transaction; names mapped to None are deleted."""
+        with self.connection:
+            for name, row in rows.items():
+                if row is None:
+                    self.connection.execute("DELETE FROM notes WHERE name = ?", (name,))
+                else:
+                    self._insert_note(name, *row)
+
+    def save_changed_notes(self, notes: NoteBook):
+        """Writes only the notes added, changed or deleted since the note book was last saved."""
+        rows = note_rows(notes, notes.changed)
+        self.write_notes(rows)
+        self.refresh(notes.data, rows)
+
+class SqliteRows(MutableMapping):
+    """
+    Name to record mapping backed by a table of a SQLite database.
+
+    Like MappedRecords: opening the database reads nothing but the row count. Rows
+    are read when first accessed and then kept in `loaded`, so changes to them stick.
+    Names added or deleted since the last save are tracked separately. All reads run
+    in one read transaction, so the mapping sees the database as it was opened or last
+    saved, whatever other sessions write meanwhile; their changes arrive through the
+    journal, as with the other engines.
+
+    Attributes:
+        filename (str): The database file.
+        book (AddressBook | NoteBook | None): Book the records belong to, so their changes reach its indexes.
+        loaded (dict): Records read from the database or added since.
+        added (dict[str, None]): Names that are not in the database, in insertion order.
+        deleted (set[str]): Names of the database that were deleted.
+        rowids (dict[str, int]): Row ids of stored names seen so far, which give the book order.
+    """
+    table = ""
+
+    def __init__(self, filename: str, book=None):
+        self.filename = filename
+        self.book = book
+        self.connection = _connect(filename, isolation_level=None, check_same_thread=False)
+        # one connection is shared by the threads using the book
+        self._lock = threading.RLock()
+        self.loaded = {}
+        self.added = {}
+        self.deleted = set()
+        self.rowids = {}
+        self._begin()
+
+    def _begin(self):
+        with self._lock:
+            self.connection.execute("BEGIN")
+            # the read transaction takes its snapshot at the first read
+            self.count = self.connection.execute(f"SELECT count(*) FROM {self.table}").fetchone()[0]
+
+    def _query(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    def _rows(self, where: str, params: tuple = ()):
+        """Yields (rowid, name, row) of the stored rows matching the clause, in rowid order."""
+        raise NotImplementedError
+
+    def _decode(self, name: str, row: tuple):
+        raise NotImplementedError
+
+    def _read(self, where: str, params: tuple = ()) -> list:
+        """Returns the records of the rows matching the clause; records read before are kept, deleted ones skipped."""
+        with self._lock:
+            rows = list(self._rows(where, params))
+        records = []
+        for rowid, name, row in rows:
+            if name in self.deleted:
+                continue
+            self.rowids[name] = rowid
+            record = self.loaded.get(name)
+            if record is None:
+                record = self.loaded[name] = self._decode(name, row)
+                record._book = self.book
+                self._stored(name, row)
+            records.append(record)
+        return records
+
+    def _stored(self, name: str, row: tuple):
+        """Called with the stored row of every record read."""
+
+    def _rowid(self, name: str) -> int | None:
+        rowid = self.rowids.get(name)
+        if rowid is None:
+            rows = self._query(f"SELECT rowid FROM {self.table} WHERE name = ?", (name,))
+            if rows:
+                rowid = self.rowids[name] = rows[0][0]
+        return rowid
+
+    def _on_disk(self, name: str) -> bool:
+        return name not in self.deleted and name not in self.added and self._rowid(name) is not None
+
+    def __getitem__(self, name: str):
+        record = self.loaded.get(name)
+        if record is not None:
+            return record
+        records = self._read(f"{self.table}.name = ?", (name,)) if name not in self.deleted else []
+        if not records:
+            raise KeyError(name)
+        return records[0]
+
+    def __setitem__(self, name: str, record):
+        if name in self.deleted:
+            self.deleted.discard(name)
+        elif name not in self.loaded and not self._on_disk(name):
+            self.added[name] = None
+        self.loaded[name] = record
+
+    def __delitem__(self, name: str):
+        if name in self.added:
+            del self.added[name]
+        elif self._on_disk(name):
+            self.deleted.add(name)
+        else:
+            raise KeyError(name)
+        self.loaded.pop(name, None)
+
+    def __contains__(self, name) -> bool:
+        return name in self.loaded or self._on_disk(name)
+
+    def __len__(self):
+        return self.count - len(self.deleted) + len(self.added)
+
+    def _batches(self, select: str):
+        """Yields the rows of `SELECT rowid, ...` over the table in rowid order, one batch per query."""
+        last = 0
+        while rows := self._query(f"{select} WHERE rowid > ? ORDER BY rowid LIMIT {BATCH_SIZE}", (last,)):
+            yield rows
+            last = rows[-1][0]
+
+    def __iter__(self):
+        for batch in self._batches(f"SELECT rowid, name FROM {self.table}"):
+            for _, name in batch:
+                if name not in self.deleted:
+                    yield name
+        yield from list(self.added)
+
+    def values(self):
+        """Yields every record in book order, reading the stored ones a batch per query."""
+        for batch in self._batches(f"SELECT rowid FROM {self.table}"):
+            yield from self._read(f"{self.table}.rowid BETWEEN ? AND ?", (batch[0][0], batch[-1][0]))
+        yield from [self.loaded[name] for name in list(self.added)]
+
+    def items(self):
+        """Yields every (name, record) pair in book order."""
+        for record in self.values():
+            yield self._name(record), record
+
+    def _name(self, record) -> str:
+        raise NotImplementedError
+
+    def __reduce__(self):
+        # pickled as a plain dict, e.g. when the book is saved with another engine
+        return dict, (dict(self.items()),)
+
+    def names(self) -> list[str]:
+        """Returns all names in book order, without reading the records."""
+        return list(self)
+
+    def sorted_names(self) -> list[str]:
+        """Returns all names in sorted order, from the primary key index."""
+        stored = (name for (name,) in self._query(f"SELECT name FROM {self.table} ORDER BY name")
+                  if name not in self.deleted)
+        return list(merge(stored, sorted(self.added)))
+
+    def select(self, where: str, params: tuple, matches) -> list[str]:
+        """
+        Returns the names matching a query, in book order.
+
+        The database answers for the rows never read. Records read or added since may
+        have changed, so `matches`, which filters a list of names, checks them in memory.
+        """
+        found = [(rowid, name) for rowid, name in self._query(f"SELECT rowid, name FROM {self.table} WHERE {where}", params)
+                 if name not in self.loaded and name not in self.deleted]
+        stored = [name for name in self.loaded if name not in self.added]
+        found += [(self._rowid(name), name) for name in matches(stored)]
+        found.sort()
+        return [name for _, name in found] + matches(list(self.added))
+
+    def saved(self, written: dict | None = None):
+        """
+        Starts reading the database as it was just saved from this mapping's book.
+
+        `written` maps the names saved to their rows, None for the deleted ones; by
+        default every change was saved. Names changed again since keep their changes.
+        """
+        with self._lock:
+            self.connection.execute("COMMIT")
+            self._begin()
+        if written is None:
+            written = dict.fromkeys(self.deleted)
+            written.update((name, True) for name in self.added)
+        for name, row in written.items():
+            if row is None:
+                self.deleted.discard(name)
+                self.rowids.pop(name, None)
+                if name in self.loaded:
+                    # added again since, so no longer in the database
+                    self.added[name] = None
+            else:
+                self.added.pop(name, None)
+                if name in self.loaded:
+                    self._rowid(name)
+                else:
+                    # deleted since it was saved
+                    self.deleted.add(name)
+
+    def close(self):
+        self.connection.close()
+
+class SqliteRecords(SqliteRows):
+    """
+    Contacts of a SQLite database, read lazily.
+
+    Attributes:
+        journal_seq (int): Journal sequence number the database was saved at.
+        stored (dict[str, tuple]): Stored row of every record read, to tell which ones changed.
+    """
+    table = "contacts"
+
+    def __init__(self, filename: str, book: AddressBook | None = None):
+        self.stored = {}
+        super().__init__(filename, book)
+
+    def _begin(self):
+        super()._begin()
+        rows = self._query("SELECT value FROM meta WHERE key = 'journal_seq'")
+        self.journal_seq = int(rows[0][0]) if rows else 0
+
+    def _rows(self, where: str, params: tuple = ()):
+        return _contact_rows(self.connection, where, params)
+
+    def _decode(self, name: str, row: tuple) -> Record:
+        return _record(name, row)
+
+    def _stored(self, name: str, row: tuple):
+        self.stored[name] = row
+
+    def _name(self, record: Record) -> str:
+        return record.name.value
+
+    def changed(self) -> list[Record]:
+        """Returns the records added or changed since they were read."""
+        return [record for name, record in self.loaded.items() if self.stored.get(name) != _contact_row(record)]
+
+    def saved(self, written: dict | None = None):
+        super().saved(written)
+        self.stored = {name: _contact_row(record) for name, record in self.loaded.items()}
+
+    def search(self, keyword: str) -> list[str]:
+        """Returns names of the contacts with the lowercased keyword in any field."""
+        data = self.loaded
+        return self.select(*text_where(None, keyword), lambda names: [
+            name for name in names if any(keyword in text for text in search_texts(data[name]))])
+
+    def find_by_phone(self, key: str) -> list[str]:
+        """Returns names of the contacts owning the normalized phone number, from the phone index."""
+        data = self.loaded
+        return self.select(*phone_where(key), lambda names: [
+            name for name in names if any(phone.key == key for phone in data[name].phones)])
+
+    def birthdays(self):
+        """Yields (name, (month, day)) of every contact with a birthday, reading only those two columns of the stored ones."""
+        for name, month, day in self._query(
+                "SELECT name, bday_month, bday_day FROM contacts WHERE bday_month IS NOT NULL"):
+            if name not in self.loaded and name not in self.deleted:
+                yield name, (month, day)
+        for name, record in list(self.loaded.items()):
+            if record.birthday:
+                yield name, (record.birthday.date.month, record.birthday.date.day)
+
+class SqliteNotes(SqliteRows):
+    """Notes of a SQLite database, read lazily. Which ones changed is tracked by the note book."""
+    table = "notes"
+
+    def _rows(self, where: str, params: tuple = ()):
+        return _note_rows(self.connection, where, params)
+
+    def _decode(self, name: str, row: tuple) -> Note:
+        return _note(name, row)
+
+    def _name(self, note: Note) -> str:
+        return note.name
+
+    def find_by_tag(self, tag: str) -> list[str]:
+        """Returns names of the notes with the tag, from the tag index."""
+        data = self.loaded
+        return self.select("notes.name IN (SELECT note FROM note_tags WHERE tag = ?)", (tag,),
+                           lambda names: [name for name in names if tag in data[name].tags])
+
+def note_rows(notes: NoteBook, names) -> dict[str, tuple[str, list[str]] | None]:
+    """Returns the text and a copy of the tags of the named notes, or None for the names deleted from the book."""
+    rows = {}
+    for name in names:
+        note = notes.data.get(name)
+        rows[name] = None if note is None else (note.text, list(note.tags))
+    return rows
+
+def _prepare(filename: str):
+    # creates the tables, or upgrades them, before a lazy mapping reads them
+    with SqliteStorage(filename):
+        pass
+
+def load_sqlite_book(filename: str) -> AddressBook:
+    """Opens the contacts of a SQLite database; records are read when they are first used."""
+    _prepare(filename)
+    book = AddressBook()
+    book.data = SqliteRecords(filename, book)
+    book.journal_seq = book.data.journal_seq
+    return book
+
+def load_sqlite_notes(filename: str) -> NoteBook:
+    """Opens the notes of a SQLite database; notes are read when they are first used."""
+    _prepare(filename)
+    notes = NoteBook()
+    notes.data = SqliteNotes(filename, notes)
+    return notes
+
+def migrate(db_filename: str, book: AddressBook | None = None, notes: NoteBook | None = None):
+    """Copies an in-memory address book and note book into a SQLite database."""
+    with SqliteStorage(db_filename) as storage:
+        if book is not None:
+            storage.save_book(book)
+        if notes is not None:
+            storage.save_notebook(notes)
+
+def main():
+    """Migrates the pickle files into a SQLite database."""
+    import argparse
+    from src.storage import DATA_FILE, DB_FILE, NOTES_FILE, load_data, load_notes
+
+    parser = argparse.ArgumentParser(description="Migrate pickled contacts and notes to SQLite.")
+    parser.add_argument("--contacts", default=DATA_FILE, help="pickled address book")
+    parser.add_argument("--notes", default=NOTES_FILE, help="pickled note book")
+    parser.add_argument("--to", default=DB_FILE, help="SQLite database to create")
+    args = parser.parse_args()
+
+    book = load_data(args.contacts)
+    notes = load_notes(args.notes)
+    migrate(args.to, book, notes)
+    print(f"Migrated {len(book or {})} contacts and {len(notes or {})} notes to {args.to}")
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,1014 @@
+import atexit
+import copyreg
+import gc
+import io
+import json
 import pickle
 import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
 
-def save_data(book, filename="storage/addressbook.pkl"):
-    with open(filename, "wb") as f:
-        pickle.dump(book, f)
+try:
+    import fcntl
+except ImportError:
+    # Windows: the lock file itself is the lock
+    fcntl = None
 
-def load_data(filename="storage/addressbook.pkl", default=None):
+from colorama import Fore
+
+from src.address_book.classes import AddressBook, Record
+from src.metrics import metrics
+from src.sqlite_storage import SqliteStorage, is_sqlite_file, load_sqlite_book, load_sqlite_notes, note_rows
+from src.mapped_storage import is_mapped_file, load_mapped, mapped_journal_seq, save_mapped
+from src.block_storage import block_version, dump_book, is_block_file, load_block_book
+
+DATA_FILE = "storage/addressbook.pkl"
+DB_FILE = "storage/assistant.db"
+MAPPED_FILE = "storage/addressbook.rec"
+BLOCK_FILE = "storage/addressbook.blk"
+
+# First object of a pickled snapshot, followed by its version
+SNAPSHOT_HEADER = "snapshot-version"
+LOCK_POLL_INTERVAL = 0.01
+# Without flock, a lock file older than this was left behind by a crashed process
+STALE_LOCK_AGE = 30.0
+
+# Journal entry written with the snapshot of a change too large to journal, like an import;
+# sessions that reach it reload the book from disk
+RELOAD_OP = "reload"
+
+# Record methods that may be replayed from the journal.
+RECORD_OPS = {
+    "add_phone",
+    "edit_phone",
+    "remove_phone",
+    "add_address",
+    "edit_address",
+    "add_birthday",
+    "add_email",
+    "edit_email",
+}
+
+def data_file():
+    """Returns the file contacts live in: the SQLite database, the mapped or the block file once converted, the pickle otherwise."""
+    for filename in (DB_FILE, MAPPED_FILE, BLOCK_FILE):
+        if os.path.exists(filename):
+            return filename
+    return DATA_FILE
+
+def journal_path(filename):
+    """Returns the journal file that belongs to the given snapshot file."""
+    return os.path.splitext(filename)[0] + ".journal"
+
+def apply_operation(book, op, args):
+    """Applies a single journaled operation to the address book."""
+    if op == RELOAD_OP:
+        # the change is in the snapshot written with the entry; Journal._catch_up reloads it
+        return
+    if op == "add_record":
+        if book.find(args[0]) is None:
+            book.add_record(Record(args[0]))
+    elif op == "delete":
+        book.delete(args[0])
+    elif op in RECORD_OPS:
+        record = book.find(args[0])
+        if record is not None:
+            getattr(record, op)(*args[1:])
+    else:
+        raise ValueError(f"Unknown journal operation: {op}")
+
+def replay_journal(book, filename):
+    """Replays journal entries newer than the book's snapshot. Returns the last applied sequence number."""
+    last_seq = getattr(book, "journal_seq", 0)
+    try:
+        with open(filename, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # a torn write at the end of the log, everything before it is valid
+                    break
+                if entry["seq"] <= last_seq:
+                    continue
+                if entry["seq"] > last_seq + 1:
+                    # the snapshot read was replaced and the journal compacted since; Journal.open() reloads
+                    break
+                try:
+                    apply_operation(book, entry["op"], entry["args"])
+                except (ValueError, TypeError):
+                    pass
+                last_seq = entry["seq"]
+    except FileNotFoundError:
+        pass
+    book.journal_seq = last_seq
+    return last_seq
+
+class ConflictError(Exception):
+    """Raised when a change collides with a change another session saved first."""
+
+class FileLock:
+    """
+    Advisory lock shared by every process using a data file, kept in `<file>.lock`.
+
+    Readers take it shared and writers exclusive, only for as long as it takes to read
+    or replace a file, never while a book is serialized. Where flock is not available
+    the lock file itself is the lock: it is created exclusively and removed on release,
+    so readers are serialized too, and one left behind by a crashed process expires
+    after `STALE_LOCK_AGE` seconds. The lock is reentrant within a thread; a nested
+    acquisition keeps the mode of the outer one.
+
+    Attributes:
+        filename (str): Path of the lock file.
+    """
+    def __init__(self, data_filename):
+        self.filename = data_filename + ".lock"
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def shared(self):
+        return self._held(exclusive=False)
+
+    def exclusive(self):
+        return self._held(exclusive=True)
+
+    @contextmanager
+    def _held(self, exclusive):
+        with self._thread_lock:
+            if not self._depth:
+                self._acquire(exclusive)
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if not self._depth:
+                    self._release()
+
+    def _acquire(self, exclusive):
+        os.makedirs(os.path.dirname(self.filename) or ".", exist_ok=True)
+        if fcntl is not None:
+            self._fd = os.open(self.filename, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            return
+        while True:
+            try:
+                self._fd = os.open(self.filename, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+                return
+            except FileExistsError:
+                pass
+            try:
+                if time.time() - os.path.getmtime(self.filename) > STALE_LOCK_AGE:
+                    os.remove(self.filename)
+                    continue
+            except FileNotFoundError:
+                continue
+            time.sleep(LOCK_POLL_INTERVAL)
+
+    def _release(self):
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+        else:
+            os.close(self._fd)
+            os.remove(self.filename)
+        self._fd = None
+
+def _entry_seq(line: bytes):
+    """Returns the sequence number of a journal line, or None if it is torn."""
+    try:
+        return json.loads(line)["seq"]
+    except (ValueError, KeyError, TypeError):
+        return None
+
+class Journal:
+    """
+    Append-only log of address book mutations, shared by every session using the same file.
+
+    Every mutation is written as one JSON line and flushed to the OS right away,
+    so a crashed process loses nothing. fsync is batched: it runs after
+    `fsync_every` entries or `fsync_interval` seconds, whichever comes first.
+
+    Sequence numbers are global: an entry is appended under the exclusive lock,
+    after the entries other sessions appended first have been applied to the book,
+    so every session sees the same order. A snapshot replaces the journal with a
+    new file holding the entries it does not cover; other sessions notice the new
+    file and reopen it. The last `retain` entries a snapshot covers are kept, so a
+    session that was idle meanwhile can still catch up entry by entry instead of
+    reloading the whole book.
+
+    Attributes:
+        filename (str | None): Path of the journal file.
+        book (AddressBook | None): The book whose mutations are being journaled.
+        size (int): Size of the journal file in bytes.
+        appended (int): Number of entries this session appended since the journal was opened.
+        lock (FileLock | None): Lock of the snapshot and its journal.
+    """
+    def __init__(self, fsync_every=64, fsync_interval=1.0, checkpoint_size=1024 * 1024, retain=1000):
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.checkpoint_size = checkpoint_size
+        self.retain = retain
+        self.filename = None
+        self.data_file = None
+        self.book = None
+        self.size = 0
+        self.appended = 0
+        self.lock = None
+        self._file = None
+        self._inode = None
+        # bytes of the journal already applied to the book
+        self._offset = 0
+        self._unsynced = 0
+        self._last_sync = 0.0
+
+    def open(self, book, data_file=DATA_FILE):
+        """Starts journaling mutations of the given book next to its snapshot file."""
+        self.close()
+        self.filename = journal_path(data_file)
+        self.data_file = data_file
+        os.makedirs(os.path.dirname(self.filename) or ".", exist_ok=True)
+        self.book = book
+        self.appended = 0
+        self.lock = FileLock(data_file)
+        self._reopen()
+        self._last_sync = time.monotonic()
+        # the book was read without the lock; a snapshot taken meanwhile is caught here
+        with self.lock.shared():
+            self._catch_up(book, rescan=True)
+
+    def _reopen(self):
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.filename, "ab")
+        self._inode = os.fstat(self._file.fileno()).st_ino
+        self._offset = 0
+
+    def _read_lines(self, start):
+        with open(self.filename, "rb") as f:
+            f.seek(start)
+            return f.read().splitlines(keepends=True)
+
+    def _catch_up(self, book, rescan=False):
+        """
+        Applies the entries other sessions appended since the last call; the lock must be held.
+
+        Returns the names they touched, or None when entries this session had not seen
+        were already folded into a snapshot and the book had to be reloaded from disk.
+        """
+        try:
+            inode = os.stat(self.filename).st_ino
+        except FileNotFoundError:
+            inode = None
+        if inode != self._inode:
+            # replaced by another session's snapshot
+            self._reopen()
+            rescan = True
+        self.size = os.fstat(self._file.fileno()).st_size
+        if not rescan and self.size == self._offset:
+            return set()
+        start = 0 if rescan or self._offset > self.size else self._offset
+        lines = self._read_lines(start)
+        if start and lines and _entry_seq(lines[0]) != book.journal_seq + 1:
+            start = 0
+            lines = self._read_lines(0)
+        touched = set()
+        expected = book.journal_seq + 1
+        offset = start
+        for line in lines:
+            seq = _entry_seq(line) if line.endswith(b"\n") else None
+            if seq is None:
+                # a torn entry; append() cuts it off
+                break
+            if seq > expected:
+                return self._reload(book)
+            if seq == expected:
+                entry = json.loads(line)
+                if entry["op"] == RELOAD_OP:
+                    return self._reload(book)
+                try:
+                    apply_operation(book, entry["op"], entry["args"])
+                except (ValueError, TypeError):
+                    pass
+                touched.update(entry["args"][:1])
+                expected += 1
+            offset += len(line)
+        book.journal_seq = expected - 1
+        self._offset = offset
+        if start == 0 and snapshot_version(self.data_file) > book.journal_seq:
+            return self._reload(book)
+        return touched
+
+    def _reload(self, book):
+        """Replaces the contents of the book with the snapshot and journal on disk; the lock must be held."""
+        fresh = load_data(self.data_file, default=AddressBook())
+        book.data = fresh.data
+        book.journal_seq = fresh.journal_seq
+        book.reset_indexes()
+        book.generation += 1
+        self._offset = self.size
+        return None
+
+    def refresh(self, book):
+        """Applies the changes other sessions journaled since the last call. Cheap when there are none."""
+        if self._file is None or book is not self.book:
+            return
+        try:
+            stat = os.stat(self.filename)
+            if stat.st_ino == self._inode and stat.st_size == self._offset:
+                return
+        except FileNotFoundError:
+            pass
+        with self.lock.shared():
+            self._catch_up(book)
+
+    @metrics.timed("save")
+    def append(self, book, op, *args):
+        """
+        Appends an operation on the book to the journal. Books that are not journaled are ignored.
+
+        Entries other sessions appended first are applied before it. If one of them
+        changed the same contact, the book is reloaded from disk, which discards the
+        change, and ConflictError is raised. If the book had to be reloaded because the
+        entries this session missed were already folded into a snapshot, the change is
+        made again on the reloaded book; ConflictError is raised if it no longer applies.
+        """
+        if self._file is None or book is not self.book:
+            return
+        with self.lock.exclusive():
+            touched = self._catch_up(book)
+            if touched is None:
+                _reapply(book, op, args)
+            elif args[:1] and args[0] in touched:
+                self._reload(book)
+                raise ConflictError(f"'{args[0]}' was changed in another session; "
+                                    "the change was discarded and the contacts reloaded.")
+            if self._offset < self.size:
+                self._file.truncate(self._offset)
+            book.journal_seq = getattr(book, "journal_seq", 0) + 1
+            entry = {"seq": book.journal_seq, "op": op, "args": list(args)}
+            line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+            self._file.write(line)
+            self._file.flush()
+            self.size = self._offset = self._offset + len(line)
+        self.appended += 1
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+            self.sync()
+
+    @contextmanager
+    def bulk(self, book):
+        """
+        Context manager for a change of the book too large to journal entry by entry, like an import.
+
+        The exclusive lock is held throughout, and other sessions' entries are applied
+        first. On exit a reload entry is appended and a snapshot holding the change is
+        written before the lock is released, so other sessions reload the book when they
+        reach the entry instead of saving over the change. Books that are not journaled
+        are only changed.
+        """
+        if self._file is None or book is not self.book:
+            yield
+            return
+        with self.lock.exclusive():
+            self._catch_up(book)
+            try:
+                yield
+            finally:
+                self.append(book, RELOAD_OP)
+                self.sync()
+                _write_snapshot(book, self.data_file, self.lock, self.compact)
+
+    def sync(self):
+        """Forces journaled entries to disk."""
+        if self._file is None or not self._unsynced:
+            return
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def needs_checkpoint(self):
+        """Returns True when the journal is long enough to be folded into a snapshot."""
+        return self.size >= self.checkpoint_size
+
+    def compact(self, seq):
+        """Drops the entries up to `seq`, but the last `retain`, once a snapshot covers them; the exclusive lock must be held."""
+        if self._file is None:
+            return
+        kept = _rewrite_journal(self.filename, seq, self.retain)
+        self._reopen()
+        self._offset = sum(len(line) for line in kept if _entry_seq(line) <= self.book.journal_seq)
+        self.size = sum(len(line) for line in kept)
+        self._unsynced = 0
+
+    def close(self):
+        """Syncs and closes the journal file."""
+        if self._file is None:
+            return
+        self.sync()
+        self._file.close()
+        self._file = None
+        self.book = None
+
+def _reapply(book, op, args):
+    """Makes a change again on a book reloaded from disk; raises ConflictError if it no longer applies."""
+    if op in RECORD_OPS and book.find(args[0]) is None:
+        raise ConflictError(f"'{args[0]}' was deleted in another session; the change was discarded.")
+    try:
+        apply_operation(book, op, args)
+    except ValueError as e:
+        raise ConflictError(f"'{args[0]}' was changed in another session ({e}); the change was discarded.") from None
+
+journal = Journal()
+
+def _unpickle(f):
+    """Unpickles with the garbage collector paused; every object a large book creates is kept anyway."""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return pickle.load(f)
+    finally:
+        if enabled:
+            gc.enable()
+
+def _is_header(obj):
+    return isinstance(obj, tuple) and len(obj) == 2 and obj[0] == SNAPSHOT_HEADER
+
+def _snapshot_bytes(obj, version):
+    """Pickles the object after a small header with its version, which can be read without loading the object."""
+    return pickle.dumps((SNAPSHOT_HEADER, version)) + pickle.dumps(obj)
+
+def _read_snapshot(f):
+    """Returns the version and the object of a pickled snapshot; the version is None for files written before."""
+    first = _unpickle(f)
+    if _is_header(first):
+        return first[1], _unpickle(f)
+    return None, first
+
+def snapshot_version(filename):
+    """Returns the version a snapshot file was saved at, reading as little as possible, or -1 when there is none."""
+    if not os.path.exists(filename):
+        return -1
+    if is_sqlite_file(filename):
+        with SqliteStorage(filename) as storage:
+            return storage.journal_seq()
+    if is_mapped_file(filename):
+        return mapped_journal_seq(filename)
+    if is_block_file(filename):
+        return block_version(filename)
+    try:
+        with open(filename, "rb") as f:
+            first = _unpickle(f)
+    except (FileNotFoundError, EOFError):
+        return -1
+    if _is_header(first):
+        return first[1]
+    # written before snapshots were versioned, so the whole book had to be read
+    return getattr(first, "journal_seq", 0)
+
+def _rewrite_journal(filename, seq, retain):
+    """
+    Replaces the journal with a new file without the entries up to `seq`, but the last `retain`.
+
+    The exclusive lock must be held. A new file is written and renamed, so a crash
+    cannot leave half of it; sessions notice the new file and reopen it. Returns the
+    kept lines.
+    """
     try:
         with open(filename, "rb") as f:
-            return pickle.load(f)
+            lines = f.read().splitlines(keepends=True)
     except FileNotFoundError:
-        return default
+        return []
+    kept = [line for line in lines if line.endswith(b"\n") and (_entry_seq(line) or 0) > seq - retain]
+    _write_atomically(filename, b"".join(kept))
+    return kept
+
+def _write_snapshot(book, filename, lock, compact=None):
+    """
+    Writes a snapshot of the book. Returns False if it was dropped for a newer one.
+
+    The book is serialized without holding the lock, so other sessions keep reading
+    and writing meanwhile. With `compact`, the snapshot only replaces the file if no
+    other session saved a newer one in the meantime, and `compact(version)` then runs
+    under the lock to drop the journal entries it covers.
+    """
+    version = getattr(book, "journal_seq", 0)
+    if is_sqlite_file(filename):
+        # SQLite rewrites the tables in one transaction; the lock orders it with the journal
+        with lock.exclusive():
+            with SqliteStorage(filename) as storage:
+                if compact is not None and storage.journal_seq() > version:
+                    return False
+                storage.save_book(book)
+            if compact is not None:
+                compact(version)
+        return True
+    tmp_filename = temporary_name(filename)
+    if is_mapped_file(filename):
+        save_mapped(book, tmp_filename)
+    else:
+        with open(tmp_filename, "wb") as f:
+            f.write(dump_book(book) if is_block_file(filename) else _snapshot_bytes(book, version))
+            f.flush()
+            os.fsync(f.fileno())
+    with lock.exclusive():
+        if compact is not None and snapshot_version(filename) > version:
+            # another session saved a newer snapshot, which has everything this one has
+            os.remove(tmp_filename)
+            return False
+        os.replace(tmp_filename, filename)
+        if compact is not None:
+            compact(version)
+    return True
+
+@metrics.timed("save")
+def save_data(book, filename=None):
+    """
+    Writes a full snapshot of the book and drops the journal entries it covers.
+
+    The journaled book's snapshot is only put in place if no other session saved a
+    newer one in the meantime; entries it does not cover stay in the journal either way.
+    """
+    filename = filename or data_file()
+    if journal.book is book and journal.filename == journal_path(filename):
+        _write_snapshot(book, filename, journal.lock, journal.compact)
+    else:
+        _write_snapshot(book, filename, FileLock(filename))
+
+def load_data(filename=None, default=None):
+    """Loads the snapshot and replays the journal written after it."""
+    filename = filename or data_file()
+    if is_sqlite_file(filename) and os.path.exists(filename):
+        book = load_sqlite_book(filename)
+    elif is_mapped_file(filename) and os.path.exists(filename):
+        book = load_mapped(filename)
+    elif is_block_file(filename) and os.path.exists(filename):
+        book = load_block_book(filename)
+    else:
+        try:
+            with open(filename, "rb") as f:
+                _, book = _read_snapshot(f)
+        except FileNotFoundError:
+            book = default
+    if book is not None:
+        replay_journal(book, journal_path(filename))
+    return book
 
 NOTES_FILE = os.path.join(os.path.expanduser("~"), ".my_assistant_data", "notes.pkl")
 
-def save_notes(notes, filename=NOTES_FILE):
-    """Зберігає NoteBook у файл у домашній папці користувача."""
-    os.makedirs(os.path.dirname(filename), exist_ok=True)
-    with open(filename, "wb") as f:
-        pickle.dump(notes, f)
+def notes_file():
+    """
+    Returns the file notes live in: the SQLite database once it was migrated, the pickle otherwise.
+
+    Notes are never switched to a block file. Search needs every note loaded, so fetching
+    single blocks would not help, and compressing would slow down every write-behind save.
+    """
+    if os.path.exists(DB_FILE):
+        return DB_FILE
+    return NOTES_FILE
+
+def temporary_name(filename):
+    """Returns a name to write the file under before it is renamed, unique to the process and thread."""
+    return f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+def _write_atomically(filename, data: bytes):
+    """Writes data to a temporary file and renames it over the target."""
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+    tmp_filename = temporary_name(filename)
+    with open(tmp_filename, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_filename, filename)
+
+class _NotesPickler(pickle.Pickler):
+    """Pickles a note book from a copy of its state taken earlier, so the book can change meanwhile."""
+    def __init__(self, file, notes, state):
+        super().__init__(file)
+        self.notes = notes
+        self.state = state
+
+    def reducer_override(self, obj):
+        # the notes point back to the book, so it is swapped for the copy wherever it is met
+        if obj is self.notes:
+            return copyreg.__newobj__, (type(obj),), self.state
+        return NotImplemented
+
+def _notes_state(notes, version):
+    """Stamps the notes changed since the last save with the new version and returns a shallow copy of the book's state."""
+    for name in notes.changed:
+        note = notes.data.get(name)
+        if note is not None:
+            note.version = version
+    state = notes.__getstate__()
+    state["data"] = dict(notes.data)
+    return state
+
+def _pickle_notes(notes, state, version):
+    """Serializes the note book as it was when `state` was taken, like _snapshot_bytes."""
+    f = io.BytesIO()
+    pickle.dump((SNAPSHOT_HEADER, version), f)
+    _NotesPickler(f, notes, state).dump(notes)
+    return f.getvalue()
+
+def _notes_snapshot(notes, version):
+    """Stamps the notes changed since the last save with the new version and serializes the book."""
+    return _pickle_notes(notes, _notes_state(notes, version), version)
 
-def load_notes(filename=NOTES_FILE, default=None):
+def _read_notes(filename):
+    """Returns the version and the note book of a pickle; the version is None for old pickles."""
+    with open(filename, "rb") as f:
+        return _read_snapshot(f)
+
+def _merge_notes(notes, saved, base):
+    """
+    Takes the notes another session saved and applies the notes changed here on top.
+
+    A note the other session also changed since version `base` keeps its saved
+    version. Returns the names of those notes.
+    """
+    merged = dict(saved.data)
+    rejected = []
+    for name in notes.changed:
+        theirs = merged.get(name)
+        if theirs is not None and theirs.version > base:
+            rejected.append(name)
+            continue
+        note = notes.data.get(name)
+        if note is None:
+            merged.pop(name, None)
+        else:
+            merged[name] = note
+    notes.data = merged
+    for note in merged.values():
+        note._book = notes
+    notes.reset_indexes()
+    notes.generation += 1
+    return rejected
+
+def _commit_notes(notes, filename, base, data):
+    """
+    Writes the serialized note book saved from version `base`; the exclusive lock must be held.
+
+    If another session saved a newer version meanwhile, the books are merged and
+    the result is written instead. Returns the names of conflicting notes.
+    """
+    saved_version = snapshot_version(filename)
+    rejected = []
+    if saved_version > base:
+        _, saved = _read_notes(filename)
+        rejected = _merge_notes(notes, saved, base)
+        base = saved_version
+        data = _notes_snapshot(notes, base + 1)
+    _write_atomically(filename, data)
+    notes.version = base + 1
+    notes.changed.clear()
+    return rejected
+
+def save_notes(notes, filename=None):
+    """
+    Зберігає NoteBook у файл у домашній папці користувача.
+
+    Changes another session saved since the book was loaded are merged in. Returns
+    the names of notes both sessions changed; those keep the other session's text.
+    """
+    filename = filename or notes_file()
+    if is_sqlite_file(filename):
+        with SqliteStorage(filename) as storage:
+            storage.save_changed_notes(notes)
+        notes.changed.clear()
+        return []
+    data = _notes_snapshot(notes, notes.version + 1)
+    with FileLock(filename).exclusive():
+        return _commit_notes(notes, filename, notes.version, data)
+
+def load_notes(filename=None, default=None):
     """Завантажує NoteBook із файлу або повертає значення default."""
+    filename = filename or notes_file()
+    if is_sqlite_file(filename):
+        if not os.path.exists(filename):
+            return default
+        return load_sqlite_notes(filename)
     try:
-        with open(filename, "rb") as f:
-            return pickle.load(f)
+        version, notes = _read_notes(filename)
     except FileNotFoundError:
         return default
+    if version is not None:
+        notes.version = version
+    return notes
+
+class NotesSaver:
+    """
+    Write-behind saver for the note book.
+
+    Mutations only mark the note book dirty. A background thread saves it once
+    `interval` seconds have passed since the first unsaved change, or as soon as
+    `max_pending` changes have piled up. Pending changes are always flushed on exit.
+    Opened with `background=False` it only saves once, when closed.
+
+    Attributes:
+        notes (NoteBook | None): The note book being saved.
+        filename (str | None): Where the note book is saved.
+        lock (threading.RLock): Held while the note book is changed, or copied for a save.
+        conflicts (list[str]): Notes whose changes lost to another session's, until taken.
+        errors (list[str]): Errors of failed saves, until taken. The changes stay pending and are saved again later.
+    """
+    def __init__(self, interval=1.0, max_pending=100):
+        self.interval = interval
+        self.max_pending = max_pending
+        self.notes = None
+        self.filename = None
+        self.lock = threading.RLock()
+        self._changed = threading.Condition(self.lock)
+        self._write_lock = threading.Lock()
+        self.conflicts = []
+        self.errors = []
+        self._pending = 0
+        self._first_change = 0.0
+        self._closing = False
+        self._deferred = False
+        self._thread = None
+
+    def open(self, notes, filename=None, background=True):
+        """Starts saving the note book in the background, or only on close when `background` is False."""
+        self.close()
+        self.notes = notes
+        self.filename = filename or notes_file()
+        self._closing = False
+        self._deferred = not background
+        if background:
+            self._thread = threading.Thread(target=self._run, name="notes-saver", daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    @contextmanager
+    def mutating(self, notes):
+        """Context manager wrapping a change of the note book; schedules a save when it completes."""
+        if self._thread is None and not self._deferred:
+            self.open(notes, self.filename if notes is self.notes else None)
+        with self.lock:
+            yield
+            if notes is self.notes:
+                if not self._pending:
+                    self._first_change = time.monotonic()
+                self._pending += 1
+                self._changed.notify()
+
+    def _run(self):
+        while True:
+            with self._changed:
+                while not self._pending and not self._closing:
+                    self._changed.wait()
+                if self._closing:
+                    return
+                while self._pending < self.max_pending and not self._closing:
+                    remaining = self._first_change + self.interval - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._changed.wait(remaining)
+            try:
+                self.flush()
+            except Exception as e:
+                self._failed(e)
+                self._pause()
+
+    def _failed(self, error):
+        with self.lock:
+            self.errors.append(f"{type(error).__name__}: {error}")
+
+    def _pause(self):
+        """Waits one interval before a failed save is tried again, unless the saver is closed meanwhile."""
+        deadline = time.monotonic() + self.interval
+        with self._changed:
+            while not self._closing and (remaining := deadline - time.monotonic()) > 0:
+                self._changed.wait(remaining)
+
+    def flush(self):
+        """
+        Saves the note book now if it has unsaved changes.
+
+        If the save fails the error is raised and the changes stay pending, so the
+        next flush writes them again.
+        """
+        with self._write_lock:
+            with self.lock:
+                pending = self._pending
+                if not pending:
+                    return
+                if is_sqlite_file(self.filename):
+                    # the changed rows are copied; the database is written without blocking changes
+                    names = set(self.notes.changed)
+                    self.notes.changed.clear()
+                    rows = note_rows(self.notes, names)
+                else:
+                    base, generation = self.notes.version, self.notes.generation
+                    # only the dict of notes is copied here; they are pickled without blocking changes
+                    state = _notes_state(self.notes, base + 1)
+            if is_sqlite_file(self.filename):
+                self._write_rows(rows, pending)
+                return
+            data = _pickle_notes(self.notes, state, base + 1)
+            with FileLock(self.filename).exclusive():
+                if snapshot_version(self.filename) <= base:
+                    # nobody else saved: written without blocking changes to the book
+                    _write_atomically(self.filename, data)
+                    with self.lock:
+                        self.notes.version = base + 1
+                        if self.notes.generation == generation:
+                            self.notes.changed.clear()
+                        # changes made while it was written are still pending
+                        self._pending -= pending
+                    return
+                with self.lock:
+                    self.conflicts += _commit_notes(self.notes, self.filename, base, data)
+                    # the merge wrote the book as it is now
+                    self._pending = 0
+
+    def _write_rows(self, rows, pending):
+        """Writes the copied rows of the changed notes to the database and forgets the changes they cover."""
+        try:
+            with SqliteStorage(self.filename) as storage:
+                storage.write_notes(rows)
+                with self.lock:
+                    storage.refresh(self.notes.data, rows)
+                    self._pending -= pending
+        except BaseException:
+            with self.lock:
+                self.notes.changed.update(rows)
+            raise
+
+    def take_conflicts(self):
+        """Returns and forgets the notes whose changes were discarded in favour of another session's."""
+        with self.lock:
+            conflicts, self.conflicts = self.conflicts, []
+        return conflicts
+
+    def take_errors(self):
+        """Returns and forgets the errors of failed saves."""
+        with self.lock:
+            errors, self.errors = self.errors, []
+        return errors
+
+    def close(self):
+        """Flushes pending changes and stops the background thread."""
+        if self._thread is None and not self._deferred:
+            return
+        if self._thread is not None:
+            with self._changed:
+                self._closing = True
+                self._changed.notify()
+            self._thread.join()
+            self._thread = None
+        self._deferred = False
+        try:
+            self.flush()
+        except Exception as e:
+            # also runs at exit, where raising would only print a traceback
+            self._failed(e)
+        atexit.unregister(self.close)
+
+notes_saver = NotesSaver()
+
+def _file_size(filename):
+    try:
+        return os.path.getsize(filename)
+    except FileNotFoundError:
+        return 0
+
+class Compactor:
+    """
+    Folds the journal into a fresh snapshot from a background thread.
+
+    The snapshot is built from the files, not from the running session's book: the
+    current snapshot is loaded into a separate book and the journal replayed on top,
+    as another session would. The prompt is never paused and the live book is never
+    read from two threads; the price is a second copy of the book in memory while it
+    runs (with the mapped engine, only of the records changed since the last snapshot).
+    The thread looks at the journal every `interval` seconds and compacts once it has
+    grown past the journal's `checkpoint_size`.
+
+    Attributes:
+        interval (float): Seconds between two looks at the journal.
+        runs (int): Number of snapshots written.
+        last_run (datetime | None): When the last compaction finished.
+        last_duration (float): Seconds the last compaction took.
+        version (int): Journal sequence number the last snapshot covers.
+        snapshot_size (int): Size of the last snapshot in bytes.
+        journal_before (int): Size of the journal before the last compaction, in bytes.
+        journal_after (int): Size of the journal after the last compaction, in bytes.
+        last_error (str | None): Error of the last failed compaction.
+    """
+    def __init__(self, interval=30.0):
+        self.interval = interval
+        self.runs = 0
+        self.last_run = None
+        self.last_duration = 0.0
+        self.version = 0
+        self.snapshot_size = 0
+        self.journal_before = 0
+        self.journal_after = 0
+        self.last_error = None
+        # one compaction at a time, whether started by the thread or by hand
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Starts compacting in the background."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="compactor", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if _file_size(journal_path(data_file())) < journal.checkpoint_size:
+                continue
+            try:
+                self.compact()
+            except Exception:
+                # recorded in last_error, the next look tries again
+                pass
+
+    def compact(self, filename=None):
+        """Writes a fresh snapshot from the files on disk now. Returns False if another session saved a newer one meanwhile."""
+        filename = filename or data_file()
+        journal_file = journal_path(filename)
+        with self._lock:
+            start = time.perf_counter()
+            before = _file_size(journal_file)
+            try:
+                book = load_data(filename, default=AddressBook())
+                written = _write_snapshot(book, filename, FileLock(filename),
+                                          lambda seq: _rewrite_journal(journal_file, seq, journal.retain))
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                raise
+            self.last_error = None
+            if written:
+                self.runs += 1
+                self.last_run = datetime.now()
+                self.last_duration = time.perf_counter() - start
+                self.version = book.journal_seq
+                self.snapshot_size = _file_size(filename)
+                self.journal_before = before
+                self.journal_after = _file_size(journal_file)
+            return written
+
+    def stop(self):
+        """Stops the background thread, waiting for a running compaction to finish."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def table(self, notes_filename=None):
+        """Returns a table with the statistics of the last compaction and the current file sizes."""
+        from src.tables import color_table
+        filename = data_file()
+        table = color_table()
+        table.field_names = [f"{Fore.YELLOW}Statistic", f"{Fore.YELLOW}Value"]
+        table.align = "l"
+        table.add_rows([
+            ["Snapshots written", self.runs],
+            ["Last compaction", self.last_run.strftime("%d.%m.%Y %H:%M:%S") if self.last_run else "never"],
+            ["Duration ms", f"{self.last_duration * 1000:.1f}"],
+            ["Snapshot version", self.version],
+            ["Journal before KB", f"{self.journal_before / 1024:.1f}"],
+            ["Journal after KB", f"{self.journal_after / 1024:.1f}"],
+            [f"Snapshot KB ({filename})", f"{_file_size(filename) / 1024:.1f}"],
+            ["Journal KB now", f"{_file_size(journal_path(filename)) / 1024:.1f}"],
+            [f"Notes KB ({notes_filename or notes_file()})", f"{_file_size(notes_filename or notes_file()) / 1024:.1f}"],
+            ["Last error", self.last_error or "none"],
+        ])
+        return table
+
+compactor = Compactor()
+
+class BackgroundLoad:
+    """
+    Runs a loading function in a daemon thread, so the prompt can be shown while data is read.
+
+    `result()` waits for the function to finish and returns its value or raises its error.
+    """
+    def __init__(self, load, *args, **kwargs):
+        self._value = None
+        self._error = None
+        self._thread = threading.Thread(target=self._run, args=(load, args, kwargs), name="loader", daemon=True)
+        self._thread.start()
+
+    def _run(self, load, args, kwargs):
+        try:
+            self._value = load(*args, **kwargs)
+        except BaseException as e:
+            self._error = e
+
+    def result(self):
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self._value
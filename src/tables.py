@@ -0,0 +1,133 @@
+import math
+import re
+
+from colorama import Fore
+
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+# Rows shown at once by the pager and by `--page`
+PAGE_SIZE = 20
+
+def strip_ansi(text: str) -> str:
+    """Removes terminal color codes from the text."""
+    return ANSI_ESCAPE.sub("", text)
+
+def color_table():
+    """Returns an empty table in the theme shared by all commands. prettytable is imported on first use."""
+    from prettytable.colortable import ColorTable, Themes
+    return ColorTable(theme=Themes.OCEAN_DEEP)
+
+def _cell_width(value) -> int:
+    return max(len(strip_ansi(line)) for line in str(value).split("\n"))
+
+def parse_page_options(args: list[str]) -> tuple[list[str], int | None, int]:
+    """
+    Splits `--page N` and `--page-size M` off the command arguments.
+
+    Returns the remaining arguments, the page (None when not given) and the page size.
+    Raises ValueError for missing or non-positive numbers.
+    """
+    rest, page, page_size = [], None, PAGE_SIZE
+    args = iter(args)
+    for arg in args:
+        if arg not in ("--page", "--page-size"):
+            rest.append(arg)
+            continue
+        value = next(args, "")
+        if not value.isdigit() or int(value) < 1:
+            raise ValueError(f"{arg} needs a positive number.")
+        if arg == "--page":
+            page = int(value)
+        else:
+            page_size = int(value)
+    return rest, page, page_size
+
+class PagedTable:
+    """
+    Table whose rows are fetched and rendered one page at a time.
+
+    Only the rows of the requested page are produced and handed to prettytable,
+    so the first page of a huge result shows up right away. The widest cell seen
+    so far in every column is cached and used as its minimum width, so columns
+    do not jump around while paging.
+
+    Attributes:
+        field_names (list[str]): Column headers.
+        count (int): Number of rows.
+        fetch (callable): Returns the rows from `start` to `stop`.
+        page_size (int): Rows per page.
+        widths (dict[str, int]): Widest cell seen in each column.
+    """
+    def __init__(self, field_names: list[str], count: int, fetch, page_size: int = PAGE_SIZE,
+                 align: str | dict[str, str] = "l", dividers: bool = False):
+        self.field_names = field_names
+        self.count = count
+        self.fetch = fetch
+        self.page_size = page_size
+        self.align = align
+        self.dividers = dividers
+        self.widths = {name: _cell_width(name) for name in field_names}
+
+    @property
+    def pages(self) -> int:
+        return max(1, math.ceil(self.count / self.page_size))
+
+    @property
+    def rows(self) -> list[list]:
+        """All rows, for output that is not paged such as batch mode."""
+        return self.fetch(0, self.count)
+
+    def page(self, number: int):
+        """Returns a table with the rows of the given page, counting from 1."""
+        if not 1 <= number <= self.pages:
+            raise ValueError(f"Page {number} does not exist, there are {self.pages} pages.")
+        start = (number - 1) * self.page_size
+        rows = self.fetch(start, min(start + self.page_size, self.count))
+        for row in rows:
+            for name, value in zip(self.field_names, row):
+                self.widths[name] = max(self.widths[name], _cell_width(value))
+        table = color_table()
+        table.field_names = self.field_names
+        if isinstance(self.align, dict):
+            for name, align in self.align.items():
+                table.align[name] = align
+        else:
+            table.align = self.align
+        table.min_width.update(self.widths)
+        for row in rows:
+            table.add_row(row, divider=self.dividers)
+        return table
+
+    def __str__(self):
+        return "\n".join(str(self.page(number)) for number in range(1, self.pages + 1))
+
+def show_page(table: PagedTable, page: int | None):
+    """Returns the table for the pager, or only the requested page with a position line."""
+    if page is None:
+        return table
+    try:
+        result = table.page(page)
+    except ValueError as e:
+        return Fore.RED + str(e)
+    print(Fore.GREEN + f"Page {page} of {table.pages} ({table.count} rows)")
+    return result
+
+def page_through(table: PagedTable, read=input):
+    """Interactive pager: shows one page at a time and asks where to go next."""
+    number = 1
+    while True:
+        print(table.page(number))
+        if table.pages == 1:
+            return
+        try:
+            answer = read(f"Page {number}/{table.pages} ({table.count} rows). "
+                          "Enter: next, p: previous, <n>: go to page, q: quit ").strip().lower()
+        except (EOFError, KeyboardInterrupt):
+            return
+        if answer == "q" or (answer == "" and number == table.pages):
+            return
+        if answer == "":
+            number += 1
+        elif answer == "p":
+            number = max(1, number - 1)
+        elif answer.isdigit():
+            number = min(max(1, int(answer)), table.pages)
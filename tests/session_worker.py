@@ -0,0 +1,66 @@
+"""
+One session of the assistant, driven by the multi-process tests.
+
+Started with the data directory as its working directory and HOME. Opens the
+address book and the note book like batch mode does, then answers every JSON
+request read from stdin with one JSON line on stdout.
+"""
+import contextlib
+import io
+import json
+import sys
+
+from colorama import deinit
+
+import main
+from src.batch import run_batch
+from src.notes.handlers import get_note_book
+from src.storage import FileLock, data_file, journal, notes_file, notes_saver, save_data
+
+def contacts(book) -> dict:
+    return {record.name.value: [phone.value for phone in record.phones] for record in book.values()}
+
+def serve():
+    answers = sys.stdout
+    # handlers print for the REPL; only the answers go to the test
+    sys.stdout = sys.stderr
+    deinit()
+    book = main.open_book()
+    notes = get_note_book()
+    notes_saver.open(notes, notes_file(), background=False)
+    locks = contextlib.ExitStack()
+    answers.write(json.dumps("ready") + "\n")
+    answers.flush()
+    for line in sys.stdin:
+        request, *args = json.loads(line)
+        answer = None
+        if request == "run":
+            out = io.StringIO()
+            failed = run_batch([args[0]], main.parse_input, main.commands, book, out)
+            answer = {"failed": bool(failed), "output": out.getvalue()}
+        elif request == "refresh":
+            journal.refresh(book)
+        elif request == "save":
+            save_data(book)
+        elif request == "retain":
+            journal.retain = args[0]
+        elif request == "lock":
+            locks.enter_context(FileLock(data_file()).exclusive())
+        elif request == "unlock":
+            locks.close()
+        elif request == "contacts":
+            answer = contacts(book)
+        elif request == "flush":
+            notes_saver.flush()
+            answer = notes_saver.take_conflicts()
+        elif request == "notes":
+            answer = {name: note.text for name, note in notes.data.items()}
+        else:
+            answer = {"error": f"unknown request {request!r}"}
+        answers.write(json.dumps(answer) + "\n")
+        answers.flush()
+    journal.close()
+    notes_saver.close()
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,40 @@
+"""Batch runs writing streamed results as they are produced."""
+import io
+import json
+
+from colorama import Fore
+
+from src.batch import result_stream, run_batch
+
+def streaming(chunks, error=None):
+    """A handler streaming chunks, checking each one reached the batch output before the next is written."""
+    def handler(args, book):
+        print("header for the REPL")
+        stream = result_stream()
+        for chunk in chunks:
+            before = book.getvalue()
+            stream.write(chunk)
+            assert len(book.getvalue()) > len(before) or not chunk.strip("\n")
+        return error
+    return handler
+
+def run(commands, as_json=False):
+    out = io.StringIO()
+    # the output doubles as the book, so handlers can look at it while they stream
+    failed = run_batch(list(commands), str.split, commands, out, out, as_json)
+    return failed, out.getvalue()
+
+def test_streamed_result_is_written_as_it_comes():
+    failed, output = run({"export": streaming(["\na,b\r\n", "c,d\n", "\n"]), "other": lambda args, book: "done"})
+    assert failed == 0
+    assert output == "a,b\r\nc,d\ndone\n"
+
+def test_streamed_result_in_json():
+    failed, output = run({"export": streaming(['{"x": 1}\n', '{"x": 2}\n'])}, as_json=True)
+    assert failed == 0
+    assert json.loads(output) == {"command": "export", "ok": True, "output": '{"x": 1}\n{"x": 2}'}
+
+def test_error_after_streaming_ends_the_entry():
+    failed, output = run({"export": streaming(["a\n"], Fore.RED + "disk full")}, as_json=True)
+    assert failed == 1
+    assert json.loads(output) == {"command": "export", "ok": False, "output": "a\ndisk full"}
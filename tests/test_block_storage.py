@@ -0,0 +1,57 @@
+"""The compressed block engine reading contacts from single blocks."""
+import pytest
+
+from src.address_book.classes import AddressBook, Record
+from src.block_storage import BlockFile, BlockRecords, dump_book
+from src.storage import _write_atomically, load_data, save_data
+
+def make_book() -> AddressBook:
+    book = AddressBook()
+    # enough records for several blocks
+    for i in range(3000):
+        record = Record(f"Person{i:04}")
+        record.add_phone(f"0500{i:06}")
+        record.add_address(f"Street {i}, building {i * 7}, apartment {i % 90}")
+        book.add_record(record)
+    return book
+
+@pytest.fixture
+def blk(tmp_path):
+    filename = str(tmp_path / "addressbook.blk")
+    _write_atomically(filename, dump_book(make_book()))
+    return filename
+
+def test_contacts_are_read_from_their_block(blk):
+    book = load_data(blk)
+    assert isinstance(book.data, BlockRecords)
+    assert len(book.data.blocks.blocks) > 1
+    assert len(book) == 3000
+    assert book.find("Person1234").phones[0].value == "0500001234"
+    assert "Person9999" not in book.data and book.find("Person9999") is None
+    assert set(book.data.loaded) == {"Person1234"}
+    assert book.sorted_names()[:2] == ["Person0000", "Person0001"]
+    assert len(book.data.loaded) == 1
+
+def test_saving_keeps_changes_and_copies_the_rest(blk):
+    book = load_data(blk)
+    book.find("Person0100").add_email("ann@corp.com")
+    book.delete("Person0101")
+    record = Record("Aaron")
+    record.add_phone("0991234567")
+    book.add_record(record)
+    save_data(book, blk)
+    assert len(book.data.loaded) == 2
+    reloaded = load_data(blk)
+    assert reloaded.find("Person0100").email.value == "ann@corp.com"
+    assert reloaded.find("Person0101") is None
+    assert reloaded.find("Aaron").phones[0].value == "0991234567"
+    assert reloaded.names()[:2] == ["Aaron", "Person0000"]
+    with BlockFile(blk) as blocks:
+        assert blocks.count == 3000
+        assert dict(blocks.items()).keys() == set(reloaded.data)
+
+def test_other_files_are_rejected(tmp_path):
+    filename = tmp_path / "notes.blk"
+    filename.write_bytes(b"not a block file" * 4)
+    with pytest.raises(ValueError, match="not a block file"):
+        BlockFile(str(filename))
@@ -0,0 +1,37 @@
+"""Writing and reading the memory-mapped address book."""
+import os
+import threading
+
+from src.address_book.classes import AddressBook, Record
+from src.mapped_storage import load_mapped, save_mapped
+
+def make_book(count: int) -> AddressBook:
+    book = AddressBook()
+    for i in range(count):
+        record = Record(f"Person{i:04}")
+        record.add_phone(f"0500{i:06}")
+        book.add_record(record)
+    return book
+
+def test_saves_at_the_same_time_leave_a_whole_file(tmp_path):
+    filename = str(tmp_path / "addressbook.rec")
+    books = [make_book(2000 + i) for i in range(4)]
+    errors = []
+
+    def save(book):
+        try:
+            save_mapped(book, filename)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=save, args=(book,)) for book in books]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    book = load_mapped(filename)
+    # one of the books, not a mix of them
+    assert len(book) in {len(b) for b in books}
+    assert list(book.data) == sorted(make_book(len(book)).data)
+    assert os.listdir(tmp_path) == ["addressbook.rec"]
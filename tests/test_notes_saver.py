@@ -0,0 +1,69 @@
+"""The write-behind notes saver letting the note book change while it writes."""
+import threading
+
+from src.notes.classes import Note, NoteBook
+from src.sqlite_storage import SqliteStorage, migrate, note_rows
+from src.storage import NotesSaver, load_notes, save_notes
+
+class SlowNote(Note):
+    """A note whose first pickling waits until the test lets it go on."""
+    def __init__(self, name: str, text: str):
+        super().__init__(name, text)
+        self.pickling = threading.Event()
+        self.go_on = threading.Event()
+
+    def __getstate__(self):
+        if not self.pickling.is_set():
+            self.pickling.set()
+            assert self.go_on.wait(10)
+        state = self.__dict__.copy()
+        del state["pickling"], state["go_on"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.pickling, self.go_on = threading.Event(), threading.Event()
+
+def test_notes_change_while_the_book_is_pickled(tmp_path):
+    filename = str(tmp_path / "notes.pkl")
+    notes = NoteBook()
+    slow = SlowNote("slow", "text")
+    notes.add_note(slow)
+    saver = NotesSaver()
+    saver.open(notes, filename, background=False)
+    with saver.mutating(notes):
+        pass
+    flush = threading.Thread(target=saver.flush)
+    flush.start()
+    assert slow.pickling.wait(10)
+    # the lock is free while the notes are pickled
+    assert saver.lock.acquire(timeout=5)
+    try:
+        with saver.mutating(notes):
+            notes.add_note(Note("added", "meanwhile"))
+    finally:
+        saver.lock.release()
+    slow.go_on.set()
+    flush.join(10)
+    assert set(load_notes(filename).data) == {"slow"}
+    # the change made meanwhile is still pending
+    assert "added" in notes.changed and saver._pending == 1
+    saver.close()
+    assert set(load_notes(filename).data) == {"slow", "added"}
+
+def test_notes_changed_while_the_database_is_written_stay_changed(tmp_path):
+    filename = str(tmp_path / "assistant.db")
+    migrate(filename, notes=NoteBook())
+    notes = load_notes(filename)
+    notes.add_note(Note("a", "1"))
+    notes.add_note(Note("b", "2"))
+    rows = note_rows(notes, ["a", "b"])
+    # changed after the rows were copied, before they are written
+    notes.delete_note("a")
+    notes.add_note(Note("c", "3"))
+    with SqliteStorage(filename) as storage:
+        storage.write_notes(rows)
+        storage.refresh(notes.data, rows)
+    assert list(notes.data) == ["b", "c"] and len(notes.data) == 2
+    save_notes(notes, filename)
+    assert list(load_notes(filename).data) == ["b", "c"]
@@ -0,0 +1,147 @@
+"""Parsing and planning of contact and note queries."""
+import pytest
+
+from src.address_book.classes import AddressBook, Record
+from src.notes.classes import Note, NoteBook
+from src.query import (CONTACT_FIELDS, NOTE_FIELDS, Condition, ContactBirthday, Query, contact_query,
+                       find_contacts, find_notes, parse_terms)
+
+def make_book() -> AddressBook:
+    book = AddressBook()
+    for i in range(50):
+        record = Record(f"Person{i:02}")
+        record.add_phone(f"050000{i:04}")
+        record.add_birthday(f"{i % 28 + 1}.{i % 12 + 1}.{1980 + i % 3}")
+        book.add_record(record)
+    for name, birthday in [("Ann", "30.12.1990"), ("Bob", "03.01.1991"), ("Cid", "15.06.1990")]:
+        record = Record(name)
+        record.add_phone("0671234567")
+        record.add_birthday(birthday)
+        book.add_record(record)
+    return book
+
+def names(records) -> list[str]:
+    return [record.name.value for record in records]
+
+def names_of(notes) -> list[str]:
+    return [note.name for note in notes]
+
+# parser
+
+def test_terms_keep_fields_operators_and_quotes():
+    terms = parse_terms('name=Ann AND "due date" tag:"to do" note:x', NOTE_FIELDS)
+    assert terms == [("name", "=", "Ann"), (None, ":", '"due date"'), ("tag", ":", "to do"), (None, ":", "note:x")]
+
+def test_field_names_ignore_case():
+    assert parse_terms("Birthday:03", CONTACT_FIELDS) == [("birthday", ":", "03")]
+
+@pytest.mark.parametrize("text", ["ann OR bob", "NOT ann", "tag:work OR tag:home"])
+def test_or_and_not_are_rejected(text):
+    with pytest.raises(ValueError, match="only support AND"):
+        parse_terms(text, NOTE_FIELDS)
+
+@pytest.mark.parametrize("text, message", [("", "empty"), ("AND", "empty"), ('tag:""', "Missing value")])
+def test_invalid_queries_are_rejected(text, message):
+    with pytest.raises(ValueError, match=message):
+        parse_terms(text, NOTE_FIELDS)
+
+@pytest.mark.parametrize("value", ["13", "32.01", "30.02", "03..14", "1.2.3", "abc"])
+def test_invalid_birthdays_are_rejected(value):
+    with pytest.raises(ValueError):
+        ContactBirthday(value)
+
+def test_phone_without_digits_is_rejected():
+    with pytest.raises(ValueError, match="not a phone number"):
+        contact_query("phone:abc")
+
+def test_condition_must_filter():
+    with pytest.raises(TypeError):
+        Condition()
+
+# birthdays
+
+def test_birthday_range_wraps_past_new_year():
+    book = make_book()
+    condition = ContactBirthday("25.12..06.01")
+    days = {name: (record.birthday.date.month, record.birthday.date.day) for name, record in book.data.items()}
+    expected = {name for name, day in days.items() if day >= (12, 25) or day <= (1, 6)}
+    assert {"Ann", "Bob"} <= expected and "Cid" not in expected
+    assert set(condition.lookup(book)) == expected
+    assert set(condition.filter(book, list(book.data))) == expected
+    assert set(names(find_contacts(book, "birthday:25.12..06.01"))) == expected
+
+def test_month_range_covers_whole_months():
+    book = make_book()
+    found = names(find_contacts(book, "birthday:12..01"))
+    assert {"Ann", "Bob"} <= set(found)
+    assert all(book.data[name].birthday.date.month in (12, 1) for name in found)
+
+def test_year_filters_the_range_of_the_whole_year():
+    book = make_book()
+    condition = ContactBirthday("1990")
+    assert not condition.exact
+    assert set(names(find_contacts(book, "birthday:1990"))) == {"Ann", "Cid"}
+    assert names(find_contacts(book, "birthday:30.12.1990")) == ["Ann"]
+    assert names(find_contacts(book, "birthday:30.12.1991")) == []
+
+# planner
+
+class Recorded(Condition):
+    """Matches fixed names, records which of its methods the planner calls."""
+    def __init__(self, label: str, matches: set[str], estimate: int, calls: list):
+        self.label = label
+        self.matches = matches
+        self.count = estimate
+        self.calls = calls
+
+    def estimate(self, book) -> int:
+        return self.count
+
+    def lookup(self, book) -> list[str]:
+        self.calls.append(("lookup", self.label))
+        return [name for name in book.data if name in self.matches]
+
+    def filter(self, book, names: list[str]) -> list[str]:
+        self.calls.append(("filter", self.label))
+        return [name for name in names if name in self.matches]
+
+def test_planner_starts_from_the_most_selective_lookup():
+    book = make_book()
+    calls = []
+    wide = Recorded("wide", set(book.data) - {"Bob"}, 40, calls)
+    narrow = Recorded("narrow", {"Ann", "Bob"}, 2, calls)
+    assert Query([wide, narrow], False).names(book) == ["Ann"]
+    # the wide lookup costs too much next to two candidates, so it only filters them
+    assert calls == [("lookup", "narrow"), ("filter", "wide")]
+
+def test_planner_intersects_cheap_lookups():
+    book = make_book()
+    calls = []
+    first = Recorded("first", {"Ann", "Bob"}, 2, calls)
+    second = Recorded("second", {"Bob", "Cid"}, 3, calls)
+    assert Query([second, first], False).names(book) == ["Bob"]
+    assert calls == [("lookup", "first"), ("lookup", "second")]
+
+def test_planner_scans_in_book_order_when_no_lookup_narrows_much():
+    book = make_book()
+    calls = []
+    condition = Recorded("wide", {"Cid", "Ann"}, len(book), calls)
+    assert Query([condition], False).names(book) == ["Ann", "Cid"]
+    assert calls == [("filter", "wide")]
+
+def test_field_conditions_combine():
+    book = make_book()
+    assert names(find_contacts(book, "name:n birthday:12..01 phone:067-123-45-67")) == ["Ann"]
+    assert names(find_contacts(book, "name=Cid birthday:1990")) == ["Cid"]
+    assert names(find_contacts(book, "name=Cid birthday:1991")) == []
+
+def test_note_conditions_combine():
+    notes = NoteBook()
+    for name, text, tags in [("plan", "Quarterly plan", ["work", "urgent"]), ("trip", "quarterly trip", ["home"]),
+                             ("review", "Review the invoices", ["work"])]:
+        note = Note(name, text)
+        note.tags = tags
+        notes.add_note(note)
+    assert names_of(find_notes(notes, 'tag:work AND "quarterly"')) == ["plan"]
+    assert names_of(find_notes(notes, "tag:work text:voic")) == ["review"]
+    assert names_of(find_notes(notes, "name=trip quarterly")) == ["trip"]
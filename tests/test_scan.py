@@ -0,0 +1,52 @@
+"""The parallel scanner against a plain scan of the note texts."""
+import re
+
+import pytest
+
+from src.notes.classes import Note, NoteBook
+from src.notes.scan import ParallelScanner
+
+def expected(book, pattern, regex=False):
+    if regex:
+        return [note.name for note in book.data.values() if re.search(pattern, note.text, re.IGNORECASE)]
+    return [note.name for note in book.data.values() if pattern.lower() in note.text.lower()]
+
+@pytest.fixture
+def scanner():
+    scanner = ParallelScanner(workers=2, min_chars=0)
+    yield scanner
+    scanner.close()
+
+def found(scanner, book, pattern, regex=False):
+    return [note.name for note in scanner.find(book, pattern, regex)]
+
+def test_workers_follow_changes_to_the_book(scanner):
+    book = NoteBook()
+    for i in range(10):
+        book.add_note(Note(f"n{i}", f"Invoice {i} for March"))
+    assert found(scanner, book, "MARCH") == expected(book, "MARCH")
+    pools = scanner._pools
+    assert len(pools) == 2
+    book.data["n3"].edit_text("paid in April")
+    book.delete_note("n5")
+    book.add_note(Note("new", "april invoice"))
+    book.add_note(Note("n5", "march again"))
+    for pattern, regex in [("march", False), ("APRIL", False), (r"invoice \d", True), ("^paid", True)]:
+        assert found(scanner, book, pattern, regex) == expected(book, pattern, regex)
+    # the changes were sent to the running workers instead of restarting them
+    assert scanner._pools is pools
+
+def test_small_books_are_scanned_in_process(scanner):
+    scanner.min_chars = 1000
+    book = NoteBook()
+    book.add_note(Note("a", "Quarterly review"))
+    assert found(scanner, book, "QUARTERLY") == ["a"]
+    book.data["a"].edit_text("monthly review")
+    assert found(scanner, book, "quarterly") == []
+    assert scanner._pools == []
+
+def test_invalid_regex_is_rejected(scanner):
+    book = NoteBook()
+    book.add_note(Note("a", "text"))
+    with pytest.raises(re.error):
+        scanner.find(book, "(", regex=True)
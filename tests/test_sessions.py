@@ -0,0 +1,161 @@
+"""Several sessions working on the same files at once, each in its own process."""
+import json
+import os
+import select
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from src.sqlite_storage import SqliteStorage
+from src.storage import DB_FILE
+
+ROOT = Path(__file__).resolve().parent.parent
+WORKER = Path(__file__).with_name("session_worker.py")
+TIMEOUT = 30.0
+
+class Session:
+    """An assistant process working on the data in `home`, driven through session_worker.py."""
+    def __init__(self, home: Path):
+        env = dict(os.environ, HOME=str(home), PYTHONPATH=str(ROOT))
+        self.process = subprocess.Popen([sys.executable, str(WORKER)], cwd=home, env=env, text=True,
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        assert self.receive() == "ready"
+
+    def send(self, *request):
+        self.process.stdin.write(json.dumps(request) + "\n")
+        self.process.stdin.flush()
+
+    def answered(self, timeout: float) -> bool:
+        """Tells whether an answer arrives within the timeout."""
+        return bool(select.select([self.process.stdout], [], [], timeout)[0])
+
+    def receive(self):
+        if not self.answered(TIMEOUT):
+            raise TimeoutError("the session did not answer")
+        line = self.process.stdout.readline()
+        if not line:
+            raise RuntimeError(f"the session exited with status {self.process.wait()}")
+        return json.loads(line)
+
+    def __call__(self, *request):
+        self.send(*request)
+        return self.receive()
+
+    def run(self, command: str) -> str:
+        """Runs a command that must succeed and returns its output."""
+        result = self("run", command)
+        assert not result["failed"], result["output"]
+        return result["output"]
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait(TIMEOUT)
+
+@pytest.fixture(params=["pickle", "sqlite"])
+def session(request, tmp_path):
+    """Starts sessions on the same data directory, for each engine; they are closed after the test."""
+    if request.param == "sqlite":
+        # an existing database selects the SQLite engine for contacts and notes
+        (tmp_path / "storage").mkdir()
+        SqliteStorage(str(tmp_path / DB_FILE)).close()
+    started = []
+    def start():
+        started.append(Session(tmp_path))
+        return started[-1]
+    start.engine = request.param
+    yield start
+    for s in started:
+        s.close()
+
+def test_changes_reach_other_sessions(session):
+    a, b = session(), session()
+    a.run("add Ann 0501234567")
+    b("refresh")
+    assert b("contacts") == {"Ann": ["0501234567"]}
+    b.run("add Ann 0507654321")
+    a("refresh")
+    assert a("contacts") == {"Ann": ["0501234567", "0507654321"]}
+
+def test_conflicting_change_is_rejected(session):
+    a, b = session(), session()
+    a.run("add Ann 0501234567")
+    b("refresh")
+    a.run("edit-phone Ann 0501234567 0507654321")
+    result = b("run", "edit-phone Ann 0501234567 0501111111")
+    assert result["failed"]
+    assert "changed in another session" in result["output"]
+    # the book was reloaded with the change saved first
+    assert b("contacts") == {"Ann": ["0507654321"]}
+
+def test_exclusive_lock_holds_other_sessions_back(session):
+    a, b = session(), session()
+    a("lock")
+    b.send("run", "add Ann 0501234567")
+    assert not b.answered(0.5)
+    a("unlock")
+    assert not b.receive()["failed"]
+    a("refresh")
+    assert a("contacts") == {"Ann": ["0501234567"]}
+
+def test_sessions_follow_the_journal_across_compactions(session):
+    a, b = session(), session()
+    a.run("add Ann 0501234567")
+    b("refresh")
+    # the snapshot replaces the journal file that b has open
+    a("save")
+    b.run("add Bob 0501234568")
+    a("refresh")
+    assert a("contacts") == {"Ann": ["0501234567"], "Bob": ["0501234568"]}
+    b("save")
+    a.run("add Cid 0501234569")
+    assert session()("contacts") == {"Ann": ["0501234567"], "Bob": ["0501234568"], "Cid": ["0501234569"]}
+
+def test_idle_session_keeps_its_change_after_reloading(session):
+    a, b = session(), session()
+    a("retain", 1)
+    for i, name in enumerate(["Ann", "Bob", "Cid"]):
+        a.run(f"add {name} 050123456{i}")
+    # folds the entries b has not seen into the snapshot, keeping only the last one
+    a("save")
+    output = b.run("add Dan 0501234569")
+    assert "Contact added." in output
+    expected = {"Ann": ["0501234560"], "Bob": ["0501234561"], "Cid": ["0501234562"], "Dan": ["0501234569"]}
+    assert b("contacts") == expected
+    b("save")
+    assert session()("contacts") == expected
+
+def test_import_survives_a_later_save_of_another_session(session, tmp_path):
+    (tmp_path / "contacts.csv").write_text("name,phone\nAnn,0501234567\nBob,0501234568\n", encoding="utf-8")
+    a, b = session(), session()
+    a.run("add Cid 0501234569")
+    b("refresh")
+    a.run("import contacts.csv")
+    # b has not seen the import; its next change and snapshot must not drop it
+    b.run("add Dan 0501234560")
+    b("save")
+    expected = {"Cid": ["0501234569"], "Ann": ["0501234567"], "Bob": ["0501234568"], "Dan": ["0501234560"]}
+    assert b("contacts") == expected
+    assert session()("contacts") == expected
+
+def test_notes_of_both_sessions_are_merged(session):
+    a, b = session(), session()
+    a.run("note first from-a")
+    b.run("note second from-b")
+    assert a("flush") == []
+    assert b("flush") == []
+    assert session()("notes") == {"first": "from-a", "second": "from-b"}
+
+def test_note_changed_in_both_sessions_keeps_the_first_save(session):
+    if session.engine == "sqlite":
+        pytest.skip("the SQLite engine saves each note as it is, the last save wins")
+    a = session()
+    a.run("note shared original")
+    a("flush")
+    b = session()
+    a.run("note-edit shared from-a")
+    b.run("note-edit shared from-b")
+    assert a("flush") == []
+    assert b("flush") == ["shared"]
+    assert session()("notes") == {"shared": "from-a"}
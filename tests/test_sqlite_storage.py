@@ -0,0 +1,138 @@
+"""The SQLite engine answering lookups from the database and writing only what changed."""
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from src.address_book.classes import AddressBook, Record
+from src.notes.classes import Note, NoteBook
+from src.query import find_contacts
+from src.sqlite_storage import SqliteStorage, migrate
+from src.storage import load_data, load_notes, save_data, save_notes
+
+def make_book() -> AddressBook:
+    book = AddressBook()
+    for i in range(100):
+        record = Record(f"Person{i:03}")
+        record.add_phone(f"0500{i:06}")
+        record.add_birthday(f"{i % 28 + 1}.{i % 12 + 1}.{1980 + i % 5}")
+        if i % 10 == 0:
+            record.add_email(f"person{i}@corp.com")
+        book.add_record(record)
+    record = Record("Олена")
+    record.add_phone("0671234567")
+    record.add_address("Київ, Хрещатик 1")
+    book.add_record(record)
+    return book
+
+def names(records) -> list[str]:
+    return [record.name.value for record in records]
+
+@pytest.fixture
+def db(tmp_path):
+    filename = str(tmp_path / "assistant.db")
+    migrate(filename, make_book())
+    return filename
+
+def test_lookups_read_only_the_matching_records(db):
+    book = load_data(db)
+    assert book.data.loaded == {}
+    assert len(book) == 101
+    assert book.find("Person042").phones[0].value == "0500000042"
+    assert names(book.find_by_phone("067 123-45-67")) == ["Олена"]
+    assert names(book.search("КИЇВ")) == ["Олена"]
+    assert set(book.data.loaded) == {"Person042", "Олена"}
+
+@pytest.mark.parametrize("query", ["name:person01", "email:@corp.com birthday:03..05", "birthday:25.12..06.01",
+                                   "birthday:1982", "phone:050-000-00-07", "name=Олена хрещ", "000004"])
+def test_queries_match_the_in_memory_book(db, query):
+    expected = names(find_contacts(make_book(), query))
+    assert expected
+    book = load_data(db)
+    # in book order, where the in-memory planner keeps the order of its first lookup
+    assert sorted(names(find_contacts(book, query))) == sorted(expected)
+    # only the matches were read
+    assert len(book.data.loaded) == len(expected)
+
+def test_upcoming_birthdays_do_not_read_every_record(db):
+    today = datetime(2026, 3, 10)
+    expected = names(make_book().get_upcoming_birthdays(7, today=today))
+    book = load_data(db)
+    assert names(book.get_upcoming_birthdays(7, today=today)) == expected
+    assert len(book.data.loaded) == len(expected)
+
+def test_changes_in_memory_are_seen_by_the_lookups(db):
+    book = load_data(db)
+    book.find("Person001").edit_phone("0500000001", "0991112233")
+    book.delete("Person002")
+    record = Record("Zed")
+    record.add_phone("0500000001")
+    book.add_record(record)
+    assert names(book.find_by_phone("0991112233")) == ["Person001"]
+    assert names(book.find_by_phone("0500000001")) == ["Zed"]
+    assert names(find_contacts(book, "name:person00")) == [f"Person00{i}" for i in range(10) if i != 2]
+    assert "Person002" not in book.data
+    assert list(book.data)[-1] == "Zed"
+
+def test_saving_writes_only_the_changed_records(db):
+    book = load_data(db)
+    book.find("Person050").add_email("new@corp.com")
+    book.delete("Person051")
+    with SqliteStorage(db) as storage:
+        storage.save_book(book)
+        # the upsert, the phone rows replaced, the deletion and the journal sequence
+        assert storage.connection.total_changes <= 6
+    reloaded = load_data(db)
+    assert reloaded.find("Person050").email.value == "new@corp.com"
+    assert "Person051" not in reloaded.data
+    # the changed contact kept its place in the book
+    order = list(reloaded.data)
+    assert order.index("Person050") == 50 and len(order) == 100
+
+def test_saved_book_keeps_working_after_the_save(db):
+    book = load_data(db)
+    book.delete("Person003")
+    record = Record("Zed")
+    record.add_phone("0991234567")
+    book.add_record(record)
+    save_data(book, db)
+    assert book.data.added == {} and book.data.deleted == set()
+    assert "Person003" not in book.data and "Zed" in book.data
+    assert names(book.find_by_phone("0991234567")) == ["Zed"]
+    assert len(book) == 101
+
+def test_old_databases_get_normalized_phones(tmp_path):
+    filename = str(tmp_path / "old.db")
+    connection = sqlite3.connect(filename)
+    connection.executescript("""
+        CREATE TABLE contacts (name TEXT PRIMARY KEY, address TEXT, email TEXT, birthday TEXT,
+                               bday_month INTEGER, bday_day INTEGER);
+        CREATE TABLE phones (name TEXT NOT NULL, position INTEGER NOT NULL, phone TEXT NOT NULL,
+                             PRIMARY KEY (name, position));
+        CREATE INDEX phones_phone ON phones (phone);
+        INSERT INTO contacts (name) VALUES ('Ann');
+        INSERT INTO phones VALUES ('Ann', 0, '0501234567');
+    """)
+    connection.commit()
+    connection.close()
+    book = load_data(filename)
+    assert names(book.find_by_phone("(050) 123 45 67")) == ["Ann"]
+
+def test_notes_are_found_by_tag_in_the_database(tmp_path):
+    filename = str(tmp_path / "assistant.db")
+    notes = NoteBook()
+    for i in range(20):
+        note = Note(f"note{i}", f"text {i}")
+        note.tags = ["even" if i % 2 == 0 else "odd"]
+        notes.add_note(note)
+    migrate(filename, notes=notes)
+    notes = load_notes(filename)
+    assert [note.name for note in notes.find_by_tag("odd")] == [f"note{i}" for i in range(1, 20, 2)]
+    assert len(notes.data.loaded) == 10
+    notes.data["note1"].add_tag("even")
+    notes.delete_note("note4")
+    save_notes(notes, filename)
+    expected = [f"note{i}" for i in range(0, 20, 2) if i != 4]
+    expected.insert(1, "note1")
+    assert [note.name for note in notes.find_by_tag("even")] == expected
+    assert [note.name for note in load_notes(filename).find_by_tag("even")] == expected